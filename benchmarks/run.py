@@ -0,0 +1,234 @@
+"""End-to-end benchmarks of loading, extraction and redrawing, without a display.
+
+    python -m benchmarks.run --cycles 1000 --points 200 --files 2 --out results.json
+    python -m benchmarks.run --data bench_data/ --out new.json --compare results.json
+
+Synthetic workbooks (see ``benchmarks.synthetic``) are written to ``--data``, or
+to a temporary folder, and every stage is timed ``--repeat`` times:
+
+- ingest_<kind>: parsing the columns a viewer uses from the xlsx files
+- cached_<kind>: the same through a warm cache of parsed workbooks
+- iv_segment, iv_switching, iv_analyse: half-cycle segmentation, Vset/Vreset
+  extraction and the whole IV analysis of all files
+- pulse_metrics, retention, volatile: the extraction of the other viewers
+- redraw_halfcycle, redraw_cumulative, redraw_density: frames of the IV plot drawn
+  with the Agg renderer the way the viewer draws them
+
+The results are written as JSON with the run parameters and the library
+versions. ``--compare`` prints how much each stage changed against an older file.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from memristor_core.cache import SheetCache
+from memristor_core.density import DensityHistogram
+from memristor_core.iv import analyse_iv, analyse_volatile, halfcycle_metrics, segment_halfcycles, usable_sheets
+from memristor_core.lod import EnvelopePyramid
+from memristor_core.pulses import analyse_pulse
+from memristor_core.retention import analyse_retention
+from memristor_core.workbook import Workbook
+
+# Columns each viewer asks the loader for
+COLUMNS = {"iv": ("Voltage", "Current", "TimeOutput", "SetResistance", "ResetResistance", "SetVoltage", "ResetVoltage"),
+           "pulses": ("VMeasCh2", "IMeasCh1", "Time", "TimeOutput"),
+           "retention": ("R", "Time"),
+           "volatile": ("DrainV", "DrainI", "Time")}
+# Frames drawn per redraw stage
+FRAMES = 50
+
+
+def read_files(paths, columns, cache=False):
+    files = []
+    for path in paths:
+        with Workbook(path, columns, cache=cache) as workbook:
+            files.append((path, list(workbook)))
+    return files
+
+
+def iv_arrays(files):
+    # The IV sheets of all files as one frame, the way the viewer concatenates them
+    sweeps = usable_sheets([df for _, sheets in files for _, df in sheets])
+    lengths = np.array([len(df) for df in sweeps])
+    return pd.concat(sweeps, ignore_index=True), lengths
+
+
+def time_stage(function, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def _iv_figure():
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    figure = Figure(figsize=(14, 6))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    ax.set_yscale("log")
+    line, = ax.plot([], [], linewidth=2)
+    return figure, ax, line
+
+
+def _draw(figure, ax, line, voltage, current):
+    line.set_data(voltage, current)
+    ax.relim()
+    ax.autoscale_view()
+    figure.canvas.draw()
+
+
+def stages(paths, cache_directory):
+    """``{name: (function, items)}`` of the stages that can run on ``paths``; ``items``
+    is what the time is divided by for the per-item figure (points, sheets, frames)."""
+    result = {}
+    cache = SheetCache(cache_directory)
+    loaded = {}
+    for kind, files in paths.items():
+        # Also fills the cache, so that the cached stage only measures hits
+        loaded[kind] = read_files(files, COLUMNS[kind], cache)
+        rows = sum(len(df) for _, sheets in loaded[kind] for _, df in sheets)
+        result[f"ingest_{kind}"] = (lambda files=files, kind=kind: read_files(files, COLUMNS[kind]), rows)
+        result[f"cached_{kind}"] = (lambda files=files, kind=kind: read_files(files, COLUMNS[kind], cache), rows)
+
+    if "iv" in loaded:
+        sweeps, lengths = iv_arrays(loaded["iv"])
+        voltage = sweeps.Voltage.to_numpy()
+        sheet_starts = np.cumsum(lengths)[:-1]
+        starts, stops, polarity = segment_halfcycles(voltage, sheet_starts)
+        result["iv_segment"] = (lambda: segment_halfcycles(voltage, sheet_starts), len(voltage))
+        result["iv_switching"] = (lambda: halfcycle_metrics(sweeps.Voltage, sweeps.Current, sweeps.TimeOutput, starts, stops, polarity), len(starts))
+        result["iv_analyse"] = (lambda: [analyse_iv([df for _, df in sheets]) for _, sheets in loaded["iv"]], len(starts))
+
+        current = np.abs(sweeps.Current.to_numpy())
+        figure, ax, line = _iv_figure()
+        frames = np.linspace(0, len(starts) - 1, min(FRAMES, len(starts))).astype(int)
+
+        def redraw_halfcycle():
+            for index in frames:
+                _draw(figure, ax, line, voltage[starts[index]:stops[index]], current[starts[index]:stops[index]])
+        result["redraw_halfcycle"] = (redraw_halfcycle, len(frames))
+
+        def redraw_cumulative():
+            # Envelopes built once per dataset, then one decimated line per frame as in the viewer
+            pyramid = EnvelopePyramid(voltage, current, starts, stops)
+            x_range = (np.nanmin(voltage), np.nanmax(voltage))
+            width = figure.bbox.width
+            for index in frames:
+                _draw(figure, ax, line, *pyramid.line(index + 1, x_range, width))
+        result["redraw_cumulative"] = (redraw_cumulative, len(frames))
+
+        def redraw_density():
+            from matplotlib.colors import LogNorm
+            density = DensityHistogram()
+            density.add(voltage, current)
+            v_edges, i_edges = density.edges()
+            mesh = ax.pcolormesh(v_edges, i_edges, np.ma.masked_equal(density.counts, 0), norm=LogNorm(), zorder=1)
+            figure.canvas.draw()
+            mesh.remove()
+        result["redraw_density"] = (redraw_density, len(voltage))
+
+    if "pulses" in loaded:
+        pulse_sheets = [df for _, file_sheets in loaded["pulses"] for _, df in file_sheets]
+        result["pulse_metrics"] = (lambda: [analyse_pulse(df, "VMeasCh2", "IMeasCh1", "TimeOutput") for df in pulse_sheets],
+                                   len(pulse_sheets))
+
+    if "retention" in loaded:
+        retention_sheets = [(path, sheet, df) for path, file_sheets in loaded["retention"] for sheet, df in file_sheets]
+        result["retention"] = (lambda: analyse_retention(retention_sheets, "R", "Time", True), len(retention_sheets))
+
+    if "volatile" in loaded:
+        volatile_sheets = [df for _, file_sheets in loaded["volatile"] for _, df in file_sheets]
+        result["volatile"] = (lambda: analyse_volatile(volatile_sheets, "DrainV", "DrainI"), len(volatile_sheets))
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment():
+    import matplotlib
+    import scipy
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "pandas": pd.__version__, "scipy": scipy.__version__,
+            "matplotlib": matplotlib.__version__, "commit": _git_commit()}
+
+
+def run(paths, repeat, cache_directory, only=None):
+    results = {}
+    for name, (function, items) in stages(paths, cache_directory).items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        seconds = time_stage(function, repeat)
+        best = min(seconds)
+        results[name] = {"seconds": seconds, "best": best, "median": float(np.median(seconds)),
+                         "items": items, "us_per_item": best / items * 1e6 if items else None}
+        print(f"{name:<20} {best*1000:10.1f} ms" + (f"   {best / items * 1e6:9.2f} us/item" if items else ""), flush=True)
+    return results
+
+
+def compare(results, baseline):
+    print(f"\n{'stage':<20} {'before':>10} {'after':>10} {'change':>8}")
+    for name, entry in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["best"], entry["best"]
+        print(f"{name:<20} {before*1000:8.1f}ms {after*1000:8.1f}ms {(after / before - 1) * 100:+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Time loading, extraction and redraws on synthetic data.")
+    synthetic.add_arguments(parser)
+    parser.add_argument("--data", help="Folder for the generated workbooks, kept after the run (default: a temporary one)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every stage, the best one is reported")
+    parser.add_argument("--only", help="Comma separated stage name prefixes to run, e.g. ingest,iv_")
+    parser.add_argument("--out", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args(argv)
+    try:
+        kinds = synthetic.kinds_argument(args.kinds)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    with tempfile.TemporaryDirectory() as scratch:
+        data = args.data or os.path.join(scratch, "data")
+        start = time.perf_counter()
+        paths = synthetic.generate(data, kinds, args.cycles, args.points, args.files, args.cycles_per_sheet, args.seed)
+        print(f"Generated {sum(len(files) for files in paths.values())} workbooks in {time.perf_counter() - start:.1f} s", flush=True)
+        results = run(paths, args.repeat, os.path.join(scratch, "cache"), args.only.split(",") if args.only else None)
+
+    report = {"parameters": {"kinds": kinds, "cycles": args.cycles, "points": args.points, "files": args.files,
+                             "cycles_per_sheet": args.cycles_per_sheet, "seed": args.seed, "repeat": args.repeat},
+              "environment": environment(),
+              "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if baseline is not None:
+        compare(results, baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
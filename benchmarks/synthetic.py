@@ -0,0 +1,239 @@
+"""Synthetic Clarius workbooks for the benchmarks.
+
+The sheets have the layout the viewers expect from Clarius exports:
+
+- IV: ``Voltage``/``Current``/``TimeOutput`` sweeps 0 -> +V -> 0 -> -V -> 0, one set
+  and one reset half-cycle per cycle, with ``SetVoltage``/``ResetVoltage``/
+  ``SetResistance``/``ResetResistance`` holding one value per cycle (0 V when the
+  set or reset failed) in their first rows, as "Run"/"Append" sheets
+- pulses: a write pulse and a read pulse on ``VMeasCh2``, ``IMeasCh1`` inverted
+- retention: ``R`` against a logarithmic ``Time``, one read-out per point
+- volatile: ``DrainV``/``DrainI`` up-and-back sweeps, one cycle per sheet
+
+plus a few unused columns and the "Calc" and "Settings" sheets Clarius adds.
+The workbooks are written with a minimal xlsx writer, much faster than
+openpyxl, so that large datasets are quick to make.
+
+    python -m benchmarks.synthetic data/ --cycles 1000 --points 200 --files 4
+"""
+import argparse
+import os
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+KINDS = ("iv", "pulses", "retention", "volatile")
+# Unused columns in every data sheet, Clarius exports 20 or more
+EXTRA_COLUMNS = 6
+# Fraction of the IV cycles where the set or the reset fails
+FAIL_FRACTION = 0.02
+
+
+def _extra(df, rng):
+    for k in range(EXTRA_COLUMNS):
+        df[f"Extra{k}"] = rng.standard_normal(len(df))
+    return df
+
+
+def iv_sheet(rng, cycles, points, v_max=1.5):
+    """One IV sheet of ``cycles`` cycles, ``points`` points per half-cycle."""
+    k = points // 2
+    # 0 -> v_max -> just above 0, the next half-cycle starts at exactly 0 V
+    shape = np.concatenate([np.linspace(0, v_max, k, endpoint=False), np.linspace(v_max, 0, points - k + 1)[:-1]])
+    polarity = np.tile([1.0, -1.0], cycles)
+    voltage = shape * polarity[:, None]
+    threshold = rng.uniform(0.4, 0.7, len(polarity)) * v_max
+    r_lrs = rng.uniform(1e3, 2e3, cycles)
+    r_hrs = rng.uniform(5e4, 1e5, cycles)
+    # Set half-cycles go from HRS to LRS once |V| passes the threshold, resets the other way
+    switched = np.maximum.accumulate(np.abs(voltage) > threshold[:, None], axis=1)
+    set_rows = polarity > 0
+    resistance = np.where(switched == set_rows[:, None], np.repeat(r_lrs, 2)[:, None], np.repeat(r_hrs, 2)[:, None])
+    current = voltage / resistance * (1 + 0.01 * rng.standard_normal(voltage.shape))
+    current[voltage == 0] = 1e-12
+
+    n = voltage.size
+    df = pd.DataFrame({"Voltage": voltage.ravel(), "Current": current.ravel(),
+                       "TimeOutput": np.arange(n) * 0.01})
+    set_voltage, reset_voltage = threshold[set_rows], -threshold[~set_rows]
+    set_voltage[rng.random(cycles) < FAIL_FRACTION] = 0
+    reset_voltage[rng.random(cycles) < FAIL_FRACTION] = 0
+    for column, values in (("SetVoltage", set_voltage), ("ResetVoltage", reset_voltage),
+                           ("SetResistance", r_lrs), ("ResetResistance", r_hrs)):
+        df[column] = np.concatenate([values, np.full(n - cycles, np.nan)]) if n >= cycles else values[:n]
+    return _extra(df, rng)
+
+
+def pulse_sheet(rng, points):
+    """One pulse sheet of ``points`` samples: a write pulse at 1 V, then a read pulse at 0.1 V."""
+    n = max(points, 40)
+    index = np.arange(n)
+    voltage = np.zeros(n)
+    voltage[n // 4:n // 2] = 1.0
+    voltage[5 * n // 8:7 * n // 8] = 0.1
+    voltage += 0.005 * rng.standard_normal(n)
+    on = (index >= n // 4 + n // 20) & (index < 3 * n // 4)
+    current = voltage / np.where(on, rng.uniform(1e3, 2e3), rng.uniform(5e4, 1e5))
+    df = pd.DataFrame({"TimeOutput": index * 1e-6, "VMeasCh2": voltage, "IMeasCh1": -current})
+    return _extra(df, rng)
+
+
+def retention_sheet(rng, points, resistance):
+    time = np.logspace(0, 4, points)
+    df = pd.DataFrame({"Time": time, "R": resistance * (1 + 0.05 * rng.standard_normal(points))})
+    return _extra(df, rng)
+
+
+def volatile_sheet(rng, points, v_max=1.5):
+    """One volatile cycle: |V| up to ``v_max`` and back, on above a random threshold until part of the way back."""
+    k = points // 2
+    voltage = np.concatenate([np.linspace(0, v_max, k, endpoint=False), np.linspace(v_max, 0, points - k)])
+    on = np.zeros(points, dtype=bool)
+    on[np.argmax(voltage > rng.uniform(0.4, 0.7) * v_max):k + k // 5] = True
+    current = voltage / np.where(on, 1e3, 1e6) + 1e-13
+    df = pd.DataFrame({"Time": np.arange(points) * 0.01, "DrainV": voltage, "DrainI": current})
+    return _extra(df, rng)
+
+
+def sheets(kind, rng, cycles, points, cycles_per_sheet=10):
+    """``(sheet_name, DataFrame)`` of one workbook of ``kind`` with ``cycles`` cycles
+    (pulse sheets, retention read-out sheets or volatile sweeps for the other kinds)."""
+    if kind == "iv":
+        counts = [cycles_per_sheet] * (cycles // cycles_per_sheet) + ([cycles % cycles_per_sheet] if cycles % cycles_per_sheet else [])
+        frames = [iv_sheet(rng, count, points) for count in counts]
+    elif kind == "pulses":
+        frames = [pulse_sheet(rng, points) for _ in range(cycles)]
+    elif kind == "retention":
+        resistance = rng.choice([1e3, 1e5])
+        frames = [retention_sheet(rng, points, resistance) for _ in range(cycles)]
+    elif kind == "volatile":
+        frames = [volatile_sheet(rng, points) for _ in range(cycles)]
+    else:
+        raise ValueError(f"Unknown kind {kind!r}")
+    names = ["Run0"] + [f"Append{k}" for k in range(1, len(frames))]
+    return list(zip(names, frames))
+
+
+def _column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(65 + rest) + letters
+    return letters
+
+
+def _sheet_xml(df, strings):
+    letters = [_column_letter(k) for k in range(len(df.columns))]
+    header = "".join(f'<c r="{letter}1" t="s"><v>{strings.setdefault(str(column), len(strings))}</v></c>'
+                     for letter, column in zip(letters, df.columns))
+    rows = [f'<row r="1">{header}</row>']
+    columns = [df[column].to_numpy(dtype=np.float64).tolist() for column in df.columns]
+    for number, values in enumerate(zip(*columns), start=2):
+        # Empty cells are left out, as Excel does
+        cells = "".join(f'<c r="{letter}{number}"><v>{value!r}</v></c>'
+                        for letter, value in zip(letters, values) if value == value)
+        rows.append(f'<row r="{number}">{cells}</row>')
+    last = f"{letters[-1]}{len(df) + 1}" if letters else "A1"
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<dimension ref="A1:{last}"/><sheetData>{"".join(rows)}</sheetData></worksheet>')
+
+
+def write_workbook(path, sheets):
+    """Write ``(sheet_name, DataFrame)`` pairs as an .xlsx file, numbers only, header in shared strings."""
+    strings = {}
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for number, (_, df) in enumerate(sheets, start=1):
+            archive.writestr(f"xl/worksheets/sheet{number}.xml", _sheet_xml(df, strings))
+        shared = "".join(f"<si><t>{escape(text)}</t></si>" for text in strings)
+        archive.writestr("xl/sharedStrings.xml",
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                         '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                         f'count="{len(strings)}" uniqueCount="{len(strings)}">{shared}</sst>')
+        entries = "".join(f'<sheet name="{escape(name)}" sheetId="{number}" r:id="rId{number}"/>'
+                          for number, (name, _) in enumerate(sheets, start=1))
+        archive.writestr("xl/workbook.xml",
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                         '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                         'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+                         f'<sheets>{entries}</sheets></workbook>')
+        relations = "".join(f'<Relationship Id="rId{number}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                            f'Target="worksheets/sheet{number}.xml"/>' for number in range(1, len(sheets) + 1))
+        relations += (f'<Relationship Id="rId{len(sheets) + 1}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" '
+                      'Target="sharedStrings.xml"/>')
+        archive.writestr("xl/_rels/workbook.xml.rels",
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                         f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{relations}</Relationships>')
+        archive.writestr("_rels/.rels",
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                         '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+                         'Target="xl/workbook.xml"/></Relationships>')
+        overrides = "".join(f'<Override PartName="/xl/worksheets/sheet{number}.xml" '
+                            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                            for number in range(1, len(sheets) + 1))
+        archive.writestr("[Content_Types].xml",
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                         '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                         '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                         '<Default Extension="xml" ContentType="application/xml"/>'
+                         '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                         '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+                         f'{overrides}</Types>')
+
+
+def generate(directory, kinds=KINDS, cycles=200, points=200, files=2, cycles_per_sheet=10, seed=0):
+    """Write ``files`` workbooks of every kind in ``kinds`` to ``directory``, returns
+    ``{kind: [paths]}``. The same arguments always give the same data."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for kind in kinds:
+        # One stream per kind, so a kind gets the same data whichever others are generated with it
+        rng = np.random.default_rng([seed, KINDS.index(kind)])
+        paths[kind] = []
+        for number in range(files):
+            path = os.path.join(directory, f"{kind}_{number}.xlsx")
+            book = sheets(kind, rng, cycles, points, cycles_per_sheet)
+            book += [("Calc", pd.DataFrame({"Calc": [1.0]})), ("Settings", pd.DataFrame({"Settings": [1.0]}))]
+            write_workbook(path, book)
+            paths[kind].append(path)
+    return paths
+
+
+def add_arguments(parser):
+    parser.add_argument("--kinds", default=",".join(KINDS), help="Comma separated, out of " + ", ".join(KINDS))
+    parser.add_argument("--cycles", type=int, default=200, help="Cycles per file (pulse, retention or volatile sheets for those kinds)")
+    parser.add_argument("--points", type=int, default=200, help="Points per sweep, half-cycle or sheet")
+    parser.add_argument("--files", type=int, default=2, help="Files per kind")
+    parser.add_argument("--cycles-per-sheet", type=int, default=10, help="IV cycles per sheet")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def kinds_argument(value):
+    kinds = [kind for kind in value.split(",") if kind]
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown kind(s) {', '.join(sorted(unknown))}")
+    return kinds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.synthetic", description="Write synthetic Clarius workbooks.")
+    parser.add_argument("directory")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        kinds = kinds_argument(args.kinds)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    paths = generate(args.directory, kinds, args.cycles, args.points, args.files, args.cycles_per_sheet, args.seed)
+    for kind, files in paths.items():
+        print(f"{kind}: {', '.join(files)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
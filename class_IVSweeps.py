@@ -1,16 +1,30 @@
 from PyQt5.QtWidgets import (QApplication, QColorDialog, QWidget, QVBoxLayout, QPushButton, QSlider, QFileDialog, QComboBox, QLabel, QHBoxLayout, QMainWindow, QMenu, QMessageBox, QProgressDialog, QCheckBox)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas, NavigationToolbar2QT as NavigationToolbar
 from matplotlib.ticker import LogFormatterMathtext
-import mplcursors
+from matplotlib.colors import LogNorm
 import numpy as np
-from scipy.signal import find_peaks
-from openpyxl import load_workbook
-import xlrd
-import math
+from class_blit import BlitManager
+from class_hover import HoverTooltip
+from class_loader import DatasetConverter, SheetLoader
+from class_scheduler import FrameScheduler
+from memristor_core.dataset import open_dataset
+from memristor_core.iv import analyse_iv, valid_positions, valid_values
+from memristor_core.density import DensityHistogram
+from memristor_core.lod import MAX_EXACT_POINTS, EnvelopePyramid
+from memristor_core.profiling import timed
+from memristor_core.store import plot_dtype
+
+class AutoscaleToolbar(NavigationToolbar):
+    """Home also turns autoscaling back on, so the plot follows the slider again after zooming."""
+    def home(self, *args):
+        super().home(*args)
+        for ax in self.canvas.figure.axes:
+            ax.autoscale()
+        self.canvas.draw_idle()
 
 class IVSweepsAnalyser(QWidget):
     def __init__(self):
@@ -39,7 +53,11 @@ class IVSweepsAnalyser(QWidget):
         self.canvas = FigureCanvas(self.figure)
         self.canvas.setContextMenuPolicy(Qt.CustomContextMenu)
         self.canvas.customContextMenuRequested.connect(self.show_context_menu)
-        main_plot_layout.addWidget(self.canvas, stretch=2)
+        main_canvas_layout = QVBoxLayout()
+        self.toolbar = AutoscaleToolbar(self.canvas, self)
+        main_canvas_layout.addWidget(self.toolbar)
+        main_canvas_layout.addWidget(self.canvas)
+        main_plot_layout.addLayout(main_canvas_layout, stretch=2)
         main_layout.addLayout(main_plot_layout)
 
         # Additional plot areas
@@ -156,7 +174,19 @@ class IVSweepsAnalyser(QWidget):
         self.checkbox_grid = QCheckBox("Grid on/off")
         self.checkbox_grid.setChecked(False)  # Initially unchecked
         main_plot_labels_layout.addWidget(self.checkbox_grid, alignment=Qt.AlignBottom)
-        self.checkbox_grid.stateChanged.connect(self.update_plot)
+        self.checkbox_grid.stateChanged.connect(self.update_styling)
+
+        # Create a checkbox for marking the current cycle on the resistance plot
+        self.checkbox_highlight = QCheckBox("Highlight current cycle")
+        self.checkbox_highlight.setChecked(True)  # Initially checked
+        main_plot_labels_layout.addWidget(self.checkbox_highlight, alignment=Qt.AlignBottom)
+        self.checkbox_highlight.stateChanged.connect(self.update_plot)
+
+        # Create a checkbox for showing all samples as a 2D histogram under the current half-cycle
+        self.checkbox_density = QCheckBox("Density plot")
+        self.checkbox_density.setChecked(False)  # Initially unchecked
+        main_plot_labels_layout.addWidget(self.checkbox_density, alignment=Qt.AlignBottom)
+        self.checkbox_density.stateChanged.connect(self.update_plot)
 
         # Create a checkbox for ignoring bad sheets (missing sets/resets)
         self.checkbox_ignore = QCheckBox("Ignore faulty sheets")
@@ -206,23 +236,41 @@ class IVSweepsAnalyser(QWidget):
         button_layout.addWidget(self.export_button)
         self.export_button.setFixedSize(150, 50)
 
+        # Convert button, the sweeps of the files are written to a dataset folder and memory-mapped from there
+        self.convert_button = QPushButton("Convert Files")
+        self.convert_button.setToolTip("Convert Excel files into a dataset folder that opens without loading everything")
+        self.convert_button.clicked.connect(self.convert_files)
+        button_layout.addWidget(self.convert_button)
+        self.convert_button.setFixedSize(150, 50)
+
+        # Open a converted dataset
+        self.open_dataset_button = QPushButton("Open Dataset")
+        self.open_dataset_button.clicked.connect(self.choose_dataset)
+        button_layout.addWidget(self.open_dataset_button)
+        self.open_dataset_button.setFixedSize(150, 50)
+
         # Add the button layout to the main layout
         under_graph_hbox.addLayout(button_layout)
         
         main_layout.addLayout(under_graph_hbox)
         
         self.file_paths = ""
+        self.loader = None
+        self.converter = None
+        self.redraw_pending = False
+        self.new_data = False
+        self.lod = None             # EnvelopePyramid of the decimated cumulative plot, only used by the worker
+        self.lod_shown = False      # The main plot shows the decimated data
+        self.showing_frame = False
         ################## Initialize all to be extracted data ##################
+        self.result = None      # IVResult of the sheets loaded so far
         self.sweeps = []
-        self.dfreset = []
-        self.dfset = []
-        self.Vreset = []
-        self.Vset = []
-        self.Rreset = []
-        self.Rset = []
-        self.ResVoltage = []
-        self.SetVoltage = []
-        self.datapts = 300
+        self.halfcycles = None
+        self.cycles = None
+        self.density = DensityHistogram()   # Counts of all loaded samples, added to as the sheets arrive
+        self.valid = {}
+        self.sorted_values = {}
+        self.res_positions = {}
         self.current_index = 0
         self.VChannel = "Voltage"  # Default voltage channel
         self.IChannel = "Current"  # Default current channel
@@ -230,6 +278,10 @@ class IVSweepsAnalyser(QWidget):
         self.reset_color = 'red' # Default reset color
         self.voltage_color = 'red'  # Default voltage color
 
+        # Slider moves are coalesced, the data of the frame is sliced on a worker thread
+        self.scheduler = FrameScheduler(self.prepare_frame, self.show_frame, self)
+        self.init_plots()
+
     ####################### Switch between CDF plots and Resistance plot#################################
     def update_plot_visibility(self):
         selected_plot = self.plot_type_dropdown.currentText()
@@ -244,144 +296,163 @@ class IVSweepsAnalyser(QWidget):
         # Ensure layout updates are applied
         self.plots_layout.invalidate()
         self.plots_layout.update()
+        for _, canvas in self.figures():
+            self.redraw(canvas)
+
+    ####################### Columns of the Excel sheets used by the analysis, nothing else is parsed ###########################
+    def required_columns(self):
+        return (self.VChannel, self.IChannel, "TimeOutput", "SetResistance", "ResetResistance", "SetVoltage", "ResetVoltage")
 
     ####################### Function used in upload_files to clear everything ###########################
     def clear_lists(self):
+        self.scheduler.reset()
+        self.result = None      # IVResult of the sheets loaded so far
         self.sweeps = []
-        self.Rset = []
-        self.Rreset = []
-        self.Vset = []
-        self.Vreset = []
-        self.dfset = []
-        self.dfreset = []
-        self.ResVoltage = []
-        self.SetVoltage = []
+        self.halfcycles = None
+        self.cycles = None
+        self.density = DensityHistogram()
+        self.density_version = None
+        self.lod = None
         
-    ####################### Main funcion of the script, reads excel files, calculates and initializes everything, initializes plots ###########################
+    ####################### Main funcion of the script, starts reading the excel files in the background ###########################
     def upload_files(self):
-        try:
-            options = QFileDialog.Options()
-            self.file_paths, _ = QFileDialog.getOpenFileNames(self, "Upload Excel Files", "", "Excel Files (*.xls *.xlsx)", options=options)
-            
-            if len(self.file_paths) == 0:   ## Do nothing if there are no selected files i.e. cancel was clicked
-                return
-            if len(self.sweeps) != 0:   ## If other files are uploaded again empty the existing sweeps
-                self.clear_lists()
-
-            # Initialize progress dialog
-            progress = QProgressDialog("Loading files...", "Cancel", 0, len(self.file_paths), self)
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setAutoClose(True)
-            progress.setAutoReset(True)
-
-            # Read all sheets in all selected files except for the "Calc" and "Settings" sheets.
-            total_steps = 0
-            for file_path in self.file_paths:
-                if file_path.endswith('.xlsx'):
-                    total_steps += len(load_workbook(file_path, read_only=True).sheetnames) - 2  # Calculate total steps
-                else:
-                    total_steps += len(xlrd.open_workbook(file_path).sheets()) - 2
-            progress.setRange(0, total_steps)
-            current_step = 0
-
-            ## Read all sheets in all selected files except for the "Calc" and "Settings" sheets.
-            for file_path in self.file_paths:
-                if progress.wasCanceled():
-                    return  # Handle cancellation
-
-                excel_file = pd.ExcelFile(file_path)
-                sheet_names = [sheet for sheet in excel_file.sheet_names if sheet not in ["Calc", "Settings"]]
-                
-                for sheet in sheet_names:
-                    if progress.wasCanceled():
-                        return  # Handle cancellation
-                    self.sweeps.append(pd.read_excel(file_path, sheet_name=sheet))
-                    current_step += 1
-                    progress.setValue(current_step)
-                    
-            # Filter the sweeps to remove those where the first value of the Voltage column is NaN
-            self.sweeps = [sweep for sweep in self.sweeps if not pd.isna(sweep.Voltage.iloc[0])]
-            if self.checkbox_ignore.isChecked():
-                self.sweeps = [sweep for sweep in self.sweeps if not sweep.ResetVoltage.notna().sum()!=sweep.SetVoltage.notna().sum()]
-
-            if len(self.sweeps) == 0:
-                raise KeyError("Excel files provided have no data")
-
-            ## Extract Rset, Rreset and zero indexes from an array 
-            for sweep in self.sweeps:
-                self.Rset.append(sweep.SetResistance)
-                self.Rreset.append(sweep.ResetResistance)
-                self.ResVoltage.append(sweep.ResetVoltage)
-                self.SetVoltage.append(sweep.SetVoltage)
-
-
-            self.sweeps = pd.concat(self.sweeps, ignore_index=True)
-            self.Rset = pd.concat(self.Rset, ignore_index=True)
-            self.Rset = self.Rset[~np.isnan(self.Rset)]
-            self.Rset = self.Rset.to_numpy()
-            self.Rreset = pd.concat(self.Rreset, ignore_index=True)
-            self.Rreset = self.Rreset[~np.isnan(self.Rreset)]
-            self.ResVoltage = pd.concat(self.ResVoltage, ignore_index=True)
-            self.ResVoltage = self.ResVoltage[~np.isnan(self.ResVoltage)]
-            self.SetVoltage = pd.concat(self.SetVoltage, ignore_index=True)
-            self.SetVoltage = self.SetVoltage[~np.isnan(self.SetVoltage)]
-
-            no_reset_idx = np.where(self.ResVoltage==0)[0].tolist()
-            no_set_idx = np.where(self.SetVoltage==0)[0].tolist()
-            
-            # Update zero indexes and datapoints (usually 300)
-            zero_idxes = [index for index, value in enumerate(self.sweeps.Voltage) if value == 0]
-            
-            self.datapts = zero_idxes[1]
-            zero_idxes.append(zero_idxes[-1]+(self.datapts-1))
+        options = QFileDialog.Options()
+        self.file_paths, _ = QFileDialog.getOpenFileNames(self, "Upload Excel Files", "", "Excel Files (*.xls *.xlsx)", options=options)
         
-            for i in zero_idxes[1:]:
-                df = self.sweeps[(i-self.datapts):i]
-                if df.Voltage[i+2-self.datapts] < 0:
-                    self.dfreset.append(df)
-                else:
-                    self.dfset.append(df)
-            
-            self.slider.setMaximum(len(zero_idxes)-1)
-            self.current_index = 0
+        if len(self.file_paths) == 0:   ## Do nothing if there are no selected files i.e. cancel was clicked
+            return
+        self.stop_loading()
+        if len(self.sweeps) != 0:   ## If other files are uploaded again empty the existing sweeps
+            self.clear_lists()
+
+        # Progress dialog, not modal so the cycles that are already loaded can be looked at
+        self.progress = QProgressDialog("Loading files...", "Cancel", 0, len(self.file_paths), self)
+        self.progress.setAutoClose(True)
+        self.progress.setAutoReset(True)
+
+        # Read all sheets in all selected files except for the "Calc" and "Settings" sheets in a background thread.
+        # Sheets come back in file/sheet order and are added to the plots as they arrive.
+        self.loader = SheetLoader(self.file_paths, self.required_columns(), self)
+        self.loader.attach_progress(self.progress)
+        self.loader.sheets_loaded.connect(self.add_sheets)
+        self.loader.failed.connect(self.loading_failed)
+        self.loader.done.connect(self.loading_done)
+        self.loader.start()
+
+    ####################### Loader signals, anything still queued from an older or canceled load is ignored ###########################
+    def from_current_loader(self):
+        return self.sender() is self.loader and not self.loader.is_canceled()
+
+    def stop_loading(self):
+        if self.loader is not None:
+            self.loader.stop()
+
+    def closeEvent(self, event):
+        self.stop_loading()
+        if self.converter is not None:
+            self.converter.stop()
+        self.scheduler.reset()
+        super().closeEvent(event)
+
+    def loading_failed(self, message):
+        if self.sender() is self.loader:
+            QMessageBox.critical(self, "Error", f"Could not read the files: {message}")
+
+    def loading_done(self):
+        if self.from_current_loader() and len(self.sweeps) == 0:
+            QMessageBox.critical(self, "Error", "Voltage column doesn't have data: 'Excel files provided have no data'. Please try another file.")
+
+    def redraw_loaded(self):
+        self.redraw_pending = False
+        self.plot_stats()
+        self.update_plot()
 
-            self.slider.setValue(0)
-            self.update_plot()
+    # Grid on/off applies to every plot
+    def update_styling(self):
+        self.plot_stats()
+        self.update_plot()
 
-            #self.sweeps = [sweep for sweep in self.sweeps if not sweep.ResetVoltage.notna().sum()!=sweep.SetVoltage.notna().sum()]
-
-            self.update_Vreset(self.dfreset)
-            self.update_Vset(self.dfset)
-
-            ## Where Set or Reset didn't happen delete Vset/Vreset and Rset/Rreset
-            for idx in sorted(no_set_idx, reverse=False):
-                self.Vset.insert(idx, math.nan)
-                self.Rset = np.insert(self.Rset, idx, np.nan)
-
-            for idx in sorted(no_reset_idx,reverse=False):
-                self.Vreset.insert(idx, math.nan)
-                self.Rreset = np.insert(self.Rreset, idx, np.nan)
-
-
-            for index in sorted(no_set_idx,reverse=True):
-                del self.Vreset[index]
-            self.Rreset = np.delete(self.Rreset,no_set_idx)
-            for index in sorted(no_reset_idx,reverse=True):
-                del self.Vset[index]
-            self.Rset = np.delete(self.Rset,no_reset_idx)
-            
-            #delete all nans 
-            self.Vset = [x for x in self.Vset if not math.isnan(x)]
-            self.Vreset = [x for x in self.Vreset if not math.isnan(x)]
-            self.Rset = self.Rset[~np.isnan(self.Rset)]
-            self.Rreset = self.Rreset[~np.isnan(self.Rreset)]
-
-            self.Vreset_label.setText(f"Average Vreset: {np.mean(self.Vreset):.3f} ")
-            self.Vset_label.setText(f"Average Vset: {np.mean(self.Vset):.3f} ")
-            self.total_cycles.setText(f"Total cycles: {(len(zero_idxes)-1)/2} ")
+    ####################### Adds freshly read sheets: half-cycles, Vset/Vreset and cycle table are extended, plots updated ###########################
+    @timed()
+    def add_sheets(self, sheets):
+        if not self.from_current_loader():
+            return
+        try:
+            # Vset/Vreset and plot bounds of every new half-cycle, computed once and looked up by update_plot
+            result = analyse_iv([df for _, _, df in sheets], self.VChannel, self.IChannel,
+                                self.checkbox_ignore.isChecked(), previous=self.result, dtype=plot_dtype())
+            if result is self.result:
+                return
+            first_sheets = self.result is None
+            offset = len(self.sweeps)
+            self.density.add(result.sweeps[self.VChannel][offset:], np.abs(result.sweeps[self.IChannel][offset:]))
+            self.show_result(result, first_sheets)
         except KeyError as e:
+            self.stop_loading()
+            self.clear_lists()
             QMessageBox.critical(self, "Error", f"Voltage column doesn't have data: {str(e)}. Please try another file.")
 
+    def show_result(self, result, first_sheets):
+        self.result = result
+        self.sweeps, self.halfcycles, self.cycles = result.sweeps, result.halfcycles, result.cycles
+        self.cache_stats()
+
+        self.slider.setMaximum(len(self.halfcycles))
+        # Batches that arrive back to back are drawn once
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            QTimer.singleShot(0, self.redraw_loaded)
+        if first_sheets:
+            self.current_index = 0
+            self.slider.setValue(0)
+            self.new_data = True
+
+        self.Vreset_label.setText(f"Average Vreset: {result.mean('Vreset'):.3f} ")
+        self.Vset_label.setText(f"Average Vset: {result.mean('Vset'):.3f} ")
+        self.total_cycles.setText(f"Total cycles: {result.total_cycles} ")
+
+    ####################### Converted datasets: the sweeps stay on disk and only the plotted half-cycles are read ###########################
+    def convert_files(self):
+        options = QFileDialog.Options()
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Excel Files to Convert", "", "Excel Files (*.xls *.xlsx)", options=options)
+        if len(file_paths) == 0:
+            return
+        directory = QFileDialog.getExistingDirectory(self, "Empty Folder for the Dataset")
+        if not directory:
+            return
+        if self.converter is not None:
+            self.converter.stop()
+
+        self.convert_progress = QProgressDialog("Converting files...", "Cancel", 0, len(file_paths), self)
+        self.converter = DatasetConverter(file_paths, directory, self.VChannel, self.IChannel,
+                                          self.checkbox_ignore.isChecked(), plot_dtype(), self)
+        self.converter.attach_progress(self.convert_progress)
+        self.converter.done.connect(self.load_dataset)
+        self.converter.failed.connect(self.conversion_failed)
+        self.converter.start()
+
+    def conversion_failed(self, message):
+        QMessageBox.critical(self, "Error", f"Could not convert the files: {message}")
+
+    def choose_dataset(self):
+        directory = QFileDialog.getExistingDirectory(self, "Open Dataset")
+        if directory:
+            self.load_dataset(directory)
+
+    def load_dataset(self, directory):
+        try:
+            result, density, envelopes = open_dataset(directory)
+        except (ValueError, KeyError, OSError) as e:
+            QMessageBox.critical(self, "Error", f"Could not open the dataset: {e}")
+            return
+        self.stop_loading()
+        self.clear_lists()
+        self.file_paths = [directory]
+        self.VChannel, self.IChannel = result.sweeps.channels
+        self.density = density
+        self.lod = envelopes
+        self.show_result(result, True)
+
     ########################### Update-ing plot after slider move or checkbox change #################################
     def update_plot(self, *args):
         self.current_index = self.slider.value()-1
@@ -389,26 +460,62 @@ class IVSweepsAnalyser(QWidget):
             return
         elif len(self.sweeps) == 0:
             return
+        # The visible range and width of the main plot decide how far large plots are decimated
+        view = (self.ax1.get_autoscalex_on(), self.ax1.get_xlim(), self.ax1.bbox.width)
+        self.scheduler.request(self.sweeps, self.halfcycles, self.current_index, self.checkbox.isChecked(), self.checkbox_density.isChecked(), view)
+
+    # Runs on the worker thread: slice the data of the half-cycle, no widgets in here
+    def prepare_frame(self, sweeps, halfcycles, index, single, density, view):
         # Update the dataframe with the step of the slider
-        if self.checkbox.isChecked():
-            df = self.sweeps[self.datapts*(self.current_index):self.datapts*(self.current_index+1)]
-            self.plot_data(df)
+        start, stop = halfcycles.at[index, "Start"], halfcycles.at[index, "Stop"]
+        if density:
+            # The histogram shows all half-cycles, the line only the current one
+            shown = halfcycles
+            single = True
+        elif single:
+            shown = halfcycles[index:index+1]
         else:
-            df = self.sweeps[0:self.datapts*(self.current_index+1)]
-            self.plot_data(df)
-
-        self.plot_cdf_V()
-        self.plot_cdf_R()
-        self.plot_res()
+            start = 0
+            shown = halfcycles[0:index+1]
+        # Limits from the bounds of the plotted half-cycles
+        x_bounds = (np.nanmin(shown.Vmin), np.nanmax(shown.Vmax))
+        y_bounds = (np.nanmin(shown.Imin), np.nanmax(shown.Imax))
+        decimated = not single and stop > MAX_EXACT_POINTS
+        if decimated:
+            # Too many points to draw them all: min/max envelopes about a pixel wide
+            # While files are loading only the half-cycles of the new batches are added
+            if self.lod is None:
+                self.lod = EnvelopePyramid(sweeps[self.VChannel], sweeps[self.IChannel],
+                                           halfcycles.Start.to_numpy(), halfcycles.Stop.to_numpy())
+            elif self.lod.count < len(halfcycles):
+                self.lod.extend(sweeps[self.VChannel], sweeps[self.IChannel],
+                                halfcycles.Start.to_numpy(), halfcycles.Stop.to_numpy())
+            autoscale, xlim, width = view
+            voltage, current = self.lod.line(index+1, x_bounds if autoscale else xlim, width)
+        else:
+            # Views of the store, only |I| is a copy
+            voltage = sweeps[self.VChannel][start:stop]
+            current = np.abs(sweeps[self.IChannel][start:stop])
+        return index, voltage, current, x_bounds, y_bounds, decimated, density, halfcycles.at[index, "Vswitch"], halfcycles.at[index, "Polarity"]
+
+    def show_frame(self, frame):
+        index, voltage, current, x_bounds, y_bounds, self.lod_shown, density, vswitch, polarity = frame
+        self.showing_frame = True
+        self.plot_density(density)
+        self.plot_data(voltage, current, x_bounds, y_bounds)
+        self.showing_frame = False
+        self.plot_highlight(index)
+        if self.new_data:   # Tick labels of the new data can be wider, lay the plots out again
+            self.new_data = False
+            self.relayout()
 
         # Update Vset and Vreset labels
-        self.slider_counter.setText(f"Halfcycle nr: {self.current_index+1} ")
-        temp_df = self.sweeps[self.datapts*(self.current_index):self.datapts*(self.current_index+1)]
-        if temp_df.Voltage[self.datapts*(self.current_index)+1] > 0:
-            self.current_Vset.setText(f"Vset: {self.write_Vset(temp_df):.3f} ")
+        self.slider_counter.setText(f"Halfcycle nr: {index+1} ")
+        if polarity > 0:
+            self.current_Vset.setText(f"Vset: {vswitch:.3f} ")
             self.current_Vreset.setText("Vreset: N/A")
         else:
-            self.current_Vreset.setText(f"Vreset: {self.write_Vreset(temp_df):.3f} ")
+            self.current_Vreset.setText(f"Vreset: {vswitch:.3f} ")
             self.current_Vset.setText("Vset: N/A")
 
     ############################ Save Data ##########################################
@@ -421,19 +528,15 @@ class IVSweepsAnalyser(QWidget):
             if not file_path.endswith('.xlsx'):
                 file_path += '.xlsx'
 
-            # Make sure Vreset and Vset are the same length
-            max_length = max(len(self.Vreset), len(self.Vset), len(self.Rreset), len(self.Rset))
-            Vreset_padded = np.pad(self.Vreset, (0, max_length - len(self.Vreset)), constant_values=np.nan)
-            Vset_padded = np.pad(self.Vset, (0, max_length - len(self.Vset)), constant_values=np.nan)
-            Rset_padded = np.pad(self.Rset, (0, max_length - len(self.Rset)), constant_values=np.nan)
-            Rreset_padded = np.pad(self.Rreset, (0, max_length - len(self.Rreset)), constant_values=np.nan)
-
-            # Convert Vreset to a pandas DataFrame and save to Excel
-            df = pd.DataFrame({'Vreset': Vreset_padded, 'Vset': Vset_padded, 'Rset' : Rset_padded, 'Rreset' : Rreset_padded})
+            # Valid values of every column, padded to the same length; empty before a file is loaded
+            columns = {column: self.valid.get(column, np.empty(0)) for column in ('Vreset', 'Vset', 'Rset', 'Rreset')}
+            max_length = max(len(values) for values in columns.values())
+            df = pd.DataFrame({column: np.pad(values, (0, max_length - len(values)), constant_values=np.nan)
+                               for column, values in columns.items()})
             try:
                 # Try to save the DataFrame to Excel
                 df.to_excel(file_path, index=False)
-                QMessageBox.information(self, 'Export Status', f"Exported: {len(self.Vset)} cycles!")
+                QMessageBox.information(self, 'Export Status', f"Exported: {len(columns['Vset'])} cycles!")
 
             except ValueError as e:
                 if "This sheet is too large!" in str(e):
@@ -448,247 +551,209 @@ class IVSweepsAnalyser(QWidget):
                     # Reraise any other exceptions
                     raise e
 
-    ########################## Vset calculation for the current plotted Vset (Vreset stays N/A) #########################################
-    def write_Vset(self, df):
-        forth_idxes = np.where(np.gradient(df.Voltage)>0)[0]
-        forth_idxes = forth_idxes[df.Voltage.iloc[forth_idxes] > 0.05]
-        setvoltage = df.Voltage.iloc[forth_idxes]
-        setcurrent = df.Current.iloc[forth_idxes]
-        settime = df.TimeOutput.iloc[forth_idxes]
-        R = setvoltage.abs()/setcurrent.abs()
-        dR = -(np.gradient(np.log(R)))
-        max_idx,_ = find_peaks(dR)
-        
-        highest_peak = max_idx[np.argmax(dR[max_idx])]
-        threshold = 0.7 * dR[highest_peak]
-        max_idx2 = max_idx[dR[max_idx] >= threshold]
-        max_dR = dR[max_idx2]
-        max_t = settime.iloc[max_idx2]
-
-        if max_dR.size == 0:
-            VSET = np.min(setvoltage)
-        else:
-            idx_RESET = np.where(settime == max_t.iloc[-1])[0][0]
-            VSET = setvoltage.iloc[idx_RESET]
-            if abs(VSET) < 0.05:
-                VSET = setvoltage.iloc[-1]
-        return VSET
-    
-    ########################## Vreset calculation for the current plotted Vreset (Vset stays N/A) #########################################
-    def write_Vreset(self, df):
-        # Take only the sweep in and not the sweep back part 
-        # and also get rid of the first part of the sweep because it messes with the
-        forth_idxes = np.where(np.gradient(df.Voltage)<0)[0]
-        forth_idxes = forth_idxes[df.Voltage.iloc[forth_idxes] < -0.05]
-        resvoltage = df.Voltage.iloc[forth_idxes]
-        rescurrent = df.Current.iloc[forth_idxes]
-        restime = df.TimeOutput.iloc[forth_idxes]
-        R = resvoltage.abs()/rescurrent.abs()
-        dR = np.gradient(np.log(R))
-        max_idx,_ = find_peaks(dR)
-        
-        highest_peak = max_idx[np.argmax(dR[max_idx])]
-        threshold = 0.7 * dR[highest_peak]
-        max_idx2 = max_idx[dR[max_idx] >= threshold]
-        
-        max_dR = dR[max_idx2]
-        max_t = restime.iloc[max_idx2]
+    ############################ Axes and lines of all plots, created once and updated with new data afterwards ##################################
+    def init_plots(self):
+        # Main plot
+        self.ax1.set_xlabel('Voltage')
+        self.ax1.set_yscale('log')
+        # Format y-axis with scientific notation
+        self.ax1.yaxis.set_major_formatter(LogFormatterMathtext(base=10))
+        self.iv_line, = self.ax1.plot([], [], color=self.voltage_color, linewidth=1.5, alpha=0.8, label=self.VChannel)
+        # Only the IV line is redrawn while scrubbing, the axes are kept as a picture
+        self.blit = BlitManager(self.canvas, [self.iv_line])
+        self.ax1.callbacks.connect('xlim_changed', self.view_changed)
+        # Density plot, made from the histogram when it is first shown and again when more data has been added to it
+        self.density_mesh = None
+        self.density_version = None
+        self.density_cax = self.ax1.inset_axes([1.02, 0, 0.03, 1])
+        self.density_cax.set_visible(False)
+        self.density_colorbar = None
+
+        # Voltage CDF plot
+        self.ax2.set_xlabel('Voltage')
+        self.ax2.set_ylabel('Probability', color='black')
+        self.cdf_Vset_line, = self.ax2.plot([], [], color=self.set_color, marker='.', linestyle='none', label='Vset')
+        self.cdf_Vreset_line, = self.ax2.plot([], [], color=self.reset_color, marker='.', linestyle='none', label='Vreset')
+        self.ax2.legend()
 
-        if max_dR.size == 0:
-            VRESET = np.min(resvoltage)
-        else:
-            idx_RESET = np.where(restime == max_t.iloc[-1])[0][0]
-            VRESET = resvoltage.iloc[idx_RESET]
-            if abs(VRESET) < 0.05:
-                VRESET = resvoltage.iloc[-1]
-        return VRESET
-    
-    ##################### Same algorithm as write_Vset but calculates all Vsets of all cycles ###########################
-    def update_Vset(self, dfset):
-        if len(dfset) == 0:
-            return
-        for set_sweep in dfset:
-            # Take only the sweep in and not the sweep back part 
-            # and also get rid of the first part of the sweep because it messes with the gradient
-            forth_idxes = np.where(np.gradient(set_sweep.Voltage)>0)[0]
-            forth_idxes = forth_idxes[set_sweep.Voltage.iloc[forth_idxes] > 0.05]
-            setvoltage = set_sweep.Voltage.iloc[forth_idxes]
-            setcurrent = set_sweep.Current.iloc[forth_idxes]
-            settime = set_sweep.TimeOutput.iloc[forth_idxes]
-            R = setvoltage.abs()/setcurrent.abs()
-            dR = -(np.gradient(np.log(R)))
-            max_idx,_ = find_peaks(dR)
-            
-            highest_peak = max_idx[np.argmax(dR[max_idx])]
-            threshold = 0.7 * dR[highest_peak]
-            max_idx2 = max_idx[dR[max_idx] >= threshold]
-            max_dR = dR[max_idx2]
-            max_t = settime.iloc[max_idx2]
-
-            if max_dR.size == 0:
-                VSET = np.min(setvoltage)
-            else:
-                idx_RESET = np.where(settime == max_t.iloc[-1])[0][0]
-                VSET = setvoltage.iloc[idx_RESET]
-                if abs(VSET) < 0.05:
-                    VSET = setvoltage.iloc[-1]
-            self.Vset.append(VSET)
-
-    ##################### Same algorithm as write_Vreset but calculates all Vresets of all cycles ###########################
-    def update_Vreset(self, dfreset):
-        if len(dfreset) == 0:
-            return
-        for reset_sweep in dfreset:
-            # Take only the sweep in and not the sweep back part 
-            # and also get rid of the first part of the sweep because it messes with the
-            forth_idxes = np.where(np.gradient(reset_sweep.Voltage)<0)[0]
-            forth_idxes = forth_idxes[reset_sweep.Voltage.iloc[forth_idxes] < -0.05]
-            resvoltage = reset_sweep.Voltage.iloc[forth_idxes]
-            rescurrent = reset_sweep.Current.iloc[forth_idxes]
-            restime = reset_sweep.TimeOutput.iloc[forth_idxes]
-            R = resvoltage.abs()/rescurrent.abs()
-            dR = np.gradient(np.log(R))
-            max_idx,_ = find_peaks(dR)
-            
-            highest_peak = max_idx[np.argmax(dR[max_idx])]
-            threshold = 0.7 * dR[highest_peak]
-            max_idx2 = max_idx[dR[max_idx] >= threshold]
-            
-            max_dR = dR[max_idx2]
-            max_t = restime.iloc[max_idx2]
-
-            if max_dR.size == 0:
-                VRESET = np.min(resvoltage)
-            else:
-                idx_RESET = np.where(restime == max_t.iloc[-1])[0][0]
-                VRESET = resvoltage.iloc[idx_RESET]
-                if abs(VRESET) < 0.05:
-                    VRESET = resvoltage.iloc[-1]
-            self.Vreset.append(VRESET)
-        
-    ############################ Main Plot ##################################
-    def plot_data(self, df):
-        # Clear the previous plot
-        self.figure.clear()
+        # Resistance CDF plot
+        self.ax3.set_xlabel('Resistance (Ohm)')
+        self.ax3.set_ylabel('Probability', color='black')
+        self.ax3.set_xscale('log')
+        self.cdf_Rset_line, = self.ax3.plot([], [], color=self.set_color, marker='.', linestyle='none', label='Rset')
+        self.cdf_Rreset_line, = self.ax3.plot([], [], color=self.reset_color, marker='.', linestyle='none', label='Rreset')
+        self.ax3.legend()
+
+        # Resistance plot
+        self.ax4.set_xlabel('Nr. of Cycle')
+        self.ax4.set_ylabel('Resistance', color='blue')
+        self.ax4.set_yscale('log')
+        self.res_Rset_points = self.ax4.scatter([], [], color='red', label='Low Resistance')
+        self.res_Rreset_points = self.ax4.scatter([], [], color='blue', label='High Resistance')
+        self.ax4.legend()
+        self.res_highlight, = self.ax4.plot([], [], color='black', marker='o', markersize=12, markerfacecolor='none', markeredgewidth=1.5, linestyle='none', visible=False)
+        self.res_blit = BlitManager(self.canvas4, [self.res_highlight])
+
+        # Add interactive cursors, one per canvas
+        self.hover = HoverTooltip(self.canvas, [self.iv_line], blit=self.blit)
+        self.hover2 = HoverTooltip(self.canvas2, [self.cdf_Vset_line, self.cdf_Vreset_line])
+        self.hover3 = HoverTooltip(self.canvas3, [self.cdf_Rset_line, self.cdf_Rreset_line])
+        self.hover4 = HoverTooltip(self.canvas4, [self.res_Rset_points, self.res_Rreset_points], blit=self.res_blit)
+
+        # The layout is only redone when a canvas is resized (and when new files are loaded), not on every update
+        for figure, canvas in self.figures():
+            figure.tight_layout()
+            canvas.mpl_connect('resize_event', lambda event, figure=figure: figure.tight_layout())
+
+    # Zooming or panning a decimated plot decimates it again for the new range
+    def view_changed(self, ax):
+        if self.lod_shown and not self.showing_frame:
+            self.update_plot()
 
-        # Create new axes
-        self.ax1 = self.figure.add_subplot(111)
+    def figures(self):
+        return [(self.figure, self.canvas), (self.figure2, self.canvas2), (self.figure3, self.canvas3), (self.figure4, self.canvas4)]
+
+    # Hidden canvases are drawn when they are shown again
+    def redraw(self, canvas):
+        if canvas.isVisible():
+            canvas.draw_idle()
+
+    def relayout(self):
+        for figure, canvas in self.figures():
+            figure.tight_layout()
+            self.redraw(canvas)
+
+    ############################ Axis limits from the bounds of the plotted data, without going through all the points ##################################
+    def set_limits(self, ax, x_bounds, y_bounds):
+        corners = np.array([[x_bounds[0], y_bounds[0]], [x_bounds[1], y_bounds[1]]], dtype=float)
+        ax.ignore_existing_data_limits = True
+        if np.isfinite(corners).all():
+            ax.update_datalim(corners)
+        ax.autoscale_view()
+
+    def bounds(self, values):
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return (np.nan, np.nan)
+        return (values.min(), values.max())
 
+    ############################ Main Plot ##################################
+    def plot_data(self, voltage, current, x_bounds, y_bounds):
         # Left axis for Voltage Channel
-        self.ax1.set_xlabel('Voltage')
         self.ax1.set_ylabel('Current', color=self.voltage_color)
-        line1, = self.ax1.plot(df[self.VChannel], df[self.IChannel].abs(), color=self.voltage_color, linewidth=1.5, alpha=0.8, label=self.VChannel)
-        #self.ax1.plot(df[self.VChannel], df[self.IChannel].abs(), color="blue", linewidth=0.5)
         self.ax1.tick_params(axis='y', labelcolor=self.voltage_color)
+        self.iv_line.set_data(voltage, current)
+        self.iv_line.set_color(self.voltage_color)
         if self.checkbox_grid.isChecked():
             self.ax1.grid(True, which='both', linestyle='--', linewidth=0.5)
-        self.ax1.set_yscale('log')
-
-        # Format y-axis with scientific notation
-        self.ax1.yaxis.set_major_formatter(LogFormatterMathtext(base=10))
-
-        # Add interactive cursor
-        mplcursors.cursor([line1], hover=2)
-        
-        self.figure.tight_layout()
-        self.canvas.draw()
+        else:
+            self.ax1.grid(False, which='both')
+
+        self.set_limits(self.ax1, x_bounds, y_bounds)
+        if self.canvas.isVisible():
+            self.blit.update((self.checkbox_grid.isChecked(), self.voltage_color, self.density_shown()))
+
+    # Which histogram the main plot shows under the line, None without the density plot
+    def density_shown(self):
+        if self.density_mesh is None or not self.density_mesh.get_visible():
+            return None
+        return self.density_version
+
+    def plot_density(self, shown):
+        if shown and self.density.counts.size > 0 and self.density_version != self.density.version:
+            if self.density_mesh is not None:
+                self.density_mesh.remove()
+            v_edges, i_edges = self.density.edges()
+            # Empty cells are left transparent
+            self.density_mesh = self.ax1.pcolormesh(v_edges, i_edges, np.ma.masked_equal(self.density.counts, 0), norm=LogNorm(), cmap='viridis', zorder=1)
+            # The limits follow the half-cycles as in the line plot, not the edges of the grid
+            self.density_mesh.sticky_edges.x[:] = []
+            self.density_mesh.sticky_edges.y[:] = []
+            if self.density_colorbar is None:
+                self.density_colorbar = self.figure.colorbar(self.density_mesh, cax=self.density_cax, label='Samples')
+            else:
+                self.density_colorbar.update_normal(self.density_mesh)
+            self.density_version = self.density.version
+        if self.density_mesh is not None:
+            self.density_mesh.set_visible(shown)
+        if self.density_cax.get_visible() != (self.density_mesh is not None and shown):
+            self.density_cax.set_visible(self.density_mesh is not None and shown)
+            self.figure.tight_layout()
+
+    ####################### Plots derived from the cycle table, redrawn when the data or the colors change, not on slider moves ###########################
+    def cache_stats(self):
+        self.valid = {column: valid_values(self.cycles, column) for column in ('Vset', 'Vreset', 'Rset', 'Rreset')}
+        self.sorted_values = {column: np.sort(values) for column, values in self.valid.items()}
+        self.res_positions = {column: valid_positions(self.cycles, column) for column in ('Rset', 'Rreset')}
+
+    def plot_stats(self):
+        if self.cycles is None:
+            return
+        self.plot_cdf_V()
+        self.plot_cdf_R()
+        self.plot_res()
 
     ####################### Voltage CDF Plot ###########################
     def plot_cdf_V(self):
-        # Sort the data
-        Vset_sorted = np.sort(self.Vset)
-        Vreset_sorted = np.sort(self.Vreset)
+        Vset_sorted = self.sorted_values['Vset']
+        Vreset_sorted = self.sorted_values['Vreset']
 
         # Compute the cumulative probabilities
         cdf_Vset = np.arange(1, len(Vset_sorted) + 1) / len(Vset_sorted)
         cdf_Vreset = np.arange(1, len(Vreset_sorted) + 1) / len(Vreset_sorted)
 
-
-        # Clear the previous plot
-        self.figure2.clear()
-
-        # Create new axes
-        self.ax2 = self.figure2.add_subplot(111)
-
-        # Left axis for Voltage Channel
-        self.ax2.set_xlabel('Voltage')
-        self.ax2.set_ylabel('Probability', color='black')
-        line1, = self.ax2.plot(Vset_sorted, cdf_Vset, color=self.set_color, marker='.', linestyle='none', label='Vset')
-        line2, = self.ax2.plot(Vreset_sorted, cdf_Vreset, color=self.reset_color, marker='.', linestyle='none', label='Vreset')
-        if self.checkbox_grid.isChecked():
-            self.ax2.grid(True)
-        self.ax2.legend()
-        
-        # Add interactive cursor
-        cursor1 = mplcursors.cursor([line1], hover=2)
-        cursor2 = mplcursors.cursor([line2], hover=2)
-
-        self.figure2.tight_layout()
-        self.canvas2.draw()
+        self.cdf_Vset_line.set_data(Vset_sorted, cdf_Vset)
+        self.cdf_Vset_line.set_color(self.set_color)
+        self.cdf_Vreset_line.set_data(Vreset_sorted, cdf_Vreset)
+        self.cdf_Vreset_line.set_color(self.reset_color)
+        self.ax2.grid(self.checkbox_grid.isChecked())
+        self.set_limits(self.ax2, self.bounds(np.concatenate([Vset_sorted, Vreset_sorted])), self.bounds(np.concatenate([cdf_Vset, cdf_Vreset])))
+        self.redraw(self.canvas2)
 
     #################### Resistance CDF Plot #################################
     def plot_cdf_R(self):
-        # Sort the data
-        Rset_sorted = np.sort(self.Rset)
-        Rreset_sorted = np.sort(self.Rreset)
+        Rset_sorted = self.sorted_values['Rset']
+        Rreset_sorted = self.sorted_values['Rreset']
 
         # Compute the cumulative probabilities
         cdf_Rset = np.arange(1, len(Rset_sorted) + 1) / len(Rset_sorted)
         cdf_Rreset = np.arange(1, len(Rreset_sorted) + 1) / len(Rreset_sorted)
 
-
-        # Clear the previous plot
-        self.figure3.clear()
-
-        # Create new axes
-        self.ax3 = self.figure3.add_subplot(111)
-
-        # Left axis for Voltage Channel
-        self.ax3.set_xlabel('Resistance (Ohm)')
-        self.ax3.set_ylabel('Probability', color='black')
-        line1, = self.ax3.plot(Rset_sorted, cdf_Rset, color=self.set_color, marker='.', linestyle='none', label='Rset')
-        line2, = self.ax3.plot(Rreset_sorted, cdf_Rreset, color=self.reset_color, marker='.', linestyle='none', label='Rreset')
-        if self.checkbox_grid.isChecked():
-            self.ax3.grid(True)
-        self.ax3.set_xscale('log')
-        self.ax3.legend()
-        
-        # Add interactive cursor
-        cursor1 = mplcursors.cursor([line1], hover=2)
-        cursor2 = mplcursors.cursor([line2], hover=2)
-
-        self.figure3.tight_layout()
-        self.canvas3.draw()
+        self.cdf_Rset_line.set_data(Rset_sorted, cdf_Rset)
+        self.cdf_Rset_line.set_color(self.set_color)
+        self.cdf_Rreset_line.set_data(Rreset_sorted, cdf_Rreset)
+        self.cdf_Rreset_line.set_color(self.reset_color)
+        self.ax3.grid(self.checkbox_grid.isChecked())
+        R = np.concatenate([Rset_sorted, Rreset_sorted])
+        self.set_limits(self.ax3, self.bounds(R[R > 0]), self.bounds(np.concatenate([cdf_Rset, cdf_Rreset])))
+        self.redraw(self.canvas3)
 
     ###################### Resistance Plot ###############################
     def plot_res(self):
-        #cycles = max(len(self.Rset), len(self.Rreset))
-
-        # Clear the previous plot
-        self.figure4.clear()
-        
-        x_lr = np.arange(1,len(self.Rset)+1)
-        x_hr = np.arange(1,len(self.Rreset)+1)
-
-        # Create new axes
-        self.ax4 = self.figure4.add_subplot(111)
-
-        # Left axis for Voltage Channel
-        self.ax4.set_xlabel('Nr. of Cycle')
-        self.ax4.set_ylabel('Resistance', color='blue')
-        line1 = self.ax4.scatter(x_lr, self.Rset, color='red', label='Low Resistance')
-        line2 = self.ax4.scatter(x_hr, self.Rreset, color='blue', label='High Resistance')
-        if self.checkbox_grid.isChecked():
-            self.ax4.grid(True)
-        self.ax4.set_yscale('log')
-        self.ax4.legend()
-        
-        # Add interactive cursor
-        cursor1 = mplcursors.cursor(line1, hover=2)
-        cursor2 = mplcursors.cursor(line2, hover=2)
-
-        self.figure4.tight_layout()
-        self.canvas4.draw()
+        Rset = self.valid['Rset']
+        Rreset = self.valid['Rreset']
+        x_lr = np.arange(1,len(Rset)+1)
+        x_hr = np.arange(1,len(Rreset)+1)
+
+        self.res_Rset_points.set_offsets(np.column_stack([x_lr, Rset]))
+        self.res_Rreset_points.set_offsets(np.column_stack([x_hr, Rreset]))
+        self.ax4.grid(self.checkbox_grid.isChecked())
+        R = np.concatenate([Rset, Rreset])
+        self.set_limits(self.ax4, (1, max(len(Rset), len(Rreset), 1)), self.bounds(R[R > 0]))
+        self.redraw(self.canvas4)
+
+    # Ring around the point of the current half-cycle, only the ring is redrawn when the slider moves
+    def plot_highlight(self, index):
+        cycle = self.halfcycles.at[index, "Cycle"]
+        column = 'Rset' if self.halfcycles.at[index, "Polarity"] > 0 else 'Rreset'
+        position = self.res_positions[column][cycle] if cycle >= 0 else 0
+        if self.checkbox_highlight.isChecked() and position > 0:
+            self.res_highlight.set_data([position], [self.cycles.at[cycle, column]])
+            self.res_highlight.set_visible(True)
+        else:
+            self.res_highlight.set_visible(False)
+        if self.canvas4.isVisible():
+            self.res_blit.update()
 
 
     ####### Functions to add right click option to save plot ########
@@ -725,7 +790,8 @@ class IVSweepsAnalyser(QWidget):
         options = QFileDialog.Options()
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Plot", "", "PNG Files (*.png);;All Files (*)", options=options)
         if file_path:
-            figure.savefig(file_path)
+            with self.blit.static():
+                figure.savefig(file_path)
 
     def pick_voltage_color(self):
         # Open color picker dialog and set the selected color
@@ -741,7 +807,7 @@ class IVSweepsAnalyser(QWidget):
         if color.isValid():
             self.set_color = color.name()  # Convert selected color to HEX code (e.g., "#RRGGBB")
             self.set_color_button.setStyleSheet(f"background-color: {self.set_color};")  # Update button background color
-        self.update_plot()
+        self.plot_stats()
 
     def pick_reset_color(self):
         # Open color picker dialog and set the selected color
@@ -749,4 +815,4 @@ class IVSweepsAnalyser(QWidget):
         if color.isValid():
             self.reset_color = color.name()  # Convert selected color to HEX code (e.g., "#RRGGBB")
             self.reset_color_button.setStyleSheet(f"background-color: {self.reset_color};")  # Update button background color
-        self.update_plot()
\ No newline at end of file
+        self.plot_stats()
\ No newline at end of file
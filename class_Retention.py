@@ -1,14 +1,17 @@
 import sys
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QPushButton, QSlider, QFileDialog, QComboBox, QLabel, QHBoxLayout, QMainWindow, QMessageBox, QProgressBar, QProgressDialog,QDialog)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.ticker import FuncFormatter, AutoLocator, LogFormatterMathtext
-import mplcursors
 from scipy.signal import find_peaks
-from openpyxl import load_workbook
+from class_hover import HoverTooltip
+from class_loader import SheetLoader
+from class_scheduler import FrameScheduler
+from memristor_core.retention import analyse_retention
+from memristor_core.profiling import timed
 
 class Retention_viewer(QWidget):
     def __init__(self):
@@ -35,13 +38,13 @@ class Retention_viewer(QWidget):
         # Slider LRS
         self.slider_LRS = QSlider(Qt.Horizontal)
         self.slider_LRS.setMinimum(1)
-        self.slider_LRS.valueChanged.connect(self.plot_data)
+        self.slider_LRS.valueChanged.connect(self.update_plot)
         main_layout.addWidget(self.slider_LRS)
 
         # Slider HRS
         self.slider_HRS = QSlider(Qt.Horizontal)
         self.slider_HRS.setMinimum(1)
-        self.slider_HRS.valueChanged.connect(self.plot_data)
+        self.slider_HRS.valueChanged.connect(self.update_plot)
         main_layout.addWidget(self.slider_HRS)
 
         # Plot area
@@ -49,6 +52,7 @@ class Retention_viewer(QWidget):
         self.ax1 = self.figure.add_subplot(111)
         self.canvas = FigureCanvas(self.figure)
         main_layout.addWidget(self.canvas)
+        self.init_plots()
 
         # Clear Graph button
         self.clear_button = QPushButton("Clear Graph")
@@ -68,6 +72,14 @@ class Retention_viewer(QWidget):
         self.Time_HRS = []
         self.R_HRS = []
 
+        self.loaders = {"LRS": None, "HRS": None}
+        self.results = {"LRS": None, "HRS": None}    # RetentionResult of each state
+        self.redraw_pending = False
+        self.new_data = False
+
+        # Slider moves are coalesced, the points to show are sliced on a worker thread
+        self.scheduler = FrameScheduler(self.prepare_frame, self.plot_data, self)
+
         # Label to display HRS Avg
         self.HRS_label = QLabel("HRS average: N/A")
         self.HRS_label.setAlignment(Qt.AlignRight)
@@ -78,7 +90,13 @@ class Retention_viewer(QWidget):
         self.LRS_label.setAlignment(Qt.AlignRight)
         main_layout.addWidget(self.LRS_label)
 
+    # Columns of the Excel sheets used by the analysis, nothing else is parsed
+    def required_columns(self):
+        return (self.RChannel, self.TimeChannel)
+
     def clear_graph(self):
+        self.stop_loading("LRS")
+        self.stop_loading("HRS")
         self.sweeps = []
         self.Time_LRS = []
         self.R_LRS= []
@@ -86,186 +104,141 @@ class Retention_viewer(QWidget):
         self.R_HRS = []
         self.HRS_label.setText(f"HRS average: N/A")
         self.LRS_label.setText(f"LRS average: N/A")
-        self.plot_data()
+        self.scheduler.reset()
+        self.update_plot()
 
 
     def upload_files_HRS(self):
-        try:
-            options = QFileDialog.Options()
-            self.file_paths, _ = QFileDialog.getOpenFileNames(self, "Upload Excel Files", "", "Excel Files (*.xls *.xlsx)", options=options)
-            
-            if len(self.file_paths) == 0:   ## Do nothing if there are no selected files i.e. cancel was clicked
-                return
-            if len(self.R_HRS) != 0:   ## If other files are uploaded again empty the existing sweeps
-                self.R_HRS= []
-                self.Time_HRS = []
-                self.sweeps = []
-
-            # Initialize progress dialog
-            progress = QProgressDialog("Loading files...", "Cancel", 0, len(self.file_paths), self)
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setAutoClose(True)
-            progress.setAutoReset(True)
-
-            # Calculations needed for progress bar
-            total_steps = 0
-            for file_path in self.file_paths:
-                if file_path.endswith('.xlsx'):
-                    total_steps += len(load_workbook(file_path, read_only=True).sheetnames) - 2  # Calculate total steps
-                else:
-                    xl = pd.ExcelFile(file_path, engine = 'xlrd')
-                    total_steps += len(xl.sheet_names) - 2
-            progress.setRange(0, total_steps)
-            current_step = 0
-            last_time = 0
-            # Read all sheets in all selected files except for the "Calc" and "Settings" sheets.
-            for file_path in self.file_paths:
-                if progress.wasCanceled():
-                    return  # Handle cancellation
-
-                excel_file = pd.ExcelFile(file_path)
-                sheet_names = [sheet for sheet in excel_file.sheet_names if sheet not in ["Calc", "Settings"]]
-
-                for sheet in sheet_names:
-                    if progress.wasCanceled():
-                        return  # Handle cancellation
-                    sweep = pd.read_excel(file_path, sheet_name=sheet)
-                    #self.sweeps.append(pd.read_excel(file_path, sheet_name=sheet))
-                    if self.TimeChannel not in sweep or self.RChannel not in sweep:
-                        raise KeyError(f"Sheet '{sheet}' in file '{file_path}' does not contain the required columns.")
-                    
-                    # Append the data after adjusting the time
-                    self.R_HRS.append(sweep[self.RChannel])  # Append the 'R' data
-                    
-                    # Adjust the 'Time' column by adding the last_time
-                    self.Time_HRS.append(sweep[self.TimeChannel] + last_time)
-
-                    # Update last_time to the last value of the current sheet's 'Time'
-                    last_time = sweep[self.TimeChannel].iloc[-1]  # Accumulate the time
-
-                    current_step += 1
-                    progress.setValue(current_step)
-            
-            # After processing all sheets, concatenate the lists into a single pandas Series
-            self.R_HRS= pd.concat(self.R_HRS, ignore_index=True)
-            self.Time_HRS = pd.concat(self.Time_HRS, ignore_index=True)
-
-            self.slider_HRS.setMaximum(len(self.R_HRS)-1)
-            self.current_index = 0
-
-            self.slider_HRS.setValue(0)
-            self.plot_data()
-
-            self.HRS_label.setText(f"HRS average: {np.mean(self.R_HRS):.3e}")
-
-            self.plot_data()
-
-        except KeyError as e:
-            QMessageBox.critical(self, "Error", f"Voltage column doesn't have data: {str(e)}. Please try another file.")
+        self.upload_files("HRS", reset_time_per_file=False)
 
     def upload_files_LRS(self):
+        self.upload_files("LRS", reset_time_per_file=True)
+
+    # Starts reading the LRS or HRS excel files in the background, the points are plotted as they arrive
+    def upload_files(self, state, reset_time_per_file):
+        options = QFileDialog.Options()
+        self.file_paths, _ = QFileDialog.getOpenFileNames(self, "Upload Excel Files", "", "Excel Files (*.xls *.xlsx)", options=options)
+        
+        if len(self.file_paths) == 0:   ## Do nothing if there are no selected files i.e. cancel was clicked
+            return
+        self.stop_loading(state)
+        self.clear_state(state)    ## If other files are uploaded again empty the existing data
+
+        # Progress dialog, not modal so the points that are already loaded can be looked at
+        progress = QProgressDialog("Loading files...", "Cancel", 0, len(self.file_paths), self)
+        progress.setAutoClose(True)
+        progress.setAutoReset(True)
+
+        # Read all sheets in all selected files except for the "Calc" and "Settings" sheets in a background thread
+        loader = SheetLoader(self.file_paths, self.required_columns(), self)
+        loader.attach_progress(progress)
+        loader.sheets_loaded.connect(lambda sheets: self.add_sheets(loader, state, sheets, reset_time_per_file))
+        loader.failed.connect(lambda message: self.loading_failed(loader, message))
+        self.loaders[state] = loader
+        loader.start()
+
+    def clear_state(self, state):
+        self.scheduler.reset()
+        self.results[state] = None
+        setattr(self, f"R_{state}", [])
+        setattr(self, f"Time_{state}", [])
+        getattr(self, f"{state}_label").setText(f"{state} average: N/A")
+
+    def stop_loading(self, state):
+        if self.loaders[state] is not None:
+            self.loaders[state].stop()
+
+    def closeEvent(self, event):
+        self.stop_loading("LRS")
+        self.stop_loading("HRS")
+        self.scheduler.reset()
+        super().closeEvent(event)
+
+    def loading_failed(self, loader, message):
+        if loader in self.loaders.values():
+            QMessageBox.critical(self, "Error", f"Could not read the files: {message}")
+
+    def redraw_loaded(self):
+        self.redraw_pending = False
+        self.update_plot()
+
+    # Adds freshly read sheets, anything still queued from an older or canceled load is ignored
+    @timed()
+    def add_sheets(self, loader, state, sheets, reset_time_per_file):
+        if loader is not self.loaders[state] or loader.is_canceled():
+            return
         try:
-            options = QFileDialog.Options()
-            self.file_paths, _ = QFileDialog.getOpenFileNames(self, "Upload Excel Files", "", "Excel Files (*.xls *.xlsx)", options=options)
-            
-            if len(self.file_paths) == 0:   ## Do nothing if there are no selected files i.e. cancel was clicked
-                return
-            if len(self.R_LRS) != 0:   ## If other files are uploaded again empty the existing sweeps
-                self.R_LRS= []
-                self.Time_LRS = []
-                self.sweeps = []
-
-            # Initialize progress dialog
-            progress = QProgressDialog("Loading files...", "Cancel", 0, len(self.file_paths), self)
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setAutoClose(True)
-            progress.setAutoReset(True)
-
-            # Calculations needed for progress bar
-            total_steps = 0
-            for file_path in self.file_paths:
-                if file_path.endswith('.xlsx'):
-                    total_steps += len(load_workbook(file_path, read_only=True).sheetnames) - 2  # Calculate total steps
-                else:
-                    xl = pd.ExcelFile(file_path, engine = 'xlrd')
-                    total_steps += len(xl.sheet_names) - 2
-            progress.setRange(0, total_steps)
-            current_step = 0
-
-            # Read all sheets in all selected files except for the "Calc" and "Settings" sheets.
-            for file_path in self.file_paths:
-                if progress.wasCanceled():
-                    return  # Handle cancellation
-
-                excel_file = pd.ExcelFile(file_path)
-                sheet_names = [sheet for sheet in excel_file.sheet_names if sheet not in ["Calc", "Settings"]]
-                
-                last_time = 0
-
-                for sheet in sheet_names:
-                    if progress.wasCanceled():
-                        return  # Handle cancellation
-                    sweep = pd.read_excel(file_path, sheet_name=sheet)
-                    #self.sweeps.append(pd.read_excel(file_path, sheet_name=sheet))
-                    if self.TimeChannel not in sweep or self.RChannel not in sweep:
-                        raise KeyError(f"Sheet '{sheet}' in file '{file_path}' does not contain the required columns.")
-                    
-                    # Append the data after adjusting the time
-                    self.R_LRS.append(sweep[self.RChannel])  # Append the 'R' data
-                    
-                    # Adjust the 'Time' column by adding the last_time
-                    self.Time_LRS.append(sweep[self.TimeChannel] + last_time)
-
-                    # Update last_time to the last value of the current sheet's 'Time'
-                    last_time = sweep[self.TimeChannel].iloc[-1]  # Accumulate the time
-
-                    current_step += 1
-                    progress.setValue(current_step)
-            
-            # After processing all sheets, concatenate the lists into a single pandas Series
-            self.R_LRS= pd.concat(self.R_LRS, ignore_index=True)
-            self.Time_LRS = pd.concat(self.Time_LRS, ignore_index=True)
-
-            self.slider_LRS.setMaximum(len(self.R_LRS)-1)
-            self.current_index = 0
-
-            self.slider_LRS.setValue(0)
-            self.plot_data()
-
-            self.LRS_label.setText(f"LRS average: {np.mean(self.R_LRS):.3e}")
-
-            self.plot_data()
+            first_sheets = self.results[state] is None
+            result = analyse_retention(sheets, self.RChannel, self.TimeChannel, reset_time_per_file, previous=self.results[state])
+            self.results[state] = result
+            R = result.r
+            setattr(self, f"R_{state}", R)
+            setattr(self, f"Time_{state}", result.time)
+
+            slider = getattr(self, f"slider_{state}")
+            slider.setMaximum(len(R)-1)
+            if first_sheets:
+                self.current_index = 0
+                slider.setValue(0)
+                self.new_data = True
+            # Batches that arrive back to back are drawn once
+            if not self.redraw_pending:
+                self.redraw_pending = True
+                QTimer.singleShot(0, self.redraw_loaded)
+
+            getattr(self, f"{state}_label").setText(f"{state} average: {result.mean:.3e}")
 
         except KeyError as e:
+            self.stop_loading(state)
+            self.clear_state(state)
             QMessageBox.critical(self, "Error", f"Voltage column doesn't have data: {str(e)}. Please try another file.")
 
-    def plot_data(self):
+    # Axes and lines created once, plot_data only updates them
+    def init_plots(self):
+        # Left axis for Voltage Channel
+        self.ax1.set_xlabel('Time (s)')
+        self.ax1.set_xscale('log')
+        self.ax1.set_yscale('log')
+        self.ax1.set_ylabel('Resistance (Ω)')
+        self.LRS_line, = self.ax1.plot([], [], color="red",linestyle='none', marker='o', label='LRS')
+        self.HRS_line, = self.ax1.plot([], [], color="blue",linestyle='none', marker= 'o', label="HRS", visible=False)
+        self.ax1.tick_params(axis='y', labelcolor='black')
+        #self.ax1.grid(True, which='both', linestyle='--', linewidth=0.5)
+        # Format y-axis with scientific notation
+        self.ax1.yaxis.set_major_formatter(LogFormatterMathtext(base=10))
+
+        # Add interactive cursor
+        self.hover = HoverTooltip(self.canvas, [self.LRS_line, self.HRS_line])
+
+        # The layout is only redone when the canvas is resized, not on every update
+        self.figure.tight_layout()
+        self.canvas.mpl_connect('resize_event', lambda event: self.figure.tight_layout())
+
+    def update_plot(self, *args):
+        self.current_index_LRS = self.slider_LRS.value()-1
+        self.current_index_HRS = self.slider_HRS.value()-1
+        self.scheduler.request(self.Time_LRS, self.R_LRS, self.current_index_LRS, self.Time_HRS, self.R_HRS, self.current_index_HRS)
+
+    # Runs on the worker thread: points up to the slider positions, no widgets in here
+    def prepare_frame(self, Time_LRS, R_LRS, index_LRS, Time_HRS, R_HRS, index_HRS):
+        return (np.asarray(Time_LRS[0:index_LRS]), np.asarray(R_LRS[0:index_LRS]),
+                np.asarray(Time_HRS[0:index_HRS]), np.asarray(R_HRS[0:index_HRS]), len(R_HRS) != 0)
+
+    def plot_data(self, frame):
         try:
-            self.current_index_LRS = self.slider_LRS.value()-1
-            self.current_index_HRS = self.slider_HRS.value()-1
-            # Clear the previous plot
-            self.ax1.clear()
-
-            # Left axis for Voltage Channel
-            self.ax1.set_xlabel('Time (s)')
-            self.ax1.set_xscale('log')
-            self.ax1.set_yscale('log')
-            self.ax1.set_ylabel('Resistance (Ω)')
-            line1, = self.ax1.plot(self.Time_LRS[0:self.current_index_LRS], self.R_LRS[0:self.current_index_LRS], color="red",linestyle='none', marker='o', label='LRS')
-            if len(self.R_HRS) != 0:
-                line2, = self.ax1.plot(self.Time_HRS[0:self.current_index_HRS], self.R_HRS[0:self.current_index_HRS], color="blue",linestyle='none', marker= 'o', label="HRS")
-                mplcursors.cursor([line2], hover=2)
-            self.ax1.tick_params(axis='y', labelcolor='black')
-            #self.ax1.grid(True, which='both', linestyle='--', linewidth=0.5)
-            self.ax1.legend()
-            # Format y-axis with scientific notation
-            self.ax1.yaxis.set_major_formatter(LogFormatterMathtext(base=10))
-
-            # Add interactive cursor
-            mplcursors.cursor([line1], hover=2)
-
-            self.figure.tight_layout()
-            self.canvas.draw()
+            Time_LRS, R_LRS, Time_HRS, R_HRS, has_HRS = frame
+            self.LRS_line.set_data(Time_LRS, R_LRS)
+            self.HRS_line.set_visible(has_HRS)
+            self.HRS_line.set_data(Time_HRS, R_HRS)
+            self.ax1.legend(handles=[line for line in (self.LRS_line, self.HRS_line) if line.get_visible()])
+            self.ax1.relim(visible_only=True)
+            self.ax1.autoscale_view()
+            # The margins stay fixed while scrubbing, log ticks (10^n) keep the same width
+            if self.new_data:   # Tick labels of the new data can be wider, lay the plot out again
+                self.new_data = False
+                self.figure.tight_layout()
+
+            self.canvas.draw_idle()
 
         except KeyError as e:
-            QMessageBox.critical(self, "Error", f"Column doesn't exist: {str(e)}. Please try another file.")
\ No newline at end of file
+            QMessageBox.critical(self, "Error", f"Column doesn't exist: {str(e)}. Please try another file.")
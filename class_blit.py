@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+from memristor_core.profiling import stage, timed
+
+class BlitManager:
+    """Redraws a few moving artists over a cached picture of the rest of the figure.
+
+    The artists are marked animated, so a normal draw of the canvas leaves them out;
+    the result is kept as background right after every draw and the artists are drawn
+    on top of it. ``update()`` then only restores that background, draws the artists
+    and blits the figure, instead of rendering the axes, ticks and labels again.
+
+    The background is only valid as long as the axes limits of the artists do not
+    change, nor anything else that is passed to ``update()`` as ``key`` (grid on/off,
+    colors, ...). Otherwise ``update()`` asks for a full draw, which caches the new
+    background.
+    """
+
+    def __init__(self, canvas, artists):
+        self.canvas = canvas
+        self.artists = list(artists)
+        self.key = None
+        self._background = None
+        self._drawn_state = None
+        for artist in self.artists:
+            artist.set_animated(True)
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        # Full redraws are what blitting saves, time them next to the blits (once per canvas)
+        if not hasattr(canvas.draw, "__wrapped__"):
+            canvas.draw = timed("draw.full")(canvas.draw)
+
+    def add(self, artist):
+        """Redraw one more artist over the background (e.g. a tooltip)."""
+        artist.set_animated(True)
+        self.artists.append(artist)
+
+    def _state(self):
+        return tuple(tuple(artist.axes.viewLim.bounds) for artist in self.artists) + (self.key,)
+
+    def on_draw(self, event):
+        figure = self.canvas.figure
+        self._background = self.canvas.copy_from_bbox(figure.bbox)
+        self._drawn_state = self._state()
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.canvas.figure.draw_artist(artist)
+
+    def update(self, key=None):
+        self.key = key
+        if self._background is None or self._state() != self._drawn_state:
+            self.canvas.draw_idle()
+            return
+        with stage("draw.blit"):
+            self.canvas.restore_region(self._background)
+            self._draw_artists()
+            self.canvas.blit(self.canvas.figure.bbox)
+
+    def refresh(self):
+        """Draw the artists again without changing the key."""
+        self.update(self.key)
+
+    @contextmanager
+    def static(self):
+        """Include the artists in the drawing again, for savefig."""
+        for artist in self.artists:
+            artist.set_animated(False)
+        try:
+            yield
+        finally:
+            for artist in self.artists:
+                artist.set_animated(True)
@@ -0,0 +1,107 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QCheckBox, QLabel, QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QMessageBox)
+from PyQt5.QtCore import Qt, QTimer
+from memristor_core import profiling
+
+class DiagnosticsDialog(QDialog):
+    """Time, call count and peak memory of the loading, extraction and drawing stages,
+    as recorded by ``memristor_core.profiling``. Recording is off until it is
+    switched on here (or with MEMRISTOR_PROFILE=1 / =memory)."""
+    COLUMNS = ("Stage", "Calls", "Total (ms)", "Mean (ms)", "Max (ms)", "Peak memory (MB)")
+    REFRESH_MS = 1000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+        self.resize(760, 480)
+        self.init_ui()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(self.REFRESH_MS)
+        self.refresh()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        options = QHBoxLayout()
+        self.checkbox_record = QCheckBox("Record timings")
+        self.checkbox_record.setChecked(profiling.enabled())
+        self.checkbox_record.toggled.connect(self.set_recording)
+        self.checkbox_memory = QCheckBox("Track memory (slower)")
+        self.checkbox_memory.setChecked(profiling.memory_enabled())
+        self.checkbox_memory.toggled.connect(self.set_recording)
+        options.addWidget(self.checkbox_record)
+        options.addWidget(self.checkbox_memory)
+        options.addStretch(1)
+        layout.addLayout(options)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.note_label = QLabel("Files read by the worker processes (several files at once) only show up as SheetLoader.run. "
+                                 "Memory is only tracked for the stages that run on the GUI thread.")
+        self.note_label.setWordWrap(True)
+        layout.addWidget(self.note_label)
+
+        buttons = QHBoxLayout()
+        self.reset_button = QPushButton("Reset")
+        self.reset_button.clicked.connect(self.reset)
+        self.json_button = QPushButton("Export JSON")
+        self.json_button.clicked.connect(self.export_json)
+        self.trace_button = QPushButton("Export Chrome trace")
+        self.trace_button.clicked.connect(self.export_trace)
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.close)
+        for button in (self.reset_button, self.json_button, self.trace_button):
+            buttons.addWidget(button)
+        buttons.addStretch(1)
+        buttons.addWidget(self.close_button)
+        layout.addLayout(buttons)
+
+        self.setLayout(layout)
+
+    def set_recording(self, _=None):
+        if self.checkbox_record.isChecked():
+            profiling.enable(memory=self.checkbox_memory.isChecked())
+        else:
+            profiling.disable()
+        self.refresh()
+
+    def refresh(self):
+        report = profiling.report()
+        self.table.setRowCount(len(report))
+        for row, (name, entry) in enumerate(report.items()):
+            peak = entry["peak_bytes"]
+            values = (name, str(entry["calls"]), f"{entry['total']*1000:.1f}", f"{entry['mean']*1000:.2f}",
+                      f"{entry['max']*1000:.2f}", "" if peak is None else f"{peak / 2**20:.1f}")
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column > 0:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+    def reset(self):
+        profiling.reset()
+        self.refresh()
+
+    def export_json(self):
+        self.export("Export timings", "JSON files (*.json)", profiling.write_json)
+
+    def export_trace(self):
+        self.export("Export Chrome trace", "Trace files (*.json)", profiling.write_chrome_trace)
+
+    def export(self, title, file_filter, write):
+        file_path, _ = QFileDialog.getSaveFileName(self, title, "", file_filter)
+        if not file_path:
+            return
+        try:
+            write(file_path)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Can't write {file_path}: {e}")
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        super().closeEvent(event)
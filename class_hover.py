@@ -0,0 +1,127 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from matplotlib.collections import LineCollection
+from class_blit import BlitManager
+
+# Points further than this from the mouse (in pixels) get no tooltip
+HOVER_RADIUS = 10
+
+class HoverTooltip:
+    """Tooltip with the x, y values of the data point under the mouse, one per canvas.
+
+    The points of every artist (lines, scatter plots and line collections) are put in
+    a KD-tree in display coordinates, one tree for all segments of a collection, so finding the nearest one to the mouse takes log(n) instead
+    of going through all of them. The tree is only built again when the data or the
+    view of the artist has changed since the last lookup, not on every mouse move.
+
+    The tooltip is drawn over the cached background of the canvas by a BlitManager,
+    the one already used for the canvas if there is one, so showing it does not
+    redraw the plots.
+    """
+
+    def __init__(self, canvas, artists=(), blit=None):
+        self.canvas = canvas
+        self.blit = blit if blit is not None else BlitManager(canvas, [])
+        self.artists = []
+        self._index = {}
+        self._segments = {}
+        self._labels = {}
+        self._tooltips = {}
+        self._shown = None
+        for artist in artists:
+            self.add(artist)
+        self.canvas.mpl_connect('motion_notify_event', self.on_move)
+
+    def add(self, artist, label=None):
+        """``label(segment)``, for a LineCollection, is the first line of the tooltip
+        of a point of its ``segment``-th segment."""
+        self.artists.append(artist)
+        if label is not None:
+            self._labels[artist] = label
+        ax = artist.axes
+        if ax not in self._tooltips:
+            tooltip = ax.annotate("", xy=(0, 0), xytext=(-15, 15), textcoords="offset points",
+                                  ha="right", va="bottom", visible=False,
+                                  bbox=dict(boxstyle="round,pad=.5", fc="yellow", alpha=.5, ec="k"),
+                                  arrowprops=dict(arrowstyle="->", connectionstyle="arc3", shrinkB=0, ec="k"))
+            self._tooltips[ax] = tooltip
+            self.blit.add(tooltip)
+
+    def _points(self, artist):
+        # Data points of the artist, the transform that takes them to display coordinates
+        # and, for a LineCollection, the segment of every point
+        if isinstance(artist, LineCollection):
+            # The paths are a new list whenever the segments are set
+            paths = artist.get_paths()
+            cached = self._segments.get(artist)
+            if cached is None or cached[0] is not paths:
+                vertices = [path.vertices for path in paths]
+                points = np.concatenate(vertices) if vertices else np.empty((0, 2))
+                segments = np.repeat(np.arange(len(vertices)), [len(v) for v in vertices])
+                cached = (paths, points, segments)
+                self._segments[artist] = cached
+            return cached[1], artist.get_transform(), cached[2]
+        if hasattr(artist, 'get_xydata'):
+            return artist.get_xydata(), artist.get_transform(), None
+        return artist.get_offsets(), artist.get_offset_transform(), None
+
+    def _tree(self, artist):
+        points, transform, segments = self._points(artist)
+        ax = artist.axes
+        key = (points, tuple(ax.viewLim.bounds), tuple(ax.bbox.bounds))
+        cached = self._index.get(artist)
+        if cached is None or cached[0][0] is not points or cached[0][1:] != key[1:]:
+            display = transform.transform(np.asarray(points, dtype=float)) if len(points) else np.empty((0, 2))
+            rows = np.flatnonzero(np.isfinite(display).all(axis=1))
+            tree = cKDTree(display[rows]) if len(rows) else None
+            cached = (key, tree, rows)
+            self._index[artist] = cached
+        return cached[1], cached[2], points, segments
+
+    def on_move(self, event):
+        best = None
+        if event.x is not None and event.y is not None:
+            for artist in self.artists:
+                ax = artist.axes
+                if not (artist.get_visible() and ax.get_visible() and ax.bbox.contains(event.x, event.y)):
+                    continue
+                tree, rows, points, segments = self._tree(artist)
+                if tree is None:
+                    continue
+                distance, i = tree.query((event.x, event.y), distance_upper_bound=HOVER_RADIUS)
+                if np.isfinite(distance) and (best is None or distance < best[0]):
+                    best = (distance, artist, points[rows[i]], None if segments is None else segments[rows[i]])
+        if best is None:
+            self.hide()
+        else:
+            self.show(*best[1:])
+
+    def show(self, artist, point, segment=None):
+        ax = artist.axes
+        tooltip = self._tooltips[ax]
+        transform = self._points(artist)[1]
+        # Text away from the closest edges of the axes, so it stays inside them
+        right, top = ax.transAxes.inverted().transform(transform.transform(point)) > 0.5
+        tooltip.xy = tuple(point)
+        tooltip.xycoords = transform
+        tooltip.set_position((-15 if right else 15, -15 if top else 15))
+        tooltip.set_horizontalalignment("right" if right else "left")
+        tooltip.set_verticalalignment("top" if top else "bottom")
+        text = f"x={ax.format_xdata(point[0])}\ny={ax.format_ydata(point[1])}"
+        label = artist.get_label()
+        if segment is not None and artist in self._labels:
+            label = self._labels[artist](segment)
+        if label and not label.startswith("_"):
+            text = f"{label}\n{text}"
+        tooltip.set_text(text)
+        tooltip.set_visible(True)
+        if self._shown is not None and self._shown is not tooltip:
+            self._shown.set_visible(False)
+        self._shown = tooltip
+        self.blit.refresh()
+
+    def hide(self):
+        if self._shown is not None:
+            self._shown.set_visible(False)
+            self._shown = None
+            self.blit.refresh()
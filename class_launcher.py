@@ -0,0 +1,206 @@
+import sys
+import os
+import importlib
+# Imported here, in the main thread: the thread that first imports threading becomes its
+# main_thread(), and matplotlib warns about windows created outside of that one
+import threading
+from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QPushButton, QSlider, QFileDialog, QComboBox, QLabel, QHBoxLayout, QMainWindow, QMessageBox)
+from PyQt5.QtCore import Qt, QThread, QTimer
+
+# The viewers pull in pandas, matplotlib and scipy, which takes seconds. They are only
+# imported when their button is pressed (or by Warmup once the launcher is shown)
+VIEWERS = {"iv": ("class_IVSweeps", "IVSweepsAnalyser"),
+           "pulses": ("class_pulses", "PulsesViewer"),
+           "retention": ("class_Retention", "Retention_viewer"),
+           "volatile": ("class_volatile", "VolatileSweepsAnalyser")}
+
+class Warmup(QThread):
+    """Imports the viewer modules in the background, so that pressing a button
+    doesn't wait for them. Set MEMRISTOR_WARMUP=0 to turn it off."""
+
+    def __init__(self, modules, parent=None):
+        super().__init__(parent)
+        self.modules = modules
+
+    def run(self):
+        for module in self.modules:
+            if self.isInterruptionRequested():
+                return
+            try:
+                importlib.import_module(module)
+            except Exception:
+                pass    # Raised again, and shown, when the button is pressed
+
+class MainAppWindow(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.init_ui()
+        self.warmup = None
+        if os.environ.get("MEMRISTOR_WARMUP", "1") != "0":
+            # Started from the event loop, after the window has been painted
+            QTimer.singleShot(0, self.start_warmup)
+
+    def start_warmup(self):
+        self.warmup = Warmup([module for module, _ in VIEWERS.values()], self)
+        self.warmup.start()
+
+    def viewer(self, name):
+        module, class_name = VIEWERS[name]
+        if module not in sys.modules:
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            return getattr(importlib.import_module(module), class_name)()
+        finally:
+            if QApplication.overrideCursor() is not None:
+                QApplication.restoreOverrideCursor()
+
+    def closeEvent(self, event):
+        if self.warmup is not None:
+            self.warmup.requestInterruption()
+            self.warmup.wait()
+        super().closeEvent(event)
+
+    def init_ui(self):
+        self.setWindowTitle("Choose measurement type")
+        self.setMinimumSize(500, 300)  # Set a larger size for the main window
+        
+        layout = QVBoxLayout()
+        hbox1 = QHBoxLayout()
+        hbox2 = QHBoxLayout()
+
+        self.iv_sweeps_button = QPushButton("IV Sweeps")
+        self.iv_sweeps_button.clicked.connect(self.open_iv_sweeps)
+        self.iv_sweeps_button.setFixedSize(150, 50)
+
+        self.pulses_button = QPushButton("Pulses")
+        self.pulses_button.clicked.connect(self.open_pulses)
+        self.pulses_button.setFixedSize(150, 50)
+
+        self.retention_button = QPushButton("Retention")
+        self.retention_button.clicked.connect(self.open_retention)
+        self.retention_button.setFixedSize(150, 50)
+
+        self.volatile_button = QPushButton("Volatile")
+        self.volatile_button.clicked.connect(self.open_volatile)
+        self.volatile_button.setFixedSize(150, 50)
+
+        self.clear_cache_button = QPushButton("Clear Cache")
+        self.clear_cache_button.setToolTip("Forget the parsed copies of previously opened Excel files")
+        self.clear_cache_button.clicked.connect(self.clear_cache)
+        self.clear_cache_button.setFixedSize(150, 50)
+
+        self.diagnostics_button = QPushButton("Diagnostics")
+        self.diagnostics_button.setToolTip("Time and memory of loading, extraction and drawing")
+        self.diagnostics_button.clicked.connect(self.open_diagnostics)
+        self.diagnostics_button.setFixedSize(150, 50)
+
+         # Add buttons to the horizontal box layout
+        hbox1.addStretch(1)
+        hbox1.addWidget(self.iv_sweeps_button)
+        hbox1.addWidget(self.pulses_button)
+        hbox1.addStretch(1)
+        hbox2.addStretch(1)
+        hbox2.addWidget(self.retention_button)
+        hbox2.addWidget(self.volatile_button)
+        hbox2.addStretch(1)
+        hbox3 = QHBoxLayout()
+        hbox3.addStretch(1)
+        hbox3.addWidget(self.diagnostics_button)
+        hbox3.addWidget(self.clear_cache_button)
+
+
+        # Add the horizontal box layout to the vertical box layout
+        layout.addStretch(1)
+        layout.addLayout(hbox1)
+        layout.addLayout(hbox2)
+        layout.addStretch(1)
+        layout.addLayout(hbox3)
+
+        self.setLayout(layout)
+        
+    def open_iv_sweeps(self):
+        self.iv_window = self.viewer("iv")
+        self.iv_window.show()
+
+    def open_pulses(self):
+        self.pulses_window = self.viewer("pulses")
+        self.pulses_window.show()
+    
+    def open_retention(self):
+        self.retention_window = self.viewer("retention")
+        self.retention_window.show()
+
+    def open_volatile(self):
+        self.volatile_window = self.viewer("volatile")
+        self.volatile_window.show()
+
+    def open_diagnostics(self):
+        from class_diagnostics import DiagnosticsDialog
+        self.diagnostics_window = DiagnosticsDialog()
+        self.diagnostics_window.show()
+
+    def clear_cache(self):
+        from memristor_core.cache import default_cache
+        cache = default_cache()
+        if cache is not None:
+            cache.clear()
+        QMessageBox.information(self, "Cache", "Cached workbooks were removed, files will be parsed again on the next upload.")
+
+def run():
+    app = QApplication(sys.argv)
+    app.setStyleSheet("""
+        QWidget {
+            background-color: #2E3440;
+            color: #D8DEE9;
+            font-family: 'Arial';
+        }
+        QPushButton {
+            background-color: #4C566A;
+            border-radius: 10px;
+            padding: 10px;
+            color: #D8DEE9;
+            font-size: 16px;
+            margin: 5px;
+        }
+        QPushButton:hover {
+            background-color: #5E81AC;
+        }
+        QSlider::groove:horizontal {
+            height: 8px;
+            background: #4C566A;
+            border: 1px solid #5E81AC;
+            border-radius: 4px;
+        }
+        QSlider::handle:horizontal {
+            background: #88C0D0;
+            border: 1px solid #81A1C1;
+            width: 18px;
+            margin: -5px 0;
+            border-radius: 9px;
+        }
+        QLabel {
+            font-size: 14px;
+            color: #D8DEE9;
+        }
+        QComboBox {
+            background-color: #4C566A;
+            color: #D8DEE9;
+            border: 1px solid #5E81AC;
+            border-radius: 5px;
+            padding: 5px;
+        }
+        QProgressBar {
+            text-align: center;
+            color: #D8DEE9;
+            background-color: #4C566A;
+            border-radius: 5px;
+            border: 1px solid #5E81AC;
+        }
+        QProgressBar::chunk {
+            background-color: #88C0D0;
+            border-radius: 5px;
+        }
+    """)
+    viewer = MainAppWindow()
+    viewer.show()
+    sys.exit(app.exec_())
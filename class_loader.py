@@ -0,0 +1,127 @@
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+from memristor_core.dataset import convert
+from memristor_core.ingest import read_workbook
+from memristor_core.parallel import run_ordered
+from memristor_core.profiling import timed
+from memristor_core.workbook import Workbook
+
+class SheetLoader(QThread):
+    """Reads workbooks in the background and streams the sheets to the viewer.
+
+    Sheets arrive in file/sheet order through ``sheets_loaded`` as lists of
+    ``(file_path, sheet_name, DataFrame)``, grouped so the viewer is updated at most
+    every ``flush_interval`` seconds. Several files are read by a pool of worker
+    processes, one workbook each. ``cancel()`` stops reading at the next sheet (or
+    terminates the workers); ``canceled`` is then emitted instead of ``done`` and
+    nothing that was not sent yet is sent afterwards. Batches that were sent but not
+    delivered yet are still queued, viewers check ``is_canceled()`` before using them.
+    """
+    progress = pyqtSignal(int, int)     # sheets read, total sheets
+    sheets_loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    done = pyqtSignal()
+    canceled = pyqtSignal()
+
+    def __init__(self, file_paths, columns=None, parent=None, flush_interval=0.25):
+        super().__init__(parent)
+        self.file_paths = list(file_paths)
+        self.columns = columns
+        self.flush_interval = flush_interval
+        self._batch = []
+        self._last_flush = 0
+        self._canceled = False
+
+    def cancel(self):
+        self._canceled = True
+        self.requestInterruption()
+
+    def is_canceled(self):
+        return self._canceled or self.isInterruptionRequested()
+
+    def _add(self, file_path, sheet, df):
+        self._batch.append((file_path, sheet, df))
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+    def _flush(self):
+        if self._batch and not self.is_canceled():
+            self.sheets_loaded.emit(self._batch)
+        self._batch = []
+        self._last_flush = time.monotonic()
+
+    @timed("SheetLoader.run")
+    def run(self):
+        try:
+            if len(self.file_paths) == 1:
+                # One workbook is read right here, so every sheet can be shown as soon as it is parsed
+                file_path = self.file_paths[0]
+                with Workbook(file_path, self.columns) as workbook:
+                    for i, (sheet, df) in enumerate(workbook):
+                        if self.is_canceled():
+                            break
+                        self._add(file_path, sheet, df)
+                        self.progress.emit(i + 1, len(workbook))
+            else:
+                results = run_ordered(read_workbook, [(file_path, self.columns) for file_path in self.file_paths],
+                                      on_progress=self.progress.emit, is_canceled=self.is_canceled)
+                for file_path, sheets in zip(self.file_paths, results):
+                    for sheet, df in sheets:
+                        self._add(file_path, sheet, df)
+            self._flush()
+        except Exception as e:
+            self.failed.emit(f"{type(e).__name__}: {e}")
+            return
+        if self.is_canceled():
+            self.canceled.emit()
+        else:
+            self.done.emit()
+
+    def attach_progress(self, dialog):
+        """Show the progress in a QProgressDialog, whose Cancel button cancels the loading."""
+        self.progress.connect(lambda done, total: (dialog.setMaximum(total), dialog.setValue(done)))
+        dialog.canceled.connect(self.cancel)
+        self.finished.connect(dialog.close)
+
+    def stop(self):
+        """Cancel and wait until the thread is finished."""
+        self.cancel()
+        self.wait()
+
+class DatasetConverter(QThread):
+    """Converts IV workbooks into a dataset folder (``memristor_core.dataset.convert``)
+    in the background, one workbook at a time. ``progress`` counts files; ``done``
+    is emitted with the folder once the dataset is complete, ``canceled`` if it was
+    canceled or nothing in the files was usable."""
+    progress = pyqtSignal(int, int)     # files converted, total files
+    failed = pyqtSignal(str)
+    done = pyqtSignal(str)
+    canceled = pyqtSignal()
+
+    def __init__(self, file_paths, directory, v_channel, i_channel, ignore_faulty, dtype, parent=None):
+        super().__init__(parent)
+        self.file_paths = list(file_paths)
+        self.directory = directory
+        self.options = (v_channel, i_channel, ignore_faulty, dtype)
+
+    @timed("DatasetConverter.run")
+    def run(self):
+        try:
+            converted = convert(self.file_paths, self.directory, *self.options,
+                                on_progress=self.progress.emit, is_canceled=self.isInterruptionRequested)
+        except Exception as e:
+            self.failed.emit(f"{type(e).__name__}: {e}")
+            return
+        if converted is None:
+            self.canceled.emit()
+        else:
+            self.done.emit(self.directory)
+
+    def attach_progress(self, dialog):
+        self.progress.connect(lambda done, total: (dialog.setMaximum(total), dialog.setValue(done)))
+        dialog.canceled.connect(self.requestInterruption)
+        self.finished.connect(dialog.close)
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
@@ -1,5 +1,5 @@
 import sys
-from PyQt5.QtWidgets import (QApplication, QLineEdit, QInputDialog, QCheckBox, QWidget, QVBoxLayout, QPushButton, QSlider, QFileDialog, QComboBox, QLabel, QHBoxLayout, QMainWindow, QMessageBox, QProgressBar,QDialog)
+from PyQt5.QtWidgets import (QApplication, QLineEdit, QInputDialog, QCheckBox, QWidget, QVBoxLayout, QPushButton, QSlider, QFileDialog, QComboBox, QLabel, QHBoxLayout, QMainWindow, QMessageBox, QProgressBar,QDialog, QProgressDialog)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 import pandas as pd
 import numpy as np
@@ -7,30 +7,58 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.ticker import FuncFormatter, AutoLocator, LogFormatterMathtext, ScalarFormatter
 import matplotlib.ticker as ticker
-import mplcursors
-from scipy.signal import find_peaks
 from PyQt5.QtWidgets import QColorDialog
+from memristor_core.parallel import run_ordered
+from memristor_core.pulses import analyse_pulse, save_pulse_plot, time_channel
+from memristor_core.workbook import Workbook
+from class_hover import HoverTooltip
+from class_scheduler import FrameScheduler
 
 class FileLoader(QThread):
     progress = pyqtSignal(int)
 
-    def __init__(self, file_paths):
+    def __init__(self, file_paths, columns=None):
         super().__init__()
         self.file_paths = file_paths
+        self.columns = columns
         self.sweeps = []
 
     def run(self):
-        total_sheets = sum(len(pd.ExcelFile(file_path).sheet_names) for file_path in self.file_paths)
+        # Every workbook is opened once, the same handle gives the sheet count and the data
+        workbooks = [Workbook(file_path, self.columns) for file_path in self.file_paths]
+        total_sheets = sum(len(workbook) for workbook in workbooks)
         sheets_processed = 0
 
-        for file_path in self.file_paths:
-            excel_file = pd.ExcelFile(file_path)
-            sheet_name_list = [sheet for sheet in excel_file.sheet_names if sheet not in ["Calc", "Settings"]]
-            for sheet in sheet_name_list:
-                df = pd.read_excel(file_path, sheet_name=sheet)
+        for workbook in workbooks:
+            for sheet, df in workbook:
                 self.sweeps.append(df)
                 sheets_processed += 1
-                self.progress.emit(int((sheets_processed / (total_sheets-2*len(self.file_paths))) * 100))
+                self.progress.emit(int((sheets_processed / total_sheets) * 100))
+            workbook.close()
+
+class PlotExporter(QThread):
+    """Saves the plots of all sheets in the background, one sheet per task in a pool of worker processes.
+    Each task is the arguments of save_pulse_plot."""
+    progress = pyqtSignal(int, int)     # plots saved, total plots
+    failed = pyqtSignal(str)
+    done = pyqtSignal()
+
+    def __init__(self, tasks, parent=None):
+        super().__init__(parent)
+        self.tasks = tasks
+
+    def cancel(self):
+        self.requestInterruption()
+
+    def run(self):
+        try:
+            for _ in run_ordered(save_pulse_plot, self.tasks, on_progress=self.progress.emit, is_canceled=self.isInterruptionRequested):
+                pass
+        except Exception as e:
+            self.failed.emit(f"{type(e).__name__}: {e}")
+            return
+        if not self.isInterruptionRequested():
+            self.done.emit()
 
 class PulsesViewer(QWidget):
     def __init__(self):
@@ -121,6 +149,7 @@ class PulsesViewer(QWidget):
         self.figure, self.ax1 = plt.subplots(figsize=(14, 6))
         self.canvas = FigureCanvas(self.figure)
         main_layout.addWidget(self.canvas)
+        self.init_plots()
 
         self.setLayout(main_layout)
 
@@ -131,6 +160,10 @@ class PulsesViewer(QWidget):
         self.TimeChannel = "TimeOutput" # Default time channel
         self.current_color = 'blue' # Default current color
         self.voltage_color = 'red'  # Default voltage color
+        self.new_data = False
+
+        # Slider moves are coalesced, the pulse metrics are computed on a worker thread
+        self.scheduler = FrameScheduler(self.prepare_frame, self.show_frame, self)
 
         #Making text bigger
         self.setStyleSheet("""
@@ -191,6 +224,7 @@ class PulsesViewer(QWidget):
         if not file_paths:
             return
         
+        self.scheduler.reset()
         self.sweeps.clear()
 
         progress_layout = QVBoxLayout()
@@ -210,17 +244,23 @@ class PulsesViewer(QWidget):
         self.progress_dialog.show()
 
         # Start file loader thread
-        self.file_loader = FileLoader(file_paths)
+        self.file_loader = FileLoader(file_paths, self.required_columns())
         self.file_loader.progress.connect(self.progress_bar.setValue)
         self.file_loader.finished.connect(self.on_files_loaded)
         self.file_loader.start()
 
+    # Columns of the Excel sheets used by the analysis, nothing else is parsed.
+    # The time column is "Time" in some measurement profiles and "TimeOutput" in others.
+    def required_columns(self):
+        return (self.VChannel, self.IChannel, "Time", "TimeOutput")
+
     def on_files_loaded(self):
         self.sweeps = self.file_loader.sweeps
 
         if self.sweeps:
             self.slider.setMaximum(len(self.sweeps) - 1)
             self.current_index = 0
+            self.new_data = True
             self.update_plot()
 
         self.progress_dialog.hide()
@@ -229,77 +269,12 @@ class PulsesViewer(QWidget):
         self.current_index = self.slider.value()
         if self.sweeps:
             df = self.sweeps[self.current_index]
-            self.plot_data(df)
-
-    def calculate_ion(self, df):
-        """
-        Calculate Ion as the average current in the second half of the voltage pulse.
-        """
-        # Interpolate the current and voltage channels
-        df[self.IChannel] = df[self.IChannel].interpolate(method='linear')
-        df[self.VChannel] = df[self.VChannel].interpolate(method='linear')
-
-        peaks,_ = find_peaks(df[self.VChannel])
-        #height_threshold = np.percentile(df[VChannel][peaks], 80)
-        height_threshold = 0.9*max(df[self.VChannel])
-        high_peaks = peaks[df[self.VChannel][peaks] > height_threshold]
-
-        if len(high_peaks)<2 or (high_peaks[1]-high_peaks[0] > 20):
-            return False, False
-
-        #In some measurement profiles the current is inverted and in some not, check for that here
-        if self.IChannel == "Imeas":
-            pulse_current = df[self.IChannel][high_peaks[0]:high_peaks[-1]]
-        else:
-            pulse_current = abs(df[self.IChannel])[high_peaks[0]:high_peaks[-1]]
-
-        pulse_voltage = df[self.VChannel][high_peaks[0]:high_peaks[-1]]
-        pulse_time = df[self.TimeChannel][high_peaks[0]:high_peaks[-1]]
-        Ion_interval = pulse_current[(len(pulse_current)//2):]
-        ton_interval = pulse_time[(len(pulse_time)//2):]
-        Von_interval = pulse_voltage[(len(pulse_voltage)//2):]
-        Ion_avg = np.mean(Ion_interval)
-        Von_avg = np.mean(Von_interval)
-        Ron = abs(Von_avg/Ion_avg)
-
-        # Find 90% of Ion_avg
-        target_current = 0.9 * Ion_avg
-        
-        # Locate the first time the current exceeds the target
-        idx_90 = np.where(pulse_current >= target_current)[0][0]  # Index in the second-half array
-        time_90 = pulse_time.iloc[idx_90]  # Corresponding time
-        
-        # Average current in the second half
-        return Ion_avg, Ron, time_90
-    
-    def calculate_ioff(self, df):
-        peaks,_ = find_peaks(df[self.VChannel])
-        height_threshold = 0.9*max(df[self.VChannel])
-        high_peaks = peaks[df[self.VChannel][peaks] > height_threshold]
-        if len(high_peaks)<2 or (high_peaks[1]-high_peaks[0] > 20):
-            return False, False
-        idx_left = peaks[np.where(peaks==high_peaks[-1])[0]+1][0]
-        
-        #Again, check if current inverted or not
-        if self.IChannel == "Imeas":
-            off_current = df[self.IChannel][idx_left:peaks[-1]]
-        else:
-            df[self.IChannel] = abs(df[self.IChannel])
-            off_current = df[self.IChannel][idx_left:peaks[-1]]
-
-        off_voltage = df[self.VChannel][idx_left:peaks[-1]]
-        off_time = df[self.TimeChannel][idx_left:peaks[-1]]
-        Ioff_interval = off_current[(len(off_current)//2):]
-        toff_interval = off_time[(len(off_time)//2):]
-        Ioff_avg = np.mean(Ioff_interval)
-        Voff_avg = np.mean(off_voltage[(len(off_voltage)//2):])
-        Roff = abs(Voff_avg/Ioff_avg)
-        Ioff_delta = (0.1 * (self.calculate_ion(df)[0] - Ioff_avg)) + Ioff_avg
-        idx_10 = np.where(df[self.IChannel][len(df[self.IChannel])//2:] <= Ioff_delta)[0][0]  # Index in the second-half array
-        time_10 = df[self.TimeChannel].iloc[idx_10 + (len(df[self.IChannel])//2)-1]
-
-
-        return Ioff_avg, Roff, time_10
+            try:
+                self.check_columns(df)
+            except KeyError as e:
+                self.column_error(e)
+                return
+            self.scheduler.request(df)
 
     def save_all_plots(self):
         # Ask for a directory to save the plots
@@ -307,6 +282,11 @@ class PulsesViewer(QWidget):
         if not save_dir:
             return  # If no directory selected, do nothing
         first_file_name = self.file_loader.file_paths[0].split('/')[-1].rsplit('.', 1)[0]
+        # The sheets are drawn offscreen by worker processes, with the size and style of the plot on screen
+        style = ((self.VChannel, self.IChannel), (self.voltage_color, self.current_color),
+                 self.grid_checkbox.isChecked(), tuple(self.figure.get_size_inches()))
+        tasks = []
+        error = None
         # Iterate over uploaded files and corresponding DataFrames
         for i, df in enumerate(self.sweeps):
             if len(self.file_loader.file_paths) == 1:
@@ -314,119 +294,153 @@ class PulsesViewer(QWidget):
             else:
                 file_name = self.file_loader.file_paths[i].split('/')[-1].rsplit('.', 1)[0]
             save_path = f"{save_dir}/{file_name}.png"
-
-            # Plot data and save to the specified path
-            self.plot_data(df, save_path=save_path)
+            try:
+                self.check_columns(df)
+            except KeyError as e:
+                error = error or e     # Sheets without the columns are skipped
+                continue
+            tasks.append((save_path, df[self.TimeChannel].to_numpy(), df[self.VChannel].to_numpy(),
+                          abs(df[self.IChannel]).to_numpy()) + style)
+        if error is not None:
+            self.column_error(error)
+
+        progress = QProgressDialog("Saving plots...", "Cancel", 0, len(tasks), self)
+        self.exporter = PlotExporter(tasks, self)
+        self.exporter.progress.connect(lambda done, total: (progress.setMaximum(total), progress.setValue(done)))
+        progress.canceled.connect(self.exporter.cancel)
+        self.exporter.finished.connect(progress.close)
+        self.exporter.finished.connect(lambda: self.save_button.setEnabled(True))
+        self.exporter.failed.connect(lambda message: QMessageBox.critical(self, "Error", f"Could not save the plots: {message}"))
+        self.exporter.done.connect(lambda: QMessageBox.information(self, "Success", f"Plots saved successfully to {save_dir}"))
+        self.save_button.setEnabled(False)
+        self.exporter.start()
+
+    def init_plots(self):
+        """Create the axes and lines once, show_frame only updates them."""
+        # Left axis for Voltage Channel
+        self.ax1.set_xlabel(r'$\it{Time}\ (s)$')
+        self.ax1.xaxis.set_minor_locator(ticker.AutoMinorLocator())
+        self.ax1.yaxis.set_minor_locator(ticker.AutoMinorLocator())
+        # Format y-axis1 with scientific notation
+        self.ax1.yaxis.set_major_formatter(ScalarFormatter())
+        self.voltage_line, = self.ax1.plot([], [], linewidth=1.5)
+
+        # Right axis for Current Channel
+        self.ax2 = self.ax1.twinx()
+        self.ax2.grid(False)
+        # Format y-axis2 with scientific notation
+        self.ax2.yaxis.set_major_formatter(ScalarFormatter())
+        self.current_line, = self.ax2.plot([], [], linewidth=1.5)
+
+        # Dotted lines for Ion and Ioff
+        self.ion_line = self.ax2.axhline(0, color='blue', linestyle='--', linewidth=1.0, label='Ion', visible=False)
+        self.ioff_line = self.ax2.axhline(0, color='red', linestyle='--', linewidth=1.0, label='Ioff', visible=False)
+
+        # Add interactive cursor
+        self.hover = HoverTooltip(self.canvas, [self.voltage_line, self.current_line])
+
+        # The layout is only redone when the canvas is resized (and when new files are loaded), not on every update
+        self.figure.tight_layout()
+        self.canvas.mpl_connect('resize_event', lambda event: self.figure.tight_layout())
+
+    def update_legend(self):
+        # A single legend for the visible lines of both axes
+        lines = [line for line in self.ax1.get_lines() + self.ax2.get_lines() if line.get_visible()]
+        self.ax1.legend(lines, [line.get_label() for line in lines], loc='upper right')
+
+    def check_columns(self, df):
+        if self.VChannel not in df.columns:
+            raise KeyError("Chosen voltage column not found")
+        if self.IChannel not in df.columns:
+            raise KeyError("Chosen current column not found")
         
-        QMessageBox.information(self, "Success", f"Plots saved successfully to {save_dir}")
-
-    def plot_data(self, df, save_path=None):
-        try:
-            if self.VChannel not in df.columns:
-                raise KeyError("Chosen voltage column not found")
-            if self.IChannel not in df.columns:
-                raise KeyError("Chosen current column not found")
-            
-            if "Time" in self.sweeps[0].columns:
-                self.TimeChannel = "Time"
-                df[self.IChannel] = abs(df[self.IChannel])
-            else:
-                self.TimeChannel = "TimeOutput"
-
-            # Clear the previous plot
-            self.figure.clear()
-
-            # Create new axes
-            self.ax1 = self.figure.add_subplot(111)
-
-            # Left axis for Voltage Channel
-            self.ax1.set_xlabel(r'$\it{Time}\ (s)$')
-            self.ax1.set_ylabel(r'$\it{V}\ (V)$', color=self.voltage_color)
-            line1, = self.ax1.plot(df[self.TimeChannel], df[self.VChannel], color=self.voltage_color, linewidth=1.5, label=self.VChannel)
-            self.ax1.tick_params(axis='y', labelcolor=self.voltage_color)
-
-            if self.grid_checkbox.isChecked():
-                self.ax1.grid(True, which='both', linestyle='--', linewidth=0.5)
-
-            self.ax1.xaxis.set_minor_locator(ticker.AutoMinorLocator())
-            self.ax1.yaxis.set_minor_locator(ticker.AutoMinorLocator())
-
-            # Format y-axis1 with scientific notation
-            self.ax1.yaxis.set_major_formatter(ScalarFormatter())
-
-            # Right axis for Current Channel
-            ax2 = self.ax1.twinx()
-            ax2.set_ylabel(r'$\it{I}\ (A)$', color=self.current_color)
-            line2, = ax2.plot(df[self.TimeChannel], abs(df[self.IChannel]), color=self.current_color, linewidth=1.5, label=self.IChannel)
-            ax2.tick_params(axis='y', labelcolor=self.current_color)
-            ax2.grid(False)
-
-            # Format y-axis2 with scientific notation
-            ax2.yaxis.set_major_formatter(ScalarFormatter())
-
-            # Get handles and labels from both axes
-            lines1, labels1 = self.ax1.get_legend_handles_labels()
-            lines2, labels2 = ax2.get_legend_handles_labels()
-
-            # Combine both and create a single legend
-            self.ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper right')
-
-            # Format right y-axis with scientific notation
-            #self.ax1.yaxis.set_major_formatter(LogFormatterMathtext(base=10))
-
-            # Add interactive cursor
-            mplcursors.cursor([line1, line2], hover=2)
-
+        self.TimeChannel = time_channel(self.sweeps[0].columns)
+        if self.TimeChannel not in df.columns:
+            raise KeyError(self.TimeChannel)
+
+    def column_error(self, e):
+        QMessageBox.critical(self, "Error", f"Column doesn't exist: {str(e)}. Please try another file.")
+
+    # Runs on the worker thread: the plotted data and the metrics of the sheet, no widgets in here
+    def prepare_frame(self, df):
+        pulse = analyse_pulse(df, self.VChannel, self.IChannel, self.TimeChannel)
+        time = df[self.TimeChannel].to_numpy()
+        voltage = df[self.VChannel].to_numpy()
+        current = abs(df[self.IChannel]).to_numpy()
+        return time, voltage, current, pulse
+
+    def show_frame(self, frame):
+        time, voltage, current, pulse = frame
+
+        # Left axis for Voltage Channel
+        self.ax1.set_ylabel(r'$\it{V}\ (V)$', color=self.voltage_color)
+        self.voltage_line.set_data(time, voltage)
+        self.voltage_line.set_color(self.voltage_color)
+        self.voltage_line.set_label(self.VChannel)
+        self.ax1.tick_params(axis='y', labelcolor=self.voltage_color)
+
+        if self.grid_checkbox.isChecked():
+            self.ax1.grid(True, which='both', linestyle='--', linewidth=0.5)
+        else:
+            self.ax1.grid(False, which='both')
+
+        # Right axis for Current Channel
+        self.ax2.set_ylabel(r'$\it{I}\ (A)$', color=self.current_color)
+        self.current_line.set_data(time, current)
+        self.current_line.set_color(self.current_color)
+        self.current_line.set_label(self.IChannel)
+        self.ax2.tick_params(axis='y', labelcolor=self.current_color)
+
+        # The lines are only shown when Ion/Ioff are found
+        self.ion_line.set_visible(False)
+        self.ioff_line.set_visible(False)
+        self.update_legend()
+        for ax in (self.ax1, self.ax2):
+            ax.relim(visible_only=True)
+            ax.autoscale_view()
+
+        # Calculate Ion
+        ion = pulse.Ion
+        if ion:
+            self.ion_label.setText(f"Ion: {ion:.2e} A")
+            # Show horizontal dotted line for Ion
+            self.ion_line.set_ydata([ion, ion])
+            self.ion_line.set_visible(True)
+
+        # Calculate Ron
+        Ron = pulse.Ron
+        if Ron:
+            self.Ron_label.setText(f"Ron: {Ron:.2e} Ohm")
+
+        # Calculate ton
+        ton = pulse.ton
+        if ton:
+            self.ton_label.setText(f"ton: {ton:.2e} s")
+
+        # Calculate Ioff
+        ioff = pulse.Ioff
+        if ioff:
+            self.ioff_label.setText(f"Ioff: {ioff:.2e} A")
+            # Show horizontal dotted line for Ioff
+            self.ioff_line.set_ydata([ioff, ioff])
+            self.ioff_line.set_visible(True)
+
+        # Calculate Roff
+        Roff = pulse.Roff
+        if Roff:
+            self.Roff_label.setText(f"Roff: {Roff:.2e} Ohm")
+
+        # Calculate toff
+        toff = pulse.toff
+        if toff:
+            self.toff_label.setText(f"toff: {toff:.2e} s")
+
+        # Update the legend to include Ion and Ioff
+        self.update_legend()
+        if self.new_data:   # Tick labels of the new data can be wider, lay the plot out again
+            self.new_data = False
             self.figure.tight_layout()
-            self.canvas.draw()
-
-            if save_path:
-                self.figure.savefig(save_path, dpi=300)
-
-            on_results = self.calculate_ion(df)
-            
-            # Calculate Ion
-            ion = on_results[0]
-            if ion != False:
-                self.ion_label.setText(f"Ion: {ion:.2e} A")
-                # Add horizontal dotted line for Ion
-                ax2.axhline(ion, color='blue', linestyle='--', linewidth=1.0, label='Ion')
-            
-            # Calculate Ron
-            Ron = on_results[1]
-            if Ron != False:
-                self.Ron_label.setText(f"Ron: {Ron:.2e} Ohm")
-
-            # Calculate ton
-            ton = on_results[2]
-            if ton != False:
-                self.ton_label.setText(f"ton: {ton:.2e} s")
-
-            off_results = self.calculate_ioff(df)
-            # Calculate Ioff
-            ioff = off_results[0]
-            if ioff != False:
-                self.ioff_label.setText(f"Ioff: {ioff:.2e} A")
-                # Add horizontal dotted line for Ioff
-                ax2.axhline(ioff, color='red', linestyle='--', linewidth=1.0, label='Ioff')
-
-            # Calculate Roff
-            Roff = off_results[1]
-            if Roff != False:
-                self.Roff_label.setText(f"Roff: {Roff:.2e} Ohm")
-
-            # Calculate toff
-            toff = off_results[2]
-            if toff != False:
-                self.toff_label.setText(f"toff: {toff:.2e} s")
-
-            # Update the legend to include Ion and Ioff
-            lines1, labels1 = self.ax1.get_legend_handles_labels()
-            lines2, labels2 = ax2.get_legend_handles_labels()
-            self.ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper right')
-
-        except KeyError as e:
-            QMessageBox.critical(self, "Error", f"Column doesn't exist: {str(e)}. Please try another file.")
+        self.canvas.draw_idle()
 
     def pick_voltage_color(self):
         # Open color picker dialog and set the selected color
@@ -0,0 +1,70 @@
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from PyQt5.QtCore import QObject, pyqtSignal
+from memristor_core.profiling import timed
+
+class FrameScheduler(QObject):
+    """Puts slider moves through ``prepare`` on a worker thread and ``commit`` on the GUI thread.
+
+    ``request(*args)`` only remembers the arguments, so it can be called for every
+    ``valueChanged`` of a slider. One frame is prepared at a time: while it is, newer
+    requests replace each other and only the last one is prepared next, the positions
+    in between are never computed nor drawn. ``prepare(*args)`` slices the data and
+    must not touch any widget; its result is given to ``commit(frame)``, which draws it.
+    The next frame is already being prepared while ``commit`` runs.
+
+    ``reset()`` forgets the pending request and drops the frame being prepared, for
+    when the data it was made from is replaced.
+
+    Both steps are recorded by ``memristor_core.profiling`` under the names of the
+    viewer methods, e.g. ``IVSweepsAnalyser.prepare_frame``.
+
+    An exception in ``prepare`` or ``commit`` is printed and that frame is skipped,
+    the next request is handled as usual. Raised out of the slot, PyQt would abort
+    the application.
+    """
+    _prepared = pyqtSignal(int, object)     # generation, future
+
+    def __init__(self, prepare, commit, parent=None):
+        super().__init__(parent)
+        self.prepare = timed(prepare.__qualname__)(prepare)
+        self.commit = timed(commit.__qualname__)(commit)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = None
+        self._pending = None
+        self._running = False
+        self._generation = 0
+        # Emitted from the worker thread, so the slot runs queued on the GUI thread
+        self._prepared.connect(self._finished)
+
+    def request(self, *args):
+        self._pending = args
+        if not self._running:
+            self._start()
+
+    def _start(self):
+        args, self._pending = self._pending, None
+        self._running = True
+        generation = self._generation
+        self._future = self._executor.submit(self.prepare, *args)
+        self._future.add_done_callback(lambda future: self._prepared.emit(generation, future))
+
+    def _finished(self, generation, future):
+        self._running = False
+        if self._pending is not None:
+            self._start()
+        if generation == self._generation:
+            try:
+                self.commit(future.result())
+            except Exception:
+                traceback.print_exc()
+
+    def busy(self):
+        return self._running or self._pending is not None
+
+    def reset(self):
+        """Drop the pending request and the frame being prepared, waiting until the worker is idle."""
+        self._generation += 1
+        self._pending = None
+        if self._future is not None:
+            wait([self._future])
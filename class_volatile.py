@@ -1,16 +1,19 @@
 from PyQt5.QtWidgets import (QApplication, QWidget, QColorDialog, QVBoxLayout, QPushButton, QSlider, QFileDialog, QComboBox, QLabel, QHBoxLayout, QMainWindow, QMenu, QMessageBox, QProgressDialog, QCheckBox, QInputDialog, QLineEdit)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.ticker import LogFormatterMathtext
+from matplotlib.collections import LineCollection
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas, NavigationToolbar2QT as NavigationToolbar
-import mplcursors
 import numpy as np
-from scipy.signal import find_peaks
-from openpyxl import load_workbook
-import xlrd
+from class_blit import BlitManager
+from class_hover import HoverTooltip
+from class_loader import SheetLoader
+from class_scheduler import FrameScheduler
 import math
+from memristor_core.iv import analyse_volatile
+from memristor_core.profiling import timed
 
 class VolatileSweepsAnalyser(QWidget):
     def __init__(self):
@@ -141,21 +144,36 @@ class VolatileSweepsAnalyser(QWidget):
         main_layout.addLayout(under_graph_hbox)
         
         self.file_paths = ""
+        self.loader = None
+        self.redraw_pending = False
         ################## Initialize all to be extracted data ##################
         self.sweeps = []
-        self.dfreset = []
-        self.dfset = []
+        self.result = None      # VolatileResult of the sheets loaded so far
+        self.cycles = None
+        self.points = np.empty((0, 2))
         self.Vset = []
         #self.datapts = 300
         self.current_index = 0
         self.voltage_color = 'blue'
         self.first_color = 'deepskyblue'
+        self.new_data = False
+
+        # Slider moves are coalesced, the data of the frame is sliced on a worker thread
+        self.scheduler = FrameScheduler(self.prepare_frame, self.show_frame, self)
+        self.init_plots()
+
+    # Columns of the Excel sheets used by the analysis, nothing else is parsed
+    def required_columns(self):
+        return (self.VChannel, self.IChannel, "Time")
 
     def clear_lists(self):
+        self.scheduler.reset()
+        self.remove_all_lines()
         self.sweeps = []
         self.Vset = []
-        self.dfset = []
-        self.dfreset = []
+        self.result = None      # VolatileResult of the sheets loaded so far
+        self.cycles = None
+        self.points = np.empty((0, 2))
         
     ####################### Main funcion of the script, reads excel files, calculates and initializes everything, initializes plots ###########################
     def upload_files(self):
@@ -177,65 +195,92 @@ class VolatileSweepsAnalyser(QWidget):
         self.VChannel = VChannel
         self.IChannel = IChannel
 
+        options = QFileDialog.Options()
+        self.file_paths, _ = QFileDialog.getOpenFileNames(self, "Upload Excel Files", "", "Excel Files (*.xls *.xlsx)", options=options)
+        
+        if len(self.file_paths) == 0:   ## Do nothing if there are no selected files i.e. cancel was clicked
+            return
+        self.stop_loading()
+        if len(self.sweeps) != 0:   ## If other files are uploaded again empty the existing sweeps
+            self.clear_lists()
+
+        # Progress dialog, not modal so the cycles that are already loaded can be looked at
+        self.progress = QProgressDialog("Loading files...", "Cancel", 0, len(self.file_paths), self)
+        self.progress.setAutoClose(True)
+        self.progress.setAutoReset(True)
+
+        ## Read all sheets in all selected files except for the "Calc" and "Settings" sheets in a background thread
+        self.loader = SheetLoader(self.file_paths, self.required_columns(), self)
+        self.loader.attach_progress(self.progress)
+        self.loader.sheets_loaded.connect(self.add_sheets)
+        self.loader.failed.connect(self.loading_failed)
+        self.loader.start()
+
+    # Loader signals, anything still queued from an older or canceled load is ignored
+    def from_current_loader(self):
+        return self.sender() is self.loader and not self.loader.is_canceled()
+
+    def stop_loading(self):
+        if self.loader is not None:
+            self.loader.stop()
+
+    def closeEvent(self, event):
+        self.stop_loading()
+        self.scheduler.reset()
+        super().closeEvent(event)
+
+    def loading_failed(self, message):
+        if self.sender() is self.loader:
+            QMessageBox.critical(self, "Error", f"Could not read the files: {message}")
+
+    def redraw_loaded(self):
+        self.redraw_pending = False
+        self.update_plot()
+
+    def relayout(self):
+        if self.new_data:   # Tick labels of the new data can be wider, lay the plot out again
+            self.new_data = False
+            self.figure.tight_layout()
+            self.canvas.draw_idle()
+
+    # Adds freshly read sheets, one cycle each
+    @timed()
+    def add_sheets(self, sheets):
+        if not self.from_current_loader():
+            return
         try:
-            options = QFileDialog.Options()
-            self.file_paths, _ = QFileDialog.getOpenFileNames(self, "Upload Excel Files", "", "Excel Files (*.xls *.xlsx)", options=options)
-            
-            if len(self.file_paths) == 0:   ## Do nothing if there are no selected files i.e. cancel was clicked
+            sweeps = [df for _, _, df in sheets if not df.empty]    #Ignore empty sheets
+            if len(sweeps) == 0:
                 return
-            if len(self.sweeps) != 0:   ## If other files are uploaded again empty the existing sweeps
-                self.clear_lists()
-
-            # Initialize progress dialog
-            progress = QProgressDialog("Loading files...", "Cancel", 0, len(self.file_paths), self)
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setAutoClose(True)
-            progress.setAutoReset(True)
-
-            # Read all sheets in all selected files except for the "Calc" and "Settings" sheets.
-            total_steps = 0
-            for file_path in self.file_paths:
-                if file_path.endswith('.xlsx'):
-                    total_steps += len(load_workbook(file_path, read_only=True).sheetnames) - 2  # Calculate total steps
-                else:
-                    total_steps += len(xlrd.open_workbook(file_path).sheets()) - 2
-            progress.setRange(0, total_steps)
-            current_step = 0
-
-            ## Read all sheets in all selected files except for the "Calc" and "Settings" sheets.
-            for file_path in self.file_paths:
-                if progress.wasCanceled():
-                    return  # Handle cancellation
-
-                excel_file = pd.ExcelFile(file_path)
-                sheet_names = [sheet for sheet in excel_file.sheet_names if sheet not in ["Calc", "Settings"]]
-                
-                for sheet in sheet_names:
-                    if progress.wasCanceled():
-                        return  # Handle cancellation
-                    df = pd.read_excel(file_path, sheet_name=sheet)
-                    if df.empty:    #Ignore empty sheets
-                        progress.setValue(current_step)
-                        current_step += 1
-                        continue
-                    self.sweeps.append(df)
-                    current_step += 1
-                    progress.setValue(current_step)
+            first_sheets = len(self.sweeps) == 0
+            self.sweeps.extend(sweeps)
 
             # Filter the sweeps to remove those where the first value of the Voltage column is NaN
             #self.sweeps = [sweep for sweep in self.sweeps if not pd.isna(sweep.DrainV.iloc[0])]
 
             #if len(self.sweeps) == 0:
                 #raise KeyError("Excel files provided have no data")
+
+            # Vset of every new cycle, computed once and looked up by update_plot
+            self.result = analyse_volatile(sweeps, self.VChannel, self.IChannel, previous=self.result)
+            self.cycles = self.result.cycles
+            self.points = self.result.points
+            self.Vset = self.result.vset.tolist()
                         
             self.slider.setMaximum(len(self.sweeps))
-            self.current_index = 0
-
-            self.slider.setValue(0)
-            self.update_plot()
+            if first_sheets:
+                self.current_index = 0
+                self.slider.setValue(0)
+                self.new_data = True
+            # Batches that arrive back to back are drawn once
+            if not self.redraw_pending:
+                self.redraw_pending = True
+                QTimer.singleShot(0, self.redraw_loaded)
 
             self.total_cycles.setText(f"Total cycles: {len(self.sweeps)} ")
         except KeyError as e:
+            self.stop_loading()
+            self.clear_lists()
             QMessageBox.critical(self, "Error", f"Voltage column doesn't have data: {str(e)}. Please try another file.")
 
     def update_plot(self, *args):
@@ -244,125 +289,98 @@ class VolatileSweepsAnalyser(QWidget):
             return
         elif len(self.sweeps) == 0:
             return
-        # Update the dataframe with the step of the slider
         if self.checkbox.isChecked():
             self.slider.setEnabled(False)  # Disable the slider
-            # Clear the previous plot
-            self.figure.clear()
-
-            # Create new axes
-            self.ax1 = self.figure.add_subplot(111)
-
-            # Left axis for Voltage Channel
-            self.ax1.set_xlabel(r'$\it{V}\ (V)$')
-            self.ax1.set_ylabel(r'$\it{I}\ (A)$')
-            for i,df in enumerate(reversed(self.sweeps)):
-                if i == len(self.sweeps) - 1:
-                    line1, = self.ax1.plot(df[self.VChannel], df[self.IChannel].abs(), color=self.first_color, linewidth=2, alpha=0.8, label=self.VChannel)
-                else:
-                    line1, = self.ax1.plot(df[self.VChannel], df[self.IChannel].abs(), color=self.voltage_color, linewidth=2, alpha=0.8, label=self.VChannel)
-            #self.ax1.plot(df[self.VChannel], df[self.IChannel].abs(), color="blue", linewidth=0.5)
-            self.ax1.tick_params(axis='y', labelcolor='black')
-            #self.ax1.grid(True, which='both', linestyle='--', linewidth=0.5)
-            self.ax1.set_yscale('log')
-
-            # Format y-axis with scientific notation
-            self.ax1.yaxis.set_major_formatter(LogFormatterMathtext(base=10))
-
-            # Add interactive cursor
-            mplcursors.cursor([line1], hover=2)
-            
-            self.figure.tight_layout()
-            self.canvas.draw()
+            self.scheduler.reset()  # A cycle still being prepared would be drawn over all of them
+            self.plot_all()
+            self.relayout()
         else:
             self.slider.setEnabled(True)  # Enable the slider
-            df = self.sweeps[self.current_index]
-            self.plot_data(df)
-
-            # Update Vset and Vreset labels
-            self.slider_counter.setText(f"Cycle nr: {self.current_index+1} ")
-            temp_df = self.sweeps[self.current_index]
-            
-            self.current_Vset.setText(f"Vset: {self.write_Vset(temp_df):.3f} ")
-        
-    
-    def write_Vset(self, df):
-        forth_idxes = np.where(np.gradient(df[self.VChannel])>0)[0]
-        forth_idxes = forth_idxes[df[self.VChannel].iloc[forth_idxes] > 0.05]
-        setvoltage = df[self.VChannel].iloc[forth_idxes]
-        setcurrent = df[self.IChannel].iloc[forth_idxes]
-        settime = df.Time.iloc[forth_idxes]
-        R = setvoltage.abs()/setcurrent.abs()
-        dR = -(np.gradient(np.log(R)))
-        max_idx,_ = find_peaks(dR)
-        
-        highest_peak = max_idx[np.argmax(dR[max_idx])]
-        threshold = 0.7 * dR[highest_peak]
-        max_idx2 = max_idx[dR[max_idx] >= threshold]
-        max_dR = dR[max_idx2]
-        max_t = settime.iloc[max_idx2]
-
-        if max_dR.size == 0:
-            VSET = np.min(setvoltage)
-        else:
-            idx_RESET = np.where(settime == max_t.iloc[-1])[0][0]
-            VSET = setvoltage.iloc[idx_RESET]
-            if abs(VSET) < 0.05:
-                VSET = setvoltage.iloc[-1]
-        return VSET
-    
-    def update_Vset(self, dfset):
-        if len(dfset) == 0:
-            return
-        for set_sweep in dfset:
-            # Take only the sweep in and not the sweep back part 
-            # and also get rid of the first part of the sweep because it messes with the gradient
-            forth_idxes = np.where(np.gradient(set_sweep.Voltage)>0)[0]
-            forth_idxes = forth_idxes[set_sweep.Voltage.iloc[forth_idxes] > 0.05]
-            setvoltage = set_sweep.Voltage.iloc[forth_idxes]
-            setcurrent = set_sweep.Current.iloc[forth_idxes]
-            settime = set_sweep.TimeOutput.iloc[forth_idxes]
-            R = setvoltage.abs()/setcurrent.abs()
-            dR = -(np.gradient(np.log(R)))
-            max_idx,_ = find_peaks(dR)
-            
-            highest_peak = max_idx[np.argmax(dR[max_idx])]
-            threshold = 0.7 * dR[highest_peak]
-            max_idx2 = max_idx[dR[max_idx] >= threshold]
-            max_dR = dR[max_idx2]
-            max_t = settime.iloc[max_idx2]
-
-            if max_dR.size == 0:
-                VSET = np.min(setvoltage)
-            else:
-                idx_RESET = np.where(settime == max_t.iloc[-1])[0][0]
-                VSET = setvoltage.iloc[idx_RESET]
-                if abs(VSET) < 0.05:
-                    VSET = setvoltage.iloc[-1]
-            self.Vset.append(VSET)
-
-    def plot_data(self, df):
-        # Clear the previous plot
-        self.figure.clear()
-
-        # Create new axes
-        self.ax1 = self.figure.add_subplot(111)
+            self.scheduler.request(self.points, self.cycles, self.current_index)
+
+    # Runs on the worker thread: data of the cycle on the slider, no widgets in here
+    def prepare_frame(self, points, cycles, index):
+        start, stop = cycles.Start.iat[index], cycles.Stop.iat[index]
+        return (index, points[start:stop, 0], points[start:stop, 1],
+                cycles[index:index+1], cycles.Vswitch.iat[index])
 
+    def show_frame(self, frame):
+        index, voltage, current, cycle, vswitch = frame
+        self.plot_data(voltage, current, cycle)
+        self.relayout()
+
+        # Update Vset and Vreset labels
+        self.slider_counter.setText(f"Cycle nr: {index+1} ")
+        self.current_Vset.setText(f"Vset: {vswitch:.3f} ")
+
+    
+    # Axes and line of the current cycle, created once and updated with new data afterwards
+    def init_plots(self):
         # Left axis for Voltage Channel
         self.ax1.set_xlabel(r'$\it{V}\ (V)$')
         self.ax1.set_ylabel(r'$\it{I}\ (A)$')
-        line1, = self.ax1.plot(df[self.VChannel], df[self.IChannel].abs(), color=self.voltage_color, linewidth=2, alpha=0.8, label=self.VChannel)
         self.ax1.tick_params(axis='y', labelcolor='black')
         self.ax1.set_yscale('log')
 
         # Format y-axis with scientific notation
         self.ax1.yaxis.set_major_formatter(LogFormatterMathtext(base=10))
 
+        self.cycle_line, = self.ax1.plot([], [], color=self.voltage_color, linewidth=2, alpha=0.8)
+        # Only the cycle line is redrawn while scrubbing, the axes are kept as a picture
+        self.blit = BlitManager(self.canvas, [self.cycle_line])
+        # All cycles in one collection, the first cycle on top of it in its own color
+        self.all_lines = LineCollection([], linewidths=2, alpha=0.8, capstyle='projecting', visible=False)
+        self.ax1.add_collection(self.all_lines, autolim=False)
+        self.first_line, = self.ax1.plot([], [], linewidth=2, alpha=0.8, visible=False, label="Cycle 1")
+        self.all_count = 0
+
         # Add interactive cursor
-        mplcursors.cursor([line1], hover=2)
-        
+        self.hover = HoverTooltip(self.canvas, [self.cycle_line, self.first_line], blit=self.blit)
+        # Segments of the collection are the cycles after the first, last one first
+        self.hover.add(self.all_lines, lambda segment: f"Cycle {self.all_count - segment}")
+
+        # The layout is only redone when the canvas is resized (and when new files are loaded), not on every update
         self.figure.tight_layout()
-        self.canvas.draw()
+        self.canvas.mpl_connect('resize_event', lambda event: self.figure.tight_layout())
+
+    # Axis limits from the bounds of the plotted cycles, without going through all the points
+    def set_limits(self, cycles):
+        corners = np.array([[np.nanmin(cycles.Vmin), np.nanmin(cycles.Imin)], [np.nanmax(cycles.Vmax), np.nanmax(cycles.Imax)]])
+        self.ax1.ignore_existing_data_limits = True
+        if np.isfinite(corners).all():
+            self.ax1.update_datalim(corners)
+        self.ax1.autoscale_view()
+
+    def plot_data(self, voltage, current, cycles):
+        self.all_lines.set_visible(False)
+        self.first_line.set_visible(False)
+        self.cycle_line.set_visible(True)
+        self.cycle_line.set_data(voltage, current)
+        self.cycle_line.set_color(self.voltage_color)
+        self.set_limits(cycles)
+        self.blit.update()
+
+    def remove_all_lines(self):
+        self.all_lines.set_segments([])
+        self.first_line.set_data([], [])
+        self.all_count = 0
+
+    # All cycles at once, the first one on top in its own color
+    def plot_all(self):
+        # The segments only change when cycles are loaded, later cycles go below earlier ones
+        if self.all_count != len(self.cycles):
+            starts, stops = self.cycles.Start.to_numpy(), self.cycles.Stop.to_numpy()
+            self.all_lines.set_segments([self.points[start:stop] for start, stop in zip(starts[:0:-1], stops[:0:-1])])
+            self.first_line.set_data(self.points[starts[0]:stops[0]].T)
+            self.all_count = len(self.cycles)
+        self.cycle_line.set_visible(False)
+        self.all_lines.set_visible(True)
+        self.all_lines.set_color(self.voltage_color)
+        self.first_line.set_visible(True)
+        self.first_line.set_color(self.first_color)
+        self.set_limits(self.cycles)
+        # The background has all cycles on it now, drawn again when they or their colors change
+        self.blit.update(("all", self.all_count, self.voltage_color, self.first_color))
 
     def show_context_menu(self, pos):
         context_menu = QMenu(self)
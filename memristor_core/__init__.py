@@ -0,0 +1,19 @@
+"""Qt-free helpers shared by the Memristor Metrics viewers.
+
+Nothing in this package imports PyQt5, so it can be used from worker
+processes, scripts and notebooks as well as from the GUI. The viewers only
+display what these return:
+
+- ``iv.analyse_iv`` / ``iv.analyse_volatile`` -> ``IVResult`` / ``VolatileResult``
+- ``pulses.analyse_pulse`` -> ``PulseResult``
+- ``retention.analyse_retention`` -> ``RetentionResult``
+
+For example, the cycles of a Clarius IV workbook::
+
+    from memristor_core.iv import analyse_iv
+    from memristor_core.workbook import Workbook
+
+    with Workbook("sweeps.xlsx") as workbook:
+        result = analyse_iv([df for _, df in workbook])
+    result.cycles, result.mean("Vset")
+"""
@@ -0,0 +1,218 @@
+"""Headless batch analysis of whole folders of measurements.
+
+    python main.py batch --mode iv --input data/ --out results.parquet
+
+runs the same extraction as the viewers (``memristor_core.iv``, ``.pulses`` and
+``.retention``) on every workbook, without a display and without importing
+PyQt5, and writes one table with a ``File`` column. Files are analysed in
+parallel worker processes. The exit status is 0 when every file was analysed,
+1 when some failed (they are listed on stderr) and 2 for bad arguments or an
+output that can't be written.
+"""
+import argparse
+from dataclasses import asdict, fields
+import glob
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from memristor_core.iv import analyse_iv, analyse_volatile
+from memristor_core.parallel import run_ordered
+from memristor_core.pulses import PulseResult, analyse_pulse, time_channel
+from memristor_core.retention import analyse_retention
+from memristor_core.workbook import Workbook
+
+MODES = ("iv", "pulses", "retention", "volatile")
+# Channels the viewers start with
+DEFAULT_CHANNELS = {"iv": ("Voltage", "Current"), "pulses": ("VMeasCh2", "IMeasCh1"),
+                    "retention": ("R", "Time"), "volatile": ("DrainV", "DrainI")}
+OUTPUT_TYPES = (".csv", ".xlsx", ".parquet")
+# Libraries pandas writes parquet with, optional (see requirements.txt)
+PARQUET_ENGINES = ("pyarrow", "fastparquet")
+
+
+def find_workbooks(inputs):
+    """Excel files named in ``inputs``, folders being searched (not recursively) for .xls/.xlsx files."""
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, "*.xlsx")) + glob.glob(os.path.join(path, "*.xls"))
+            # Lock files Excel leaves next to open workbooks
+            paths += sorted(name for name in found if not os.path.basename(name).startswith("~$"))
+        else:
+            paths.append(path)
+    return list(dict.fromkeys(paths))
+
+
+def required_columns(mode, channels):
+    if mode == "iv":
+        return channels + ("Voltage", "Current", "TimeOutput", "SetResistance", "ResetResistance", "SetVoltage", "ResetVoltage")
+    if mode == "pulses":
+        return channels + ("Time", "TimeOutput")
+    if mode == "volatile":
+        return channels + ("Time",)
+    return channels
+
+
+def _check_columns(df, columns, sheet):
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise KeyError(f"Sheet '{sheet}' does not contain the column(s) {', '.join(missing)}")
+
+
+def iv_results(sheets, v_channel, i_channel, ignore_faulty=True):
+    result = analyse_iv([df for _, df in sheets], v_channel, i_channel, ignore_faulty)
+    if result is None:
+        return pd.DataFrame()
+    return result.cycles.reset_index()
+
+
+def pulse_results(sheets, v_channel, i_channel):
+    rows = []
+    t_channel = time_channel(sheets[0][1].columns) if sheets else "TimeOutput"
+    for sheet, df in sheets:
+        _check_columns(df, (v_channel, i_channel, t_channel), sheet)
+        rows.append({"Sheet": sheet, **asdict(analyse_pulse(df, v_channel, i_channel, t_channel))})
+    columns = [field.name for field in fields(PulseResult)]
+    return pd.DataFrame(rows, columns=["Sheet"] + columns).astype({column: float for column in columns})
+
+
+def volatile_results(sheets, v_channel, i_channel):
+    sheets = [(sheet, df) for sheet, df in sheets if not df.empty]
+    for sheet, df in sheets:
+        _check_columns(df, (v_channel, i_channel, "Time"), sheet)
+    result = analyse_volatile([df for _, df in sheets], v_channel, i_channel)
+    if result is None:
+        return pd.DataFrame()
+    return pd.DataFrame({"Sheet": [sheet for sheet, _ in sheets], "Vset": result.vset},
+                        index=pd.RangeIndex(len(sheets), name="Cycle")).reset_index()
+
+
+def analyse_file(mode, file_path, options):
+    """Worker: the results of one workbook as ``(table, None)``, or ``(None, error)``.
+    Retention sheets are returned as read, their time depends on the files before them."""
+    try:
+        channels = options["channels"]
+        with Workbook(file_path, required_columns(mode, channels), cache=options["cache"]) as workbook:
+            sheets = list(workbook)
+        if mode == "iv":
+            return iv_results(sheets, *channels, ignore_faulty=options["ignore_faulty"]), None
+        if mode == "pulses":
+            return pulse_results(sheets, *channels), None
+        if mode == "volatile":
+            return volatile_results(sheets, *channels), None
+        return sheets, None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def retention_results(files, r_channel, t_channel, reset_time_per_file):
+    # Same time shifting as the viewer, which goes through the sheets of all files in order
+    sheets = [(file_path, sheet, df) for file_path, file_sheets in files for sheet, df in file_sheets]
+    result = analyse_retention(sheets, r_channel, t_channel, reset_time_per_file)
+    lengths = [len(df) for _, _, df in sheets]
+    return pd.DataFrame({"File": np.repeat([file_path for file_path, _, _ in sheets], lengths),
+                         "Sheet": np.repeat([sheet for _, sheet, _ in sheets], lengths),
+                         "Time": result.time,
+                         "R": result.r})
+
+
+def parquet_engine():
+    """The first installed library pandas can write parquet with, None without one."""
+    for engine in PARQUET_ENGINES:
+        if importlib.util.find_spec(engine) is not None:
+            return engine
+    return None
+
+
+def write_table(table, out):
+    extension = os.path.splitext(out)[1].lower()
+    if extension == ".csv":
+        table.to_csv(out, index=False)
+    elif extension == ".xlsx":
+        table.to_excel(out, index=False)
+    else:
+        table.to_parquet(out, index=False)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py batch", description="Analyse measurement files without the GUI.")
+    parser.add_argument("--mode", required=True, choices=MODES)
+    parser.add_argument("--input", required=True, nargs="+", help="Excel files and/or folders of Excel files")
+    parser.add_argument("--out", required=True, help="Results table, .csv, .xlsx or .parquet")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--voltage", help="Voltage channel (iv, pulses, volatile)")
+    parser.add_argument("--current", help="Current channel (iv, pulses, volatile)")
+    parser.add_argument("--resistance", help="Resistance channel (retention)")
+    parser.add_argument("--time", help="Time channel (retention)")
+    parser.add_argument("--keep-faulty", action="store_true", help="iv: keep sheets where a set has no reset")
+    parser.add_argument("--state", choices=("LRS", "HRS"), default="LRS",
+                        help="retention: LRS restarts the time with every file, HRS keeps counting")
+    parser.add_argument("--no-cache", action="store_true", help="Don't use the cache of parsed workbooks")
+    args = parser.parse_args(argv)
+    extension = os.path.splitext(args.out)[1].lower()
+    if extension not in OUTPUT_TYPES:
+        parser.error(f"--out must end in one of {', '.join(OUTPUT_TYPES)}")
+    # Checked before any file is analysed, not when the table is written
+    if extension == ".parquet" and parquet_engine() is None:
+        parser.error("--out .parquet needs pyarrow or fastparquet (pip install pyarrow)")
+    return args
+
+
+def main(argv=None):
+    try:
+        args = parse_args(argv)
+    except SystemExit as e:
+        return e.code
+    if args.mode == "retention":
+        defaults = DEFAULT_CHANNELS["retention"]
+        channels = (args.resistance or defaults[0], args.time or defaults[1])
+    else:
+        defaults = DEFAULT_CHANNELS[args.mode]
+        channels = (args.voltage or defaults[0], args.current or defaults[1])
+    options = {"channels": channels, "ignore_faulty": not args.keep_faulty, "cache": not args.no_cache}
+
+    file_paths = find_workbooks(args.input)
+    if not file_paths:
+        print("No Excel files found in " + ", ".join(args.input), file=sys.stderr)
+        return 1
+
+    def on_progress(done, total):
+        print(f"\r{done}/{total} files", end="", file=sys.stderr, flush=True)
+
+    tables = []
+    failed = 0
+    results = run_ordered(analyse_file, [(args.mode, file_path, options) for file_path in file_paths],
+                          processes=args.jobs, on_progress=on_progress)
+    for file_path, (table, error) in zip(file_paths, results):
+        if error is not None:
+            failed += 1
+            print(f"\n{file_path}: {error}", file=sys.stderr)
+        else:
+            tables.append((file_path, table))
+    print(file=sys.stderr)
+
+    if args.mode == "retention":
+        try:
+            table = retention_results(tables, *channels, reset_time_per_file=args.state == "LRS")
+        except KeyError as e:
+            print(e.args[0] if e.args else e, file=sys.stderr)
+            return 1
+    else:
+        tables = [table.assign(File=file_path)[["File"] + list(table.columns)] for file_path, table in tables if len(table)]
+        table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=["File"])
+
+    try:
+        write_table(table, args.out)
+    except (ImportError, OSError) as e:
+        print(f"Can't write {args.out}: {e}", file=sys.stderr)
+        return 2
+    print(f"{len(table)} rows from {len(file_paths) - failed} of {len(file_paths)} files written to {args.out}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""On-disk cache of parsed workbooks.
+
+Parsing Excel is by far the slowest part of loading a measurement, so every
+parsed workbook is stored as uncompressed NumPy column arrays, keyed by a hash
+of the file content. Opening an unchanged file again only reads those arrays
+back. A file that was changed gets a new key and is parsed again, and the
+entries that have not been used for the longest time are deleted once the
+cache grows beyond its size limit.
+
+Only numeric, boolean and datetime columns are stored, so the arrays load
+without unpickling anything: a workbook with text columns (whole sheets read
+without ``columns``) is simply not cached.
+
+The cache lives in ``~/.cache/memristor_metrics`` unless ``MEMRISTOR_CACHE_DIR``
+is set, is limited to ``MEMRISTOR_CACHE_MAX_MB`` (default 2048) megabytes and can
+be switched off with ``MEMRISTOR_CACHE=0``.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from memristor_core.profiling import timed
+
+CACHE_VERSION = 1
+# Array kinds stored without pickling: bool, integers, floats, complex, datetimes
+_PLAIN_KINDS = "biufcmM"
+DEFAULT_MAX_MB = 2048
+_META_FILE = "meta.json"
+_DATA_FILE = "sheets.npz"
+
+
+def _default_directory():
+    directory = os.environ.get("MEMRISTOR_CACHE_DIR")
+    if directory:
+        return directory
+    return os.path.join(os.path.expanduser("~"), ".cache", "memristor_metrics")
+
+
+def file_key(file_path, extra=""):
+    """Hash of the file content (plus ``extra``, e.g. the loaded columns)."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"v{CACHE_VERSION}:{extra}:".encode())
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SheetCache:
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or _default_directory()
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("MEMRISTOR_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024
+        self.max_bytes = max_bytes
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    @timed("cache.get")
+    def get(self, key):
+        """Return the cached sheets as an ordered ``{sheet_name: DataFrame}`` dict, or None."""
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, _META_FILE)) as f:
+                meta = json.load(f)
+            if meta["version"] != CACHE_VERSION:
+                raise ValueError("outdated cache entry")
+            sheets = {}
+            # Never unpickle: the directory is user-writable, a tampered entry must not run code
+            with np.load(os.path.join(entry, _DATA_FILE), allow_pickle=False) as data:
+                for i, sheet in enumerate(meta["sheets"]):
+                    columns = {column: data[f"{i}/{j}"] for j, column in enumerate(sheet["columns"])}
+                    sheets[sheet["name"]] = pd.DataFrame(columns, index=pd.RangeIndex(sheet["rows"]))
+            # The modification time of the meta file orders the entries for eviction
+            os.utime(os.path.join(entry, _META_FILE))
+            return sheets
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            self.invalidate(key)  # Unreadable or outdated, parse the workbook again
+            return None
+
+    @timed("cache.put")
+    def put(self, key, sheets, source=""):
+        """Store ``(sheet_name, DataFrame)`` pairs under ``key``. Failures are ignored,
+        the cache only ever makes loading faster. Returns False (and stores nothing)
+        if a column is not numeric, boolean or datetime."""
+        arrays = {}
+        meta = {"version": CACHE_VERSION, "source": os.path.basename(source), "sheets": []}
+        for i, (name, df) in enumerate(sheets):
+            meta["sheets"].append({"name": name, "columns": [str(column) for column in df.columns], "rows": len(df)})
+            for j, column in enumerate(df.columns):
+                values = df[column].to_numpy()
+                if values.dtype.kind not in _PLAIN_KINDS:
+                    return False    # Would need pickling to be read back
+                arrays[f"{i}/{j}"] = values
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            staging = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+            np.savez(os.path.join(staging, _DATA_FILE), **arrays)
+            with open(os.path.join(staging, _META_FILE), "w") as f:
+                json.dump(meta, f)
+            try:
+                os.rename(staging, self._entry(key))
+            except OSError:  # Another process stored the same workbook first
+                shutil.rmtree(staging, ignore_errors=True)
+            self.evict()
+        except OSError:
+            pass
+        return True
+
+    def invalidate(self, key):
+        """Drop one entry."""
+        shutil.rmtree(self._entry(key), ignore_errors=True)
+
+    def invalidate_file(self, file_path, extra=""):
+        """Drop the entry of a workbook, e.g. after it was re-exported in place."""
+        self.invalidate(file_key(file_path, extra))
+
+    def clear(self):
+        """Drop every entry."""
+        for entry in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [os.path.join(self.directory, name) for name in names if not name.startswith(".")]
+
+    def size(self):
+        """Total size of all entries in bytes."""
+        return sum(_entry_size(entry) for entry in self._entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        entries = []
+        for entry in self._entries():
+            try:
+                last_used = os.path.getmtime(os.path.join(entry, _META_FILE))
+            except OSError:
+                last_used = 0
+            entries.append((last_used, _entry_size(entry), entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+def _entry_size(entry):
+    size = 0
+    try:
+        names = os.listdir(entry)
+    except OSError:
+        return 0
+    for name in names:
+        try:
+            size += os.path.getsize(os.path.join(entry, name))
+        except OSError:
+            pass
+    return size
+
+
+_default_cache = None
+
+
+def default_cache():
+    """The shared cache used by the viewers, or None if disabled with ``MEMRISTOR_CACHE=0``."""
+    global _default_cache
+    if os.environ.get("MEMRISTOR_CACHE", "1") == "0":
+        return None
+    if _default_cache is None:
+        _default_cache = SheetCache()
+    return _default_cache
@@ -0,0 +1,195 @@
+"""Converted IV datasets: the sweeps on disk, memory-mapped when opened.
+
+    python main.py convert --input data/ --out campaign.dataset
+
+reads the workbooks one at a time and appends their plotted channels to files
+in a folder while they are analysed, so a campaign never has to fit in memory.
+Opening the folder (``open_dataset``, or **Open Dataset** in the IV viewer) only
+reads the half-cycle and cycle tables and the density histogram; the points are
+memory-mapped and paged in for the half-cycles that are actually plotted. The
+envelopes of the decimated cumulative plot are built while converting too, so
+they are never computed over the whole dataset in memory.
+
+The folder holds:
+
+- ``<column>.bin``: the raw columns of the ``SweepStore``
+- ``halfcycles.npz``, ``cycles.npz``: the tables of the ``IVResult``
+- ``density.npz``: the ``DensityHistogram`` of all points
+- ``envelopes.npz``: the ``EnvelopePyramid`` of all half-cycles
+- ``meta.json``: version, channels and column lengths. It is written last, a
+  folder without it is a conversion that did not finish.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from memristor_core.batch import find_workbooks
+from memristor_core.density import DensityHistogram
+from memristor_core.iv import CYCLE_COLUMNS, IVResult, analyse_iv
+from memristor_core.lod import EnvelopePyramid
+from memristor_core.store import SweepStore, plot_dtype
+from memristor_core.workbook import Workbook
+
+DATASET_VERSION = 2
+_META_FILE = "meta.json"
+
+
+def is_dataset(directory):
+    return os.path.isfile(os.path.join(directory, _META_FILE))
+
+
+def prepare_directory(directory):
+    """Make ``directory`` ready for a new dataset: created if needed, an older dataset
+    in it is overwritten, any other file in it raises FileExistsError."""
+    os.makedirs(directory, exist_ok=True)
+    if is_dataset(directory):
+        os.remove(os.path.join(directory, _META_FILE))
+    elif os.listdir(directory):
+        raise FileExistsError(f"{directory} is not empty")
+
+
+def _save_table(path, table):
+    np.savez(path, **{column: table[column].to_numpy() for column in table.columns})
+
+
+def _load_table(path, index_name):
+    with np.load(path) as data:
+        columns = {column: data[column] for column in data.files}
+    length = len(next(iter(columns.values()))) if columns else 0
+    return pd.DataFrame(columns, index=pd.RangeIndex(length, name=index_name))
+
+
+def _save_density(path, density):
+    np.savez(path, counts=density.counts, origin=density.origin,
+             v_step=np.nan if density.v_step is None else density.v_step,
+             bins=np.array([density.v_bins, density.decade_bins]))
+
+
+def _load_density(path):
+    with np.load(path) as data:
+        density = DensityHistogram(*(int(bins) for bins in data["bins"]))
+        density.counts, density.origin = data["counts"], data["origin"]
+        density.v_step = None if np.isnan(data["v_step"]) else float(data["v_step"])
+    density.version = 1
+    return density
+
+
+def _envelopes(result, envelopes=None):
+    # The envelopes of all half-cycles of result, ``envelopes`` of its first ones extended
+    voltage_channel, current_channel = result.sweeps.channels
+    args = (result.sweeps[voltage_channel], result.sweeps[current_channel],
+            result.halfcycles.Start.to_numpy(), result.halfcycles.Stop.to_numpy())
+    if envelopes is None:
+        return EnvelopePyramid(*args)
+    envelopes.extend(*args)
+    return envelopes
+
+
+def save_dataset(directory, result, density, envelopes=None, sources=()):
+    """Finish the dataset whose sweeps were written to ``directory`` (``analyse_iv``
+    with that ``directory``): save the tables, the density, the envelopes (built
+    here if not given) and the meta file."""
+    if result.sweeps.directory != directory:
+        raise ValueError(f"The sweeps of this result are not stored in {directory}")
+    _save_table(os.path.join(directory, "halfcycles.npz"), result.halfcycles)
+    _save_table(os.path.join(directory, "cycles.npz"), result.cycles)
+    _save_density(os.path.join(directory, "density.npz"), density)
+    _envelopes(result, envelopes).save(os.path.join(directory, "envelopes.npz"))
+    meta = {"version": DATASET_VERSION, "store": result.sweeps.describe(), "sources": list(sources)}
+    with open(os.path.join(directory, _META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def open_dataset(directory):
+    """``(IVResult, DensityHistogram, EnvelopePyramid)`` of a converted dataset, the sweeps memory-mapped.
+    Raises ValueError if ``directory`` is not a (complete, current) dataset."""
+    try:
+        with open(os.path.join(directory, _META_FILE)) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"{directory} is not a converted dataset") from None
+    if meta.get("version") != DATASET_VERSION:
+        raise ValueError(f"{directory} was converted by another version, convert the files again")
+    store = SweepStore.open(directory, meta["store"])
+    result = IVResult(store, _load_table(os.path.join(directory, "halfcycles.npz"), "Halfcycle"),
+                      _load_table(os.path.join(directory, "cycles.npz"), "Cycle"))
+    voltage_channel, current_channel = store.channels
+    envelopes = EnvelopePyramid.load(os.path.join(directory, "envelopes.npz"), store[voltage_channel], store[current_channel],
+                                     result.halfcycles.Start.to_numpy(), result.halfcycles.Stop.to_numpy())
+    return result, _load_density(os.path.join(directory, "density.npz")), envelopes
+
+
+def convert(file_paths, directory, v_channel="Voltage", i_channel="Current", ignore_faulty=True, dtype=np.float64,
+            on_progress=None, is_canceled=None):
+    """Analyse the workbooks one after the other into a dataset in ``directory``.
+    Returns ``(IVResult, DensityHistogram, EnvelopePyramid)``, or None if nothing was usable or
+    ``is_canceled()`` returned True; the dataset is only complete in the first case.
+    ``on_progress(done, total)`` is called with file counts."""
+    prepare_directory(directory)
+    columns = (v_channel, i_channel, "TimeOutput") + CYCLE_COLUMNS
+    result = None
+    density = DensityHistogram()
+    envelopes = None
+    for done, file_path in enumerate(file_paths):
+        if is_canceled is not None and is_canceled():
+            return None
+        with Workbook(file_path, columns) as workbook:
+            sheets = [df for _, df in workbook]
+        offset = 0 if result is None else len(result.sweeps)
+        result = analyse_iv(sheets, v_channel, i_channel, ignore_faulty, previous=result, dtype=dtype, directory=directory)
+        if result is not None and len(result.sweeps) > offset:
+            density.add(result.sweeps[v_channel][offset:], result.sweeps[i_channel][offset:])
+            envelopes = _envelopes(result, envelopes)
+        if on_progress is not None:
+            on_progress(done + 1, len(file_paths))
+    if result is None:
+        return None
+    save_dataset(directory, result, density, envelopes, file_paths)
+    return result, density, envelopes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py convert", description="Convert IV workbooks into a memory-mapped dataset for the IV viewer.")
+    parser.add_argument("--input", required=True, nargs="+", help="Excel files and/or folders of Excel files, in measurement order")
+    parser.add_argument("--out", required=True, help="Folder of the dataset, created if needed")
+    parser.add_argument("--voltage", default="Voltage", help="Voltage channel")
+    parser.add_argument("--current", default="Current", help="Current channel")
+    parser.add_argument("--keep-faulty", action="store_true", help="Keep sheets where a set has no reset")
+    parser.add_argument("--float32", action="store_true", help="Store the plotted channels as float32")
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return e.code
+
+    file_paths = find_workbooks(args.input)
+    if not file_paths:
+        print("No Excel files found in " + ", ".join(args.input), file=sys.stderr)
+        return 1
+
+    def on_progress(done, total):
+        print(f"\r{done}/{total} files", end="", file=sys.stderr, flush=True)
+
+    try:
+        converted = convert(file_paths, args.out, args.voltage, args.current, not args.keep_faulty,
+                            np.float32 if args.float32 else plot_dtype(), on_progress)
+    except FileExistsError as e:
+        print(f"Can't write the dataset: {e}", file=sys.stderr)
+        return 2
+    except (KeyError, AttributeError, ValueError, OSError) as e:
+        print(f"\nConversion failed: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+    if converted is None:
+        print("None of the sheets could be used", file=sys.stderr)
+        return 1
+    result = converted[0]
+    print(f"{len(result.sweeps)} points, {len(result.halfcycles)} half-cycles written to {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
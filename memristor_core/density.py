@@ -0,0 +1,86 @@
+"""2D histogram of IV samples for the density view of long endurance runs.
+
+With 10^5 half-cycles and more, the loops on top of each other only show as a
+solid band. Counting the samples per (V, log10|I|) cell instead shows where the
+device spends its cycles, and the counts can be added up batch by batch while
+the files load.
+
+The cells have a fixed size: the voltage step is set from the first batch (a
+fraction of its span, but no less than the step between its samples), the current
+step is a fixed fraction of a decade. Cells lie on multiples of the step,
+so when later samples fall outside the grid it is only padded with empty cells,
+the counts already there stay valid.
+"""
+import numpy as np
+
+from memristor_core.profiling import timed
+
+# Voltage cells over the span of the first batch
+V_BINS = 512
+# Current cells per decade
+DECADE_BINS = 32
+# Samples binned at once, so the index arrays stay small for any amount of data
+CHUNK = 1_000_000
+
+
+class DensityHistogram:
+    """Sample counts of (``voltage``, log10 |``current``|) on a grid that grows with the data.
+    Samples with a NaN or zero current are left out, they are not on the log plot either."""
+
+    def __init__(self, v_bins=V_BINS, decade_bins=DECADE_BINS, chunk=CHUNK):
+        self.v_bins = v_bins
+        self.decade_bins = decade_bins
+        self.chunk = chunk
+        self.v_step = None
+        self.origin = np.zeros(2, dtype=np.int64)           # cell (column, row) of counts[0, 0]
+        self.counts = np.zeros((0, 0), dtype=np.int64)      # rows are current, columns voltage
+        self.version = 0                                    # bumped on every add, to know when to redraw
+
+    @timed("iv.density")
+    def add(self, voltage, current):
+        voltage = np.asarray(voltage, dtype=np.float64)
+        current = np.abs(np.asarray(current, dtype=np.float64))
+        keep = np.isfinite(voltage) & np.isfinite(current) & (current > 0)
+        voltage, current = voltage[keep], current[keep]
+        if len(voltage) == 0:
+            return
+        if self.v_step is None:
+            # No narrower than the usual step between samples, or the columns in between stay empty
+            steps = np.abs(np.diff(voltage))
+            steps = steps[steps > 0]
+            span = voltage.max() - voltage.min()
+            self.v_step = max(span / self.v_bins, np.median(steps) if len(steps) else 0)
+            if self.v_step <= 0:
+                self.v_step = 1.0
+        for begin in range(0, len(voltage), self.chunk):
+            self._add_chunk(voltage[begin:begin+self.chunk], current[begin:begin+self.chunk])
+        self.version += 1
+
+    def _add_chunk(self, voltage, current):
+        cells = np.empty((len(voltage), 2), dtype=np.int64)
+        cells[:, 0] = np.floor(voltage / self.v_step)
+        cells[:, 1] = np.floor(np.log10(current) * self.decade_bins)
+        self._grow(cells.min(axis=0), cells.max(axis=0))
+        cells -= self.origin
+        rows, columns = self.counts.shape
+        self.counts += np.bincount(cells[:, 1] * columns + cells[:, 0], minlength=rows * columns).reshape(rows, columns)
+
+    def _grow(self, low, high):
+        # Pad the grid with empty cells so that it reaches from cell low to cell high
+        if self.counts.size == 0:
+            self.origin = low
+            self.counts = np.zeros((high[1] - low[1] + 1, high[0] - low[0] + 1), dtype=np.int64)
+            return
+        end = self.origin + self.counts.shape[::-1]
+        before = np.maximum(self.origin - low, 0)
+        after = np.maximum(high + 1 - end, 0)
+        if before.any() or after.any():
+            self.counts = np.pad(self.counts, ((before[1], after[1]), (before[0], after[0])))
+            self.origin = self.origin - before
+
+    def edges(self):
+        """Cell edges as voltage and current (not log10) values, for pcolormesh."""
+        rows, columns = self.counts.shape
+        v_edges = (self.origin[0] + np.arange(columns + 1)) * self.v_step
+        i_edges = 10.0 ** ((self.origin[1] + np.arange(rows + 1)) / self.decade_bins)
+        return v_edges, i_edges
@@ -0,0 +1,33 @@
+"""Parallel reading of Clarius workbooks."""
+from memristor_core.parallel import report_step, report_total, run_ordered
+from memristor_core.workbook import Workbook
+
+
+def read_workbook(file_path, columns=None):
+    """Read all data sheets of one workbook as ``(sheet_name, DataFrame)`` pairs. Runs inside a pool worker."""
+    sheets = []
+    with Workbook(file_path, columns) as workbook:
+        report_total(len(workbook))
+        for sheet, df in workbook:
+            sheets.append((sheet, df))
+            report_step()
+    return sheets
+
+
+def load_workbooks(file_paths, columns=None, on_progress=None, is_canceled=None, processes=None):
+    """Read every data sheet of every file, one workbook per worker process.
+    ``columns`` limits parsing to the named columns, see ``Workbook``.
+
+    Returns the sheets as a flat list of DataFrames in file/sheet order, or None
+    if ``is_canceled()`` returned True before all files were read.
+    ``on_progress(done, total)`` is called with sheet counts.
+    """
+    sheets = []
+    n_read = 0
+    for file_sheets in run_ordered(read_workbook, [(path, columns) for path in file_paths], processes,
+                                   on_progress, is_canceled):
+        sheets.extend(df for _, df in file_sheets)
+        n_read += 1
+    if n_read != len(file_paths):
+        return None
+    return sheets
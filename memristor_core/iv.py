@@ -0,0 +1,442 @@
+"""IV sweep analysis.
+
+The switching voltage of a half-cycle is where the resistance changes fastest on
+the way out (|V| increasing): the last peak of d(log R) that reaches 70% of the
+highest one. All half-cycles are processed together as rows of 2D arrays
+instead of one pandas slice at a time.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from scipy.signal import find_peaks
+
+from memristor_core.profiling import stage, timed
+from memristor_core.store import GrowableArray, SweepStore
+
+# Points closer to 0 V than this are left out, they make the gradient unreliable
+V_MIN = 0.05
+# A peak of d(log R) is a switching candidate if it reaches this fraction of the highest peak
+PEAK_FRACTION = 0.7
+# Clarius columns with one value per cycle, NaN on the other rows
+CYCLE_COLUMNS = ("SetVoltage", "ResetVoltage", "SetResistance", "ResetResistance")
+
+
+def _gradient_rows(x, lengths):
+    # np.gradient along every row, each row only being valid up to its length
+    width = x.shape[1]
+    grad = np.full(x.shape, np.nan)
+    if width < 2:
+        return grad
+    grad[:, 1:-1] = (x[:, 2:] - x[:, :-2]) / 2.0
+    grad[:, 0] = x[:, 1] - x[:, 0]
+    rows = np.flatnonzero(lengths >= 2)
+    last = lengths[rows] - 1
+    grad[rows, last] = x[rows, last] - x[rows, last - 1]
+    grad[np.arange(width) >= lengths[:, None]] = np.nan
+    return grad
+
+
+def _peaks_rows(x, lengths):
+    # Local maxima of every row, same result as scipy.signal.find_peaks per row
+    peaks = np.zeros(x.shape, dtype=bool)
+    if x.shape[1] < 3:
+        return peaks
+    left, mid, right = x[:, :-2], x[:, 1:-1], x[:, 2:]
+    peaks[:, 1:-1] = (left < mid) & (mid > right)
+    # Flat peaks (equal neighbours) are rare, leave them to scipy
+    for row in np.flatnonzero(((left < mid) & (mid == right)).any(axis=1)):
+        peaks[row] = False
+        peaks[row, find_peaks(x[row, :lengths[row]])[0]] = True
+    return peaks
+
+
+def _switching_voltages_2d(voltage, current, time, lengths, polarity):
+    n, width = voltage.shape
+    rows = np.arange(n)
+    columns = np.arange(width)
+
+    # Take only the sweep out and not the sweep back, and get rid of the points around 0 V
+    grad = _gradient_rows(voltage, lengths)
+    if polarity > 0:
+        keep = (grad > 0) & (voltage > V_MIN)
+    else:
+        keep = (grad < 0) & (voltage < -V_MIN)
+
+    # Move the kept points to the front of their row, in their original order
+    order = np.argsort(~keep, axis=1, kind="stable")
+    counts = keep.sum(axis=1)
+    inside = columns < counts[:, None]
+    v = np.where(inside, np.take_along_axis(voltage, order, axis=1), np.nan)
+    i = np.where(inside, np.take_along_axis(current, order, axis=1), np.nan)
+    t = np.where(inside, np.take_along_axis(time, order, axis=1), np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_r = np.log(np.abs(v) / np.abs(i))
+    d_r = _gradient_rows(log_r, counts)
+    if polarity > 0:
+        d_r = -d_r  # Resistance drops during a set
+
+    peaks = _peaks_rows(d_r, counts)
+    highest = np.where(peaks, d_r, -np.inf).max(axis=1)
+    candidates = peaks & (d_r >= PEAK_FRACTION * highest[:, None])
+    found = candidates.any(axis=1)
+    last_peak = width - 1 - np.argmax(candidates[:, ::-1], axis=1)
+
+    # First point measured at the time of the last candidate peak
+    t_peak = t[rows, last_peak]
+    first = np.where(np.isnan(t_peak), last_peak, np.argmax(t == t_peak[:, None], axis=1))
+    result = v[rows, first]
+    last_point = v[rows, np.maximum(counts - 1, 0)]
+    result = np.where(np.abs(result) < V_MIN, last_point, result)
+
+    # No peak at all: fall back to the smallest voltage of the sweep
+    lowest = np.min(v, axis=1, where=inside, initial=np.inf)
+    result = np.where(found, result, lowest)
+    result[counts == 0] = np.nan
+    return result
+
+
+def switching_voltages(voltage, current, time, starts, lengths, polarity, batch_size=4096):
+    """Vset (``polarity`` > 0) or Vreset (``polarity`` < 0) of every half-cycle
+    ``voltage[start:start + length]`` of the concatenated channel arrays.
+
+    The half-cycles are stacked into NaN-padded 2D arrays ``batch_size`` rows at a
+    time, which keeps memory bounded for long endurance runs. Half-cycles without
+    any point beyond 0.05 V in the sweep direction give NaN.
+    """
+    voltage = np.asarray(voltage, dtype=np.float64)
+    current = np.asarray(current, dtype=np.float64)
+    time = np.asarray(time, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    result = np.full(len(starts), np.nan)
+
+    for begin in range(0, len(starts), batch_size):
+        batch_starts = starts[begin:begin + batch_size]
+        batch_lengths = lengths[begin:begin + batch_size]
+        columns = np.arange(batch_lengths.max())
+        inside = columns < batch_lengths[:, None]
+        index = np.where(inside, batch_starts[:, None] + columns, 0)
+        stacked = [np.where(inside, channel[index], np.nan) for channel in (voltage, current, time)]
+        result[begin:begin + batch_size] = _switching_voltages_2d(*stacked, batch_lengths, polarity)
+    return result
+
+
+@timed("iv.segment")
+def segment_halfcycles(voltage, sheet_starts=()):
+    """Split the concatenated voltage channel into half-cycles.
+
+    A half-cycle starts where the voltage returns to exactly 0 V (the first point
+    of a run of zeros) and at every index in ``sheet_starts``, so a sweep never runs
+    across two sheets and sheets with different point counts can be mixed. The
+    polarity (+1 set, -1 reset) is the sign of the largest excursion of the
+    half-cycle. Returns ``(starts, stops, polarity)`` arrays, ``voltage[start:stop]``
+    being one half-cycle.
+    """
+    voltage = np.asarray(voltage, dtype=np.float64)
+    n = len(voltage)
+    if n == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    is_zero = voltage == 0
+    boundary = is_zero.copy()
+    boundary[1:] &= ~is_zero[:-1]
+    boundary[0] = True
+    boundary[np.asarray(sheet_starts, dtype=np.int64)] = True
+    starts = np.flatnonzero(boundary)
+    stops = np.append(starts[1:], n)
+    highest = np.fmax.reduceat(voltage, starts)
+    lowest = np.fmin.reduceat(voltage, starts)
+    polarity = np.where(-lowest > highest, -1, 1)
+    return starts, stops, polarity
+
+
+@timed("iv.switching")
+def halfcycle_metrics(voltage, current, time, starts, stops, polarity):
+    """Table of the half-cycles ``voltage[start:stop]`` indexed by half-cycle number,
+    with their ``Start``, ``Stop``, ``Polarity`` (+1 set, -1 reset) and switching
+    voltage ``Vswitch``. ``polarity`` is one value per half-cycle or a single value
+    for all of them.
+
+    Everything a viewer shows per half-cycle is computed here once at load time, so
+    moving the slider only looks values up.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    polarity = np.where(np.broadcast_to(polarity, starts.shape) < 0, -1, 1)
+    vswitch = np.full(len(starts), np.nan)
+    for sign in (1, -1):
+        rows = polarity == sign
+        if rows.any():
+            vswitch[rows] = switching_voltages(voltage, current, time, starts[rows], stops[rows] - starts[rows], sign)
+    return pd.DataFrame({"Start": starts, "Stop": stops, "Polarity": polarity, "Vswitch": vswitch},
+                        index=pd.RangeIndex(len(starts), name="Halfcycle"))
+
+
+def _spread(values, gaps, length):
+    # ``values`` in order on the positions that are not gaps, NaN on the gaps
+    column = np.full(length, np.nan)
+    free = np.ones(length, dtype=bool)
+    free[gaps[gaps < length]] = False
+    slots = np.flatnonzero(free)[:len(values)]
+    column[slots] = values[:len(slots)]
+    return column
+
+
+def cycle_table(vset, vreset, rset, rreset, no_set, no_reset):
+    """Table of the full cycles indexed by cycle number, with columns ``Vset``,
+    ``Vreset``, ``Rset``, ``Rreset`` and the masks ``SetOK``/``ResetOK``.
+
+    ``vset``/``rset`` hold one value per cycle where the set happened, the cycles in
+    ``no_set`` (set voltage 0) being skipped, and the same goes for the reset
+    columns. The values are aligned on cycle number and the failed cycles are
+    marked in the masks, so every column can be filtered on cycles with both a set
+    and a reset with ``valid_values``.
+    """
+    vset, vreset, rset, rreset = (np.asarray(values, dtype=np.float64) for values in (vset, vreset, rset, rreset))
+    no_set = np.asarray(no_set, dtype=np.int64)
+    no_reset = np.asarray(no_reset, dtype=np.int64)
+    length = max(len(vset) + len(no_set), len(rset) + len(no_set),
+                 len(vreset) + len(no_reset), len(rreset) + len(no_reset))
+    cycles = np.arange(length)
+    return pd.DataFrame({"Vset": _spread(vset, no_set, length),
+                         "Vreset": _spread(vreset, no_reset, length),
+                         "Rset": _spread(rset, no_set, length),
+                         "Rreset": _spread(rreset, no_reset, length),
+                         "SetOK": ~np.isin(cycles, no_set),
+                         "ResetOK": ~np.isin(cycles, no_reset)},
+                        index=pd.RangeIndex(length, name="Cycle"))
+
+
+def valid_values(cycles, column):
+    """Values of ``column`` of a ``cycle_table`` for the cycles with both a set and a reset, NaN dropped."""
+    values = cycles[column].to_numpy()
+    return values[cycles.SetOK.to_numpy() & cycles.ResetOK.to_numpy() & ~np.isnan(values)]
+
+
+def valid_positions(cycles, column):
+    """Position (from 1) of every cycle among the ``valid_values`` of ``column``, 0 for the cycles left out."""
+    values = cycles[column].to_numpy()
+    valid = cycles.SetOK.to_numpy() & cycles.ResetOK.to_numpy() & ~np.isnan(values)
+    return np.where(valid, np.cumsum(valid), 0)
+
+
+def halfcycle_cycles(polarity, cycles):
+    """Cycle number (row of ``cycle_table``) of every half-cycle, -1 for the ones without a cycle.
+
+    The n-th set half-cycle is the set of the n-th cycle that has one, the same goes
+    for the resets, as in ``cycle_table``.
+    """
+    polarity = np.asarray(polarity)
+    result = np.full(len(polarity), -1, dtype=np.int64)
+    for sign, column in ((1, "SetOK"), (-1, "ResetOK")):
+        rows = np.flatnonzero(polarity == sign)
+        slots = np.flatnonzero(cycles[column].to_numpy())[:len(rows)]
+        result[rows[:len(slots)]] = slots
+    return result
+
+
+def plot_bounds(halfcycles, voltage, current, starts):
+    """Add the Vmin/Vmax/Imin/Imax columns to ``halfcycles``: bounds of the plotted
+    ``voltage`` and |``current``| of every half-cycle starting at ``starts``,
+    so the axis limits never need to go through the points."""
+    current = np.abs(current)
+    halfcycles["Vmin"] = np.fmin.reduceat(voltage, starts)
+    halfcycles["Vmax"] = np.fmax.reduceat(voltage, starts)
+    halfcycles["Imin"] = np.fmin.reduceat(np.where(current > 0, current, np.nan), starts)
+    halfcycles["Imax"] = np.fmax.reduceat(current, starts)
+    return halfcycles
+
+
+def usable_sheets(sweeps, ignore_faulty=True):
+    """Clarius IV sheets worth analysing: the ones starting with a voltage and, with
+    ``ignore_faulty``, where every set has its reset."""
+    # Filter the sweeps to remove those where the first value of the Voltage column is NaN
+    sweeps = [sweep for sweep in sweeps if not pd.isna(sweep.Voltage.iloc[0])]
+    if ignore_faulty:
+        sweeps = [sweep for sweep in sweeps if not sweep.ResetVoltage.notna().sum()!=sweep.SetVoltage.notna().sum()]
+    return sweeps
+
+
+def sweep_halfcycles(sweeps, offset, sheet_lengths, v_channel="Voltage", i_channel="Current"):
+    """Half-cycles of the sheets concatenated in ``sweeps`` from row ``offset`` on,
+    ``sheet_lengths`` rows each. Start/Stop are rows of ``sweeps``; Vswitch is the
+    Vset/Vreset of the half-cycle and the plot bounds are those of ``v_channel``/``i_channel``.
+
+    Raises KeyError if a Clarius column is missing.
+    """
+    voltage = sweeps.Voltage.to_numpy()[offset:]
+
+    # Start/stop of every new half-cycle and whether it is a set (positive) or reset (negative) sweep.
+    # Sweeps start at 0 V and never run across sheets, so files with different point counts can be mixed
+    starts, stops, polarity = segment_halfcycles(voltage, np.cumsum(sheet_lengths)[:-1])
+
+    # Vset/Vreset of every half-cycle
+    halfcycles = halfcycle_metrics(sweeps.Voltage, sweeps.Current, sweeps.TimeOutput, starts+offset, stops+offset, polarity)
+
+    # Bounds of every half-cycle on the main plot, for its axis limits
+    return plot_bounds(halfcycles, sweeps[v_channel].to_numpy()[offset:], sweeps[i_channel].to_numpy()[offset:], starts)
+
+
+def _settled_rows(count, gaps, known):
+    # Rows of a cycle_table column with ``count`` values that no later value or gap can change:
+    # up to the first free row without a value, within the ``known`` rows whose gaps are known
+    free = np.ones(known, dtype=bool)
+    free[gaps[gaps < known]] = False
+    free = np.flatnonzero(free)
+    return free[count] if count < len(free) else known
+
+
+@timed("iv.cycles")
+def sweep_cycles(sweeps, halfcycles, cycles=None, settled=(0, 0, 0, 0, 0)):
+    """``cycle_table`` of all the sheets in the ``SweepStore`` ``sweeps``, ``halfcycles``
+    being all of their half-cycles, and the ``halfcycle_cycles`` of these.
+
+    ``cycles`` is the table of the first of these sheets, if there is one, and
+    ``settled`` what no later sheet can change in it: (rows of the table, Rset and
+    Rreset values in them, first set and first reset half-cycle not in them). Only
+    the rest is worked out again. Returns (cycles, Cycle of every half-cycle,
+    ``settled`` for the next sheets)."""
+    ## Clarius writes Rset, Rreset and the set/reset voltage (0 where it didn't happen) of every cycle in their own columns.
+    ## Everything is aligned on cycle number, cycles where the set or reset didn't happen are masked out
+    rows, rset_used, rreset_used, first_set, first_reset = settled
+    polarity = halfcycles.Polarity.to_numpy()
+    vswitch = halfcycles.Vswitch.to_numpy()
+    set_rows = first_set + np.flatnonzero(polarity[first_set:] > 0)
+    reset_rows = first_reset + np.flatnonzero(polarity[first_reset:] < 0)
+    set_voltage = sweeps["SetVoltage"][rows:]
+    reset_voltage = sweeps["ResetVoltage"][rows:]
+    rset = sweeps["SetResistance"][rset_used:]
+    rreset = sweeps["ResetResistance"][rreset_used:]
+    no_set = np.flatnonzero(set_voltage == 0)
+    no_reset = np.flatnonzero(reset_voltage == 0)
+    table = cycle_table(vswitch[set_rows], vswitch[reset_rows], rset, rreset, no_set, no_reset)
+    table.index = pd.RangeIndex(rows, rows + len(table), name="Cycle")
+    if cycles is not None and rows:
+        table = pd.concat([cycles.iloc[:rows], table])
+
+    # Half-cycles of the settled rows keep their cycle, the others are matched to the new rows
+    cycle = np.full(len(halfcycles), -1, dtype=np.int64)
+    if "Cycle" in halfcycles:
+        cycle[:] = halfcycles.Cycle.fillna(-1).to_numpy()
+    for half_rows, column in ((set_rows, "SetOK"), (reset_rows, "ResetOK")):
+        slots = rows + np.flatnonzero(table[column].to_numpy()[rows:])[:len(half_rows)]
+        cycle[half_rows] = -1
+        cycle[half_rows[:len(slots)]] = slots
+
+    settled_rows = min(_settled_rows(len(set_rows), no_set, len(set_voltage)),
+                       _settled_rows(len(rset), no_set, len(set_voltage)),
+                       _settled_rows(len(reset_rows), no_reset, len(reset_voltage)),
+                       _settled_rows(len(rreset), no_reset, len(reset_voltage)))
+    sets = settled_rows - np.count_nonzero(no_set < settled_rows)
+    resets = settled_rows - np.count_nonzero(no_reset < settled_rows)
+    settled = (rows + settled_rows, rset_used + sets, rreset_used + resets,
+               set_rows[sets] if sets < len(set_rows) else len(halfcycles),
+               reset_rows[resets] if resets < len(reset_rows) else len(halfcycles))
+    return table, cycle, tuple(int(value) for value in settled)
+
+
+@timed("volatile.cycles")
+def volatile_cycles(sweeps, v_channel, i_channel):
+    """Vset (``Vswitch``) and plot bounds of volatile sweeps, one sheet per cycle going
+    up from 0 V and back. Also returns the plotted points (V, |I|) of all the sheets
+    as one (n, 2) array, Start/Stop being rows of it."""
+    lengths = np.array([len(df) for df in sweeps])
+    starts = np.cumsum(lengths) - lengths
+    columns = [np.concatenate([np.empty(0)] + [df[column].to_numpy() for df in sweeps])
+               for column in (v_channel, i_channel, "Time")]
+    cycles = halfcycle_metrics(*columns, starts, starts+lengths, polarity=1)
+
+    # Bounds of every cycle on the plot, for the axis limits
+    voltage, current = columns[0].astype(float), np.abs(columns[1].astype(float))
+    plot_bounds(cycles, voltage, current, starts)
+    # Plotted points (V, |I|) of all cycles, the frames and the overlay are slices of it
+    return cycles, np.column_stack([voltage, current])
+
+
+@dataclass
+class IVResult:
+    """IV sweeps analysed so far: the plotted channels of all of them in ``sweeps``
+    (a ``SweepStore``), their ``halfcycles`` (``halfcycle_metrics`` plus the plot
+    bounds and the ``Cycle`` of each one) and the ``cycles`` table. ``settled`` is the
+    part of the tables that sheets added later leave as it is (see ``sweep_cycles``),
+    all of it is worked out again when it is left out."""
+    sweeps: SweepStore
+    halfcycles: pd.DataFrame
+    cycles: pd.DataFrame
+    settled: tuple = (0, 0, 0, 0, 0)
+
+    def valid(self, column):
+        return valid_values(self.cycles, column)
+
+    def mean(self, column):
+        """Average of ``column`` over the cycles with both a set and a reset."""
+        return np.mean(self.valid(column))
+
+    @property
+    def total_cycles(self):
+        return len(self.halfcycles) / 2
+
+
+@timed("iv.analyse")
+def analyse_iv(sweeps, v_channel="Voltage", i_channel="Current", ignore_faulty=True, previous=None, dtype=np.float64, directory=None):
+    """Analyse the Clarius IV sheets ``sweeps`` (DataFrames), after the ones of the
+    ``previous`` result if given. Returns ``previous`` itself when none of the sheets
+    is usable. Raises KeyError if a Clarius column is missing.
+
+    Only the new sheets are concatenated and analysed (in float64); the result keeps
+    ``v_channel``/``i_channel`` as ``dtype`` and the per-cycle columns, in files in
+    ``directory`` if given (see ``memristor_core.dataset``), otherwise in memory."""
+    sweeps = usable_sheets(sweeps, ignore_faulty)
+    if len(sweeps) == 0:
+        return previous
+    sheet_lengths = np.array([len(sweep) for sweep in sweeps])
+    with stage("iv.concat"):
+        batch = pd.concat(sweeps, ignore_index=True)
+
+    halfcycles = sweep_halfcycles(batch, 0, sheet_lengths, v_channel, i_channel)
+    store = SweepStore((v_channel, i_channel), CYCLE_COLUMNS, dtype, directory) if previous is None else previous.sweeps
+    store = store.extend(batch, sheet_lengths, halfcycles.Start.to_numpy())
+    if previous is not None:
+        halfcycles[["Start", "Stop"]] += len(previous.sweeps)
+        halfcycles = pd.concat([previous.halfcycles, halfcycles], ignore_index=True).rename_axis("Halfcycle")
+    if previous is None:
+        cycles, halfcycles["Cycle"], settled = sweep_cycles(store, halfcycles)
+    else:
+        cycles, halfcycles["Cycle"], settled = sweep_cycles(store, halfcycles, previous.cycles, previous.settled)
+    return IVResult(store, halfcycles, cycles, settled)
+
+
+@dataclass
+class VolatileResult:
+    """Volatile cycles analysed so far: ``cycles`` as returned by ``volatile_cycles``
+    and the plotted ``points`` (V, |I|) of all of them, Start/Stop being rows of it.
+    ``points`` is a read-only view of ``buffer``, which the next sheets are appended
+    to in place."""
+    cycles: pd.DataFrame
+    points: np.ndarray
+    buffer: GrowableArray = field(default=None, repr=False)
+
+    @property
+    def vset(self):
+        return self.cycles.Vswitch.to_numpy()
+
+
+@timed("volatile.analyse")
+def analyse_volatile(sweeps, v_channel, i_channel, previous=None):
+    """Analyse the volatile sheets ``sweeps`` (one cycle each), after the ones of the
+    ``previous`` result if given. Empty sheets are left out."""
+    sweeps = [df for df in sweeps if not df.empty]
+    if len(sweeps) == 0:
+        return previous
+    cycles, points = volatile_cycles(sweeps, v_channel, i_channel)
+    if previous is None:
+        buffer = GrowableArray(points.dtype, points)
+    else:
+        cycles[["Start", "Stop"]] += len(previous.points)
+        cycles = pd.concat([previous.cycles, cycles], ignore_index=True).rename_axis("Halfcycle")
+        # Only the new points are copied, not the ones loaded before
+        buffer = previous.buffer if previous.buffer is not None else GrowableArray(previous.points.dtype, previous.points)
+        buffer = buffer.extended(len(previous.points), points)
+    return VolatileResult(cycles, buffer.view(), buffer)
@@ -0,0 +1,210 @@
+"""Level-of-detail rendering of the cumulative IV plot.
+
+Past a few ten thousand points, drawing every half-cycle as one line costs more
+than it shows: the loops lie on top of each other. Instead the plot shows, for
+every voltage column of about one pixel, the lowest and the highest current the
+half-cycles reach there, separately on the way out (|V| increasing) and on the way
+back, so the set and reset branches of a loop do not fill the hysteresis between
+them. Each column is drawn as a vertical stroke from min to max, 2 points per column.
+
+The envelopes are kept at ``FINE_BINS`` voltage bins, accumulated over the first
+``BLOCK``, 2 * ``BLOCK``, ... half-cycles, so the envelope of the first n
+half-cycles is one stored prefix plus fewer than ``BLOCK`` half-cycles. With more
+than ``MAX_PREFIXES`` blocks the blocks are made longer, so the envelopes take at
+most a few ten MB however many points there are. Coarser
+resolutions are made by merging neighbouring bins, as many as needed for the bins
+to be about a pixel wide at the current zoom.
+"""
+import numpy as np
+
+from memristor_core.profiling import timed
+
+# Cumulative plots with more points than this are drawn from the envelopes
+MAX_EXACT_POINTS = 50_000
+# Voltage bins of the finest level, enough for a few times zooming in on a full-screen plot
+FINE_BINS = 4096
+# Half-cycles per stored prefix
+BLOCK = 64
+# Prefixes kept at most, past that the blocks are made twice as long. Each takes 2 * 2 * FINE_BINS float32
+MAX_PREFIXES = 512
+# Points read from the data at a time while folding half-cycles into the envelopes
+CHUNK = 1 << 20
+
+OUT, BACK = 0, 1
+
+
+class EnvelopePyramid:
+    """Envelopes of |``current``| against ``voltage`` (the plotted values of the
+    concatenated half-cycles ``[start, stop)``). NaN points are left out.
+
+    Only the prefix envelopes are kept, the points are read from ``voltage`` and
+    ``current`` when needed, ``CHUNK`` points at a time. ``extend`` adds the
+    half-cycles appended to the same data since."""
+
+    @timed("iv.envelopes")
+    def __init__(self, voltage, current, starts, stops, bins=FINE_BINS, block=BLOCK):
+        self.bins = bins
+        self._base_block = block
+        self._build(voltage, current, starts, stops)
+
+    def _build(self, voltage, current, starts, stops):
+        self._voltage, self._current = voltage, current
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+        self.block = self._base_block
+        end = self.stops[-1] if len(self.stops) else 0
+        self.low, self.high = self._range(0, end)
+        if not np.isfinite(self.low):
+            self.low, self.high = 0.0, 1.0
+        if self.high <= self.low:
+            self.high = self.low + 1.0
+        self.bin_width = (self.high - self.low) / self.bins
+        # Envelope of the first 0, block, 2 * block, ... half-cycles
+        self._lowest = [np.full(2 * self.bins, np.inf, dtype=np.float32)]
+        self._highest = [np.full(2 * self.bins, -np.inf, dtype=np.float32)]
+        self._add_blocks()
+
+    @property
+    def count(self):
+        """Half-cycles in the envelopes."""
+        return len(self.starts)
+
+    @timed("iv.envelopes.extend")
+    def extend(self, voltage, current, starts, stops):
+        """Add the half-cycles after the first ``count`` of ``starts``, ``stops``, the same
+        data with more half-cycles at the end. Only the new points are read, unless
+        they reach out of the voltage range of the bins, then everything is rebuilt."""
+        if len(starts) <= self.count:
+            return
+        begin = self.stops[-1] if self.count else 0
+        low, high = self._range(begin, np.asarray(stops)[-1], voltage, current)
+        if low < self.low or high > self.high:
+            self._build(voltage, current, starts, stops)
+            return
+        self._voltage, self._current = voltage, current
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+        self._add_blocks()
+
+    def _range(self, begin, end, voltage=None, current=None):
+        # Lowest and highest finite voltage of the points [begin, end), NaN if there are none
+        voltage = self._voltage if voltage is None else voltage
+        current = self._current if current is None else current
+        low, high = np.inf, -np.inf
+        for first in range(begin, end, CHUNK):
+            last = min(first + CHUNK, end)
+            v = np.asarray(voltage[first:last], dtype=np.float64)
+            finite = np.isfinite(v) & np.isfinite(np.asarray(current[first:last], dtype=np.float64))
+            if finite.any():
+                low, high = min(low, v[finite].min()), max(high, v[finite].max())
+        return (low, high) if low <= high else (np.nan, np.nan)
+
+    def _add_blocks(self):
+        # Prefix envelopes of the whole blocks not stored yet, one block at a time
+        while len(self._lowest) * self.block <= self.count:
+            b = len(self._lowest) - 1
+            lowest, highest = self._lowest[-1].copy(), self._highest[-1].copy()
+            self._add(lowest, highest, b * self.block, (b + 1) * self.block)
+            self._lowest.append(lowest)
+            self._highest.append(highest)
+            if len(self._lowest) > MAX_PREFIXES + 1:
+                # Every second prefix is the prefix of blocks twice as long
+                self.block *= 2
+                self._lowest, self._highest = self._lowest[::2], self._highest[::2]
+
+    def save(self, path):
+        """Write the envelopes to the .npz file ``path``, see ``load``."""
+        np.savez(path, lowest=np.stack(self._lowest), highest=np.stack(self._highest),
+                 range=np.array([self.low, self.high]), shape=np.array([self.bins, self._base_block, self.block, self.count]))
+
+    @classmethod
+    def load(cls, path, voltage, current, starts, stops):
+        """The pyramid saved to ``path`` of the same data. Raises ValueError if it was
+        saved for another number of half-cycles."""
+        pyramid = cls.__new__(cls)
+        with np.load(path) as data:
+            pyramid.bins, pyramid._base_block, pyramid.block, count = (int(value) for value in data["shape"])
+            pyramid.low, pyramid.high = (float(value) for value in data["range"])
+            pyramid._lowest, pyramid._highest = list(data["lowest"]), list(data["highest"])
+        if count != len(starts) or len(pyramid._lowest) != count // pyramid.block + 1:
+            raise ValueError(f"{path} does not match the half-cycles")
+        pyramid.bin_width = (pyramid.high - pyramid.low) / pyramid.bins
+        pyramid._voltage, pyramid._current = voltage, current
+        pyramid.starts = np.asarray(starts, dtype=np.int64)
+        pyramid.stops = np.asarray(stops, dtype=np.int64)
+        return pyramid
+
+    def _add(self, lowest, highest, first, last):
+        # Fold the half-cycles [first, last) into the flat envelopes
+        if last <= first:
+            return
+        begin, end = self.starts[first], self.stops[last - 1]
+        starts = self.starts[first:last]
+        for chunk in range(begin, end, CHUNK):
+            chunk_end = min(chunk + CHUNK, end)
+            # One point before the chunk to tell whether its first point goes out or back
+            before = 1 if chunk > begin else 0
+            voltage = np.asarray(self._voltage[chunk - before:chunk_end], dtype=np.float64)
+            current = np.abs(np.asarray(self._current[chunk:chunk_end], dtype=np.float64))
+            # Out or back: |V| did not decrease since the previous point of the half-cycle
+            magnitude = np.abs(voltage)
+            out = np.ones(len(voltage), dtype=bool)
+            out[1:] = magnitude[1:] >= magnitude[:-1]
+            out = out[before:]
+            voltage = voltage[before:]
+            out[starts[(starts >= chunk) & (starts < chunk_end)] - chunk] = True
+            finite = np.isfinite(voltage) & np.isfinite(current)
+            column = np.clip(((voltage[finite] - self.low) / self.bin_width).astype(np.int64), 0, self.bins - 1)
+            key = np.where(out[finite], OUT, BACK) * self.bins + column
+            value = current[finite].astype(np.float32)
+            np.minimum.at(lowest, key, value)
+            np.maximum.at(highest, key, value)
+
+    def envelope(self, count, factor=1):
+        """(lowest, highest) of the first ``count`` half-cycles, arrays of shape
+        (2, bins // factor) for the out and back branches, NaN where no point falls."""
+        b = min(count // self.block, len(self._lowest) - 1)
+        lowest = self._lowest[b].astype(np.float64)
+        highest = self._highest[b].astype(np.float64)
+        self._add(lowest, highest, b * self.block, count)
+        lowest = lowest.reshape(2, -1, factor).min(axis=2)
+        highest = highest.reshape(2, -1, factor).max(axis=2)
+        empty = np.isinf(lowest)
+        lowest[empty] = np.nan
+        highest[empty] = np.nan
+        return lowest, highest
+
+    def factor(self, x_range, width_px):
+        """Bins merged together so that a bin is at most a pixel wide when ``x_range`` spans ``width_px`` pixels."""
+        span = x_range[1] - x_range[0]
+        if not np.isfinite(span) or span <= 0 or width_px <= 0:
+            return 1
+        bin_px = self.bin_width / span * width_px
+        factor = 1
+        while factor * 2 <= self.bins and factor * 2 * bin_px <= 1:
+            factor *= 2
+        return factor
+
+    def line(self, count, x_range, width_px):
+        """x, y of a single line drawing the envelopes of the first ``count`` half-cycles
+        over ``x_range``, about 2 points per pixel. Branches and empty columns are split by NaN."""
+        factor = self.factor(x_range, width_px)
+        lowest, highest = self.envelope(count, factor)
+        width = self.bin_width * factor
+        centers = self.low + (np.arange(lowest.shape[1]) + 0.5) * width
+        # Columns in view, one more on each side so the strokes reach the edges
+        first = max(int(np.floor((x_range[0] - self.low) / width)) - 1, 0)
+        last = min(int(np.ceil((x_range[1] - self.low) / width)) + 1, lowest.shape[1])
+        if last <= first:
+            return np.empty(0), np.empty(0)
+        x = np.repeat(centers[first:last], 2)
+        parts_x, parts_y = [], []
+        for branch in (OUT, BACK):
+            y = np.empty(2 * (last - first))
+            # min-max, max-min, ... so consecutive columns are joined along the edges of the band
+            y[0::2] = lowest[branch, first:last]
+            y[1::2] = highest[branch, first:last]
+            y[2::4], y[3::4] = y[3::4].copy(), y[2::4].copy()
+            parts_x += [x, [np.nan]]
+            parts_y += [y, [np.nan]]
+        return np.concatenate(parts_x[:-1]), np.concatenate(parts_y[:-1])
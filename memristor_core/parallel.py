@@ -0,0 +1,151 @@
+"""Process-pool runner used for the slow, embarrassingly parallel jobs
+(reading workbooks, exporting plots).
+
+Results are handed back in the order the tasks were submitted. Progress and
+cancellation are polled from the calling thread, so a Qt slot can drive a
+QProgressDialog while the workers run.
+"""
+import multiprocessing
+import os
+import queue
+
+
+class Cancelled(Exception):
+    """Raised inside an inline task when the caller asked to stop."""
+
+
+# Set in every worker process (or temporarily for inline runs)
+_progress_queue = None
+_progress_hook = None
+_task_index = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _run_task(func, index, args):
+    global _task_index
+    _task_index = index
+    try:
+        return func(*args)
+    finally:
+        _progress_queue.put((index, "done", 0))
+        _task_index = None
+
+
+def _report(kind, value):
+    if _progress_hook is not None:
+        _progress_hook(kind, value)
+    elif _progress_queue is not None:
+        _progress_queue.put((_task_index, kind, value))
+
+
+def report_total(steps):
+    """Tell the caller how many progress steps the running task will take."""
+    _report("total", steps)
+
+
+def report_step(steps=1):
+    """Advance the running task's progress by ``steps``."""
+    _report("step", steps)
+
+
+class _Progress:
+    # Every task counts as one step until it reports its own total
+    def __init__(self, n_tasks, callback):
+        self.totals = [1] * n_tasks
+        self.done = [0] * n_tasks
+        self.callback = callback
+        self.last = None
+
+    def update(self, index, kind, value):
+        if kind == "total":
+            self.totals[index] = value
+        elif kind == "step":
+            self.done[index] = min(self.done[index] + value, self.totals[index])
+        else:
+            self.done[index] = self.totals[index]
+
+    def drain(self, progress_queue):
+        while True:
+            try:
+                self.update(*progress_queue.get_nowait())
+            except queue.Empty:
+                break
+        self.emit()
+
+    def emit(self):
+        state = (sum(self.done), sum(self.totals))
+        if self.callback is not None and state != self.last:
+            self.last = state
+            self.callback(*state)
+
+
+def _run_inline(func, arg_list, tracker, is_canceled):
+    global _progress_hook
+
+    def hook(kind, value):
+        tracker.update(index, kind, value)
+        tracker.emit()
+        if is_canceled is not None and is_canceled():
+            raise Cancelled()
+
+    for index, args in enumerate(arg_list):
+        if is_canceled is not None and is_canceled():
+            return
+        _progress_hook = hook
+        try:
+            result = func(*args)
+        except Cancelled:
+            return
+        finally:
+            _progress_hook = None
+        tracker.update(index, "done", 0)
+        tracker.emit()
+        yield result
+
+
+def run_ordered(func, arg_list, processes=None, on_progress=None, is_canceled=None, poll_interval=0.05):
+    """Run ``func(*args)`` for every entry of ``arg_list`` in a process pool.
+
+    This is a generator yielding the results in submission order. ``on_progress(done, total)``
+    is called whenever the workers report progress and ``is_canceled()`` is polled every
+    ``poll_interval`` seconds; when it returns True the pool is terminated and the generator
+    stops early. Closing the generator terminates the workers as well.
+
+    ``func`` must be a module level function so that it can be sent to the workers.
+    """
+    arg_list = list(arg_list)
+    if not arg_list:
+        return
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(arg_list)))
+    tracker = _Progress(len(arg_list), on_progress)
+
+    if processes == 1:
+        # A pool would only add start-up time
+        yield from _run_inline(func, arg_list, tracker, is_canceled)
+        return
+
+    # spawn, not fork: forking a process that runs Qt threads is not safe
+    context = multiprocessing.get_context("spawn")
+    progress_queue = context.Queue()
+    pool = context.Pool(processes, initializer=_init_worker, initargs=(progress_queue,))
+    try:
+        pending = [pool.apply_async(_run_task, (func, index, args)) for index, args in enumerate(arg_list)]
+        for result in pending:
+            while not result.ready():
+                tracker.drain(progress_queue)
+                if is_canceled is not None and is_canceled():
+                    return
+                result.wait(poll_interval)
+            tracker.drain(progress_queue)
+            yield result.get()
+    finally:
+        pool.terminate()
+        pool.join()
+        progress_queue.close()
+        progress_queue.cancel_join_thread()
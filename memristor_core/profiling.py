@@ -0,0 +1,210 @@
+"""Timing and memory of the hot paths, off unless asked for.
+
+Stages are marked with the ``timed`` decorator or the ``stage`` context manager::
+
+    @timed("iv.segment")
+    def segment_halfcycles(...):
+
+    with stage("loader.workbook"):
+        ...
+
+While recording is off both only check a flag, so they can stay in the code for
+good. ``enable()`` (or ``MEMRISTOR_PROFILE=1`` in the environment, ``=memory``
+to also track memory) starts recording, for every stage name, the number of
+calls, the wall time and the peak memory allocated while it ran (with
+tracemalloc, which makes everything slower while it is on). Each call is also
+kept as an event for ``write_chrome_trace``, which can be opened in
+chrome://tracing or https://ui.perfetto.dev.
+
+tracemalloc has a single peak for the whole process, so memory is only recorded
+for the stages that run on the main thread; the stages of worker threads get
+their times only, and allocations made by worker threads while a main-thread
+stage runs count towards its peak. Before Python 3.9 the peak can't be reset
+and a stage records how much more memory is allocated at its end than at its
+start instead.
+
+Only the stages of this process are recorded, not those of the worker processes
+that read several workbooks at once.
+"""
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+# Calls kept for the trace, the oldest are dropped first
+MAX_EVENTS = 100_000
+# tracemalloc.reset_peak is new in Python 3.9
+_RESET_PEAK = hasattr(tracemalloc, "reset_peak")
+
+_enabled = False
+_memory = False
+_lock = threading.Lock()
+_stats = {}                             # name: [calls, total seconds, longest call, peak bytes or None]
+_events = deque(maxlen=MAX_EVENTS)      # (name, start, duration, thread id, peak bytes or None)
+_local = threading.local()              # stack of the stages running in this thread
+_origin = time.perf_counter()
+
+
+class _Stage:
+    __slots__ = ("name", "start", "base", "peak")
+
+    def __init__(self, name):
+        self.name = name
+        self.base = None
+
+    def __enter__(self):
+        if _memory and threading.current_thread() is threading.main_thread():
+            current, peak = _traced()
+            stack = _stack()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            if _RESET_PEAK:
+                tracemalloc.reset_peak()
+            self.base = self.peak = current
+            stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        peak = None
+        if _memory and self.base is not None:
+            self.peak = max(self.peak, _traced()[1])
+            peak = self.peak - self.base
+            stack = _stack()
+            if stack and stack[-1] is self:
+                stack.pop()
+                if stack:
+                    stack[-1].peak = max(stack[-1].peak, self.peak)
+        _record(self.name, self.start, duration, peak)
+        return False
+
+
+class _Off:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_OFF = _Off()
+
+
+def _traced():
+    # (current, peak) bytes, the peak since the last reset or, without reset_peak, the current ones
+    current, peak = tracemalloc.get_traced_memory()
+    return current, peak if _RESET_PEAK else current
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _record(name, start, duration, peak):
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            _stats[name] = [1, duration, duration, peak]
+        else:
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] = max(entry[2], duration)
+            if peak is not None:
+                entry[3] = peak if entry[3] is None else max(entry[3], peak)
+        _events.append((name, start, duration, threading.get_ident(), peak))
+
+
+def stage(name):
+    """Context manager recording the time (and memory) of the code inside it as ``name``."""
+    return _Stage(name) if _enabled else _OFF
+
+
+def timed(name=None):
+    """Decorator recording every call of the function as a ``stage``, named after the
+    function (``Class.method``) unless ``name`` is given."""
+    def decorate(function):
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Stage(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enabled():
+    return _enabled
+
+
+def memory_enabled():
+    return _memory
+
+
+def enable(memory=False):
+    """Start recording, with the peak memory of every stage if ``memory``."""
+    global _enabled, _memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not memory and _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = memory
+    _enabled = True
+
+
+def disable():
+    global _enabled, _memory
+    _enabled = False
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = False
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _events.clear()
+
+
+def report():
+    """``{name: {"calls", "total", "mean", "max", "peak_bytes"}}`` (times in seconds), longest total first.
+    ``peak_bytes`` is None for the stages whose memory was not recorded."""
+    with _lock:
+        items = [(name, list(entry)) for name, entry in _stats.items()]
+    items.sort(key=lambda item: item[1][1], reverse=True)
+    return {name: {"calls": calls, "total": total, "mean": total / calls, "max": longest,
+                   "peak_bytes": peak}
+            for name, (calls, total, longest, peak) in items}
+
+
+def write_json(path):
+    with open(path, "w") as f:
+        json.dump({"memory": _memory, "stages": report()}, f, indent=2)
+
+
+def write_chrome_trace(path):
+    """Write the recorded calls in the Trace Event format (complete events, microseconds)."""
+    with _lock:
+        events = list(_events)
+    pid = os.getpid()
+    trace = [{"name": name, "ph": "X", "ts": (start - _origin) * 1e6, "dur": duration * 1e6,
+              "pid": pid, "tid": thread, "args": {} if peak is None else {"peak_bytes": peak}}
+             for name, start, duration, thread, peak in events]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+_setting = os.environ.get("MEMRISTOR_PROFILE", "0")
+if _setting not in ("", "0"):
+    enable(memory=_setting == "memory")
@@ -0,0 +1,184 @@
+"""Pulse measurement metrics and plots drawn without a window.
+
+``analyse_pulse`` extracts the on/off state of one sheet (current, resistance
+and the time it is reached) with ``pulse_on`` and ``pulse_off``; PulsesViewer and
+the batch mode both call it.
+
+``save_pulse_plot`` draws one sheet the way PulsesViewer shows it (voltage on the
+left axis, |current| on the right one) on a figure of its own with the Agg
+renderer, so "Save All Plots" can hand the sheets to a pool of worker processes
+and the plot on screen is never touched.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import AutoMinorLocator, ScalarFormatter
+from scipy.signal import find_peaks
+
+from memristor_core.profiling import timed
+
+
+def time_channel(columns):
+    """Time column of a pulse sheet: "Time" when it has one, "TimeOutput" otherwise."""
+    return "Time" if "Time" in columns else "TimeOutput"
+
+
+def pulse_channels(df, v_channel, i_channel, time_channel):
+    """Voltage, current and time of a sheet the way the metrics use them, new Series:
+    interpolated over missing points, the current as |I| unless it is "Imeas" (which
+    is only made positive with a "Time" channel). ``df`` is left as it is."""
+    current = df[i_channel]
+    if time_channel == "Time":
+        current = abs(current)
+    current = current.interpolate(method='linear')
+    #In some measurement profiles the current is inverted and in some not, check for that here
+    if i_channel != "Imeas":
+        current = abs(current)
+    return df[v_channel].interpolate(method='linear'), current, df[time_channel]
+
+
+def _high_peaks(voltage):
+    # All peaks of the voltage and those of the pulses, None without a clear pulse
+    peaks,_ = find_peaks(voltage)
+    #height_threshold = np.percentile(df[VChannel][peaks], 80)
+    height_threshold = 0.9*max(voltage)
+    high_peaks = peaks[voltage[peaks] > height_threshold]
+    if len(high_peaks)<2 or (high_peaks[1]-high_peaks[0] > 20):
+        return None
+    return peaks, high_peaks
+
+
+def pulse_on(voltage, current, time):
+    """
+    Calculate Ion as the average current in the second half of the voltage pulse.
+    (Ion, Ron, ton) from the channels of ``pulse_channels``, None without a clear pulse.
+    """
+    found = _high_peaks(voltage)
+    if found is None:
+        return None
+    _, high_peaks = found
+
+    pulse_current = current[high_peaks[0]:high_peaks[-1]]
+    pulse_voltage = voltage[high_peaks[0]:high_peaks[-1]]
+    pulse_time = time[high_peaks[0]:high_peaks[-1]]
+    Ion_interval = pulse_current[(len(pulse_current)//2):]
+    Von_interval = pulse_voltage[(len(pulse_voltage)//2):]
+    Ion_avg = np.mean(Ion_interval)
+    Von_avg = np.mean(Von_interval)
+    Ron = abs(Von_avg/Ion_avg)
+
+    # Find 90% of Ion_avg
+    target_current = 0.9 * Ion_avg
+
+    # Locate the first time the current exceeds the target
+    idx_90 = np.where(pulse_current >= target_current)[0][0]  # Index in the second-half array
+    time_90 = pulse_time.iloc[idx_90]  # Corresponding time
+
+    # Average current in the second half
+    return Ion_avg, Ron, time_90
+
+
+def pulse_off(voltage, current, time, ion):
+    """(Ioff, Roff, toff) from the channels of ``pulse_channels`` and the Ion of the
+    sheet, None without a clear pulse."""
+    found = _high_peaks(voltage)
+    if found is None:
+        return None
+    peaks, high_peaks = found
+    idx_left = peaks[np.where(peaks==high_peaks[-1])[0]+1][0]
+
+    off_current = current[idx_left:peaks[-1]]
+    off_voltage = voltage[idx_left:peaks[-1]]
+    Ioff_interval = off_current[(len(off_current)//2):]
+    Ioff_avg = np.mean(Ioff_interval)
+    Voff_avg = np.mean(off_voltage[(len(off_voltage)//2):])
+    Roff = abs(Voff_avg/Ioff_avg)
+    Ioff_delta = (0.1 * (ion - Ioff_avg)) + Ioff_avg
+    idx_10 = np.where(current[len(current)//2:] <= Ioff_delta)[0][0]  # Index in the second-half array
+    time_10 = time.iloc[idx_10 + (len(current)//2)-1]
+
+    return Ioff_avg, Roff, time_10
+
+
+def pulse_metrics(df, v_channel, i_channel, time_channel):
+    """(Ion, Ron, ton) and (Ioff, Roff, toff) of one sheet, None for a state without
+    a clear pulse. ``df`` is not changed."""
+    voltage, current, time = pulse_channels(df, v_channel, i_channel, time_channel)
+    on = pulse_on(voltage, current, time)
+    off = None if on is None else pulse_off(voltage, current, time, on[0])
+    return on, off
+
+
+@dataclass
+class PulseResult:
+    """On/off state of one pulse sheet, None for the values that were not found."""
+    Ion: float = None
+    Ron: float = None
+    ton: float = None
+    Ioff: float = None
+    Roff: float = None
+    toff: float = None
+
+
+@timed("pulses.analyse")
+def analyse_pulse(df, v_channel, i_channel, time_channel):
+    """``PulseResult`` of one sheet, ``df`` is not changed."""
+    on, off = pulse_metrics(df, v_channel, i_channel, time_channel)
+    return PulseResult(*(on or (None,) * 3), *(off or (None,) * 3))
+
+
+# Figure of the last style drawn in this process and its lines, reused for the next sheets
+_figure = None
+
+
+def _pulse_figure(labels, colors, grid, size):
+    figure = Figure(figsize=size)
+    FigureCanvasAgg(figure)
+    ax1 = figure.add_subplot()
+
+    # Left axis for Voltage Channel
+    ax1.set_xlabel(r'$\it{Time}\ (s)$')
+    ax1.xaxis.set_minor_locator(AutoMinorLocator())
+    ax1.yaxis.set_minor_locator(AutoMinorLocator())
+    ax1.yaxis.set_major_formatter(ScalarFormatter())
+    ax1.set_ylabel(r'$\it{V}\ (V)$', color=colors[0])
+    voltage_line, = ax1.plot([], [], linewidth=1.5, color=colors[0], label=labels[0])
+    ax1.tick_params(axis='y', labelcolor=colors[0])
+    if grid:
+        ax1.grid(True, which='both', linestyle='--', linewidth=0.5)
+
+    # Right axis for Current Channel
+    ax2 = ax1.twinx()
+    ax2.grid(False)
+    ax2.yaxis.set_major_formatter(ScalarFormatter())
+    ax2.set_ylabel(r'$\it{I}\ (A)$', color=colors[1])
+    current_line, = ax2.plot([], [], linewidth=1.5, color=colors[1], label=labels[1])
+    ax2.tick_params(axis='y', labelcolor=colors[1])
+
+    ax1.legend([voltage_line, current_line], labels, loc='upper right')
+    return figure, voltage_line, current_line
+
+
+@timed("pulses.save_plot")
+def save_pulse_plot(save_path, time, voltage, current, labels, colors, grid=False, size=(14, 6), dpi=300):
+    """Save the plot of one sheet as ``save_path``. ``labels`` and ``colors`` are the
+    (voltage, current) line labels and colors, ``size`` the figure size in inches."""
+    global _figure
+    style = (tuple(labels), tuple(colors), grid, tuple(size))
+    new_figure = _figure is None or _figure[0] != style
+    if new_figure:
+        _figure = (style,) + _pulse_figure(*style)
+    _, figure, voltage_line, current_line = _figure
+
+    voltage_line.set_data(time, voltage)
+    current_line.set_data(time, current)
+    for ax in figure.axes:
+        ax.relim()
+        ax.autoscale_view()
+    # Laid out once for the first sheet, as on screen
+    if new_figure:
+        figure.tight_layout()
+    figure.savefig(save_path, dpi=dpi)
+    return save_path
@@ -0,0 +1,73 @@
+"""Retention measurement series.
+
+The sheets of a retention run each restart their time at 0; ``retention_points``
+lines them up one after the other so R can be plotted against the time since the
+start of the run (or of each file). RetentionViewer and the batch mode both
+call it.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from memristor_core.profiling import timed
+from memristor_core.store import GrowableArray
+
+
+def retention_points(sheets, r_channel="R", time_channel="Time", reset_time_per_file=False, last_time=0, last_file=None):
+    """R and shifted time of every (file_path, sheet, df) in ``sheets`` as lists of Series.
+
+    ``last_time`` and ``last_file`` carry on from an earlier call, the updated ones are
+    returned with the lists: (R, Time, last_time, last_file).
+    """
+    R = []
+    Time = []
+    for file_path, sheet, sweep in sheets:
+        if reset_time_per_file and file_path != last_file:
+            last_time = 0
+        last_file = file_path
+        if time_channel not in sweep or r_channel not in sweep:
+            raise KeyError(f"Sheet '{sheet}' in file '{file_path}' does not contain the required columns.")
+
+        # Append the data after adjusting the time
+        R.append(sweep[r_channel])
+
+        # Adjust the 'Time' column by adding the last_time
+        Time.append(sweep[time_channel] + last_time)
+
+        # Update last_time to the last value of the current sheet's 'Time'
+        last_time = sweep[time_channel].iloc[-1]
+    return R, Time, last_time, last_file
+
+
+@dataclass
+class RetentionResult:
+    """R against the shifted time of the sheets analysed so far, and where the time
+    stopped (``last_time`` after the sheet of ``last_file``) for the next ones.
+    ``time`` and ``r`` are read-only views of ``buffers``, which the next sheets are
+    appended to in place."""
+    time: np.ndarray
+    r: np.ndarray
+    last_time: float = 0
+    last_file: str = None
+    buffers: tuple = field(default=None, repr=False)
+
+    @property
+    def mean(self):
+        return np.mean(self.r)
+
+
+@timed("retention.analyse")
+def analyse_retention(sheets, r_channel="R", time_channel="Time", reset_time_per_file=False, previous=None):
+    """``retention_points`` of the (file_path, sheet, df) ``sheets`` appended to the
+    ``previous`` result if given. Raises KeyError if a sheet lacks one of the columns."""
+    last_time, last_file = (0, None) if previous is None else (previous.last_time, previous.last_file)
+    R, Time, last_time, last_file = retention_points(sheets, r_channel, time_channel, reset_time_per_file, last_time, last_file)
+    new = [np.concatenate([np.empty(0)] + [series.to_numpy(dtype=float) for series in column]) for column in (Time, R)]
+    if previous is None:
+        buffers = tuple(GrowableArray(float, values) for values in new)
+    else:
+        # Only the new points are copied, not the ones loaded before
+        buffers = previous.buffers or tuple(GrowableArray(float, values) for values in (previous.time, previous.r))
+        buffers = tuple(buffer.extended(len(previous.r), values) for buffer, values in zip(buffers, new))
+    return RetentionResult(*(buffer.view() for buffer in buffers), last_time, last_file, buffers)
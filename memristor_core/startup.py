@@ -0,0 +1,87 @@
+"""Import-time report of the launcher and the viewers.
+
+    python main.py import-report [--json report.json]
+
+imports every module in a fresh interpreter run with ``-X importtime`` and
+prints how long it took and which packages the time went to. The launcher
+should only cost PyQt5; the viewers are imported when their button is pressed
+(or in the background once the launcher is shown), so their time is not part
+of the startup. Comparing the report before and after a change shows a
+startup regression.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Launcher first, then the viewer modules in the order of its buttons
+MODULES = ("class_launcher", "class_IVSweeps", "class_pulses", "class_Retention", "class_volatile")
+# Packages listed per module
+TOP_PACKAGES = 5
+
+
+def parse_importtime(stderr):
+    """``{module: (self_us, cumulative_us)}`` from the ``-X importtime`` output ``stderr``."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue    # The header line
+        times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return times
+
+
+def module_import_time(module, python=sys.executable, cwd=None):
+    """Seconds it takes a fresh interpreter to import ``module``, and the seconds spent
+    in each top-level package (own time of all its submodules) as a dict."""
+    result = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=cwd,
+                            env=dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen")))
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"import {module} failed")
+    times = parse_importtime(result.stderr)
+    packages = defaultdict(float)
+    for name, (own, _) in times.items():
+        packages[name.split(".")[0]] += own / 1e6
+    return times[module][1] / 1e6, dict(packages)
+
+
+def import_report(modules=MODULES, cwd=None):
+    report = {}
+    for module in modules:
+        total, packages = module_import_time(module, cwd=cwd)
+        heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:TOP_PACKAGES]
+        report[module] = {"seconds": total, "packages": dict(heaviest)}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py import-report", description="Time the imports of the launcher and the viewers.")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="Modules to time (default: launcher and viewers)")
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return e.code
+
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        report = import_report(args.modules, cwd)
+    except ImportError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for module, entry in report.items():
+        packages = ", ".join(f"{package} {seconds*1000:.0f} ms" for package, seconds in entry["packages"].items())
+        print(f"{module:<18} {entry['seconds']*1000:7.0f} ms   ({packages})")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
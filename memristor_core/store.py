@@ -0,0 +1,218 @@
+"""Compact column store of the concatenated IV sweeps.
+
+Long endurance runs have millions of points. Kept as one concatenated DataFrame
+with every exported column as float64, the data takes several times more memory
+than what the viewer plots, and every batch of sheets that arrives copies all of
+it again through ``pd.concat``. A ``SweepStore`` only keeps the channels that are
+plotted, each as one contiguous NumPy array, optionally float32
+(``MEMRISTOR_FLOAT32=1``, plenty for drawing), plus:
+
+- per-cycle columns, Clarius' SetVoltage, Rset, ... which only hold a value per
+  cycle and are NaN everywhere else, stored without the NaN
+- the row offsets of the sheets and of the half-cycles
+
+Columns are grown in place with spare capacity, so appending a batch only copies
+the batch. ``extend`` returns a new store and leaves the old one unchanged:
+both share the arrays, the old store simply doesn't see the rows after its own
+end. Everything a store returns is a read-only view, no copy.
+
+With a ``directory`` the columns are raw binary files there instead, appended to
+and read back memory-mapped, so only the rows that are looked at are paged in
+(see ``memristor_core.dataset``).
+"""
+import os
+
+import numpy as np
+
+from memristor_core.profiling import timed
+
+
+def plot_dtype():
+    """dtype of the plotted channels, float32 with ``MEMRISTOR_FLOAT32=1``."""
+    return np.float32 if os.environ.get("MEMRISTOR_FLOAT32", "0") == "1" else np.float64
+
+
+def _view(array, length):
+    view = array[:length]
+    view.flags.writeable = False
+    return view
+
+
+class GrowableArray:
+    """Array grown in place with spare capacity, shared by a store and the stores
+    extended from it. The values can also be rows, e.g. the (V, |I|) points of the
+    volatile cycles."""
+
+    def __init__(self, dtype, values=()):
+        self.data = np.empty(0, dtype=dtype)
+        self.length = 0
+        self.append(values)
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def append(self, values):
+        values = np.asarray(values)
+        if len(values) == 0:
+            return
+        needed = self.length + len(values)
+        if needed > len(self.data):
+            data = np.empty((max(needed, 2 * len(self.data)),) + values.shape[1:], dtype=self.data.dtype)
+            if self.length:
+                data[:self.length] = self.data[:self.length]
+            self.data = data
+        self.data[self.length:needed] = values
+        self.length = needed
+
+    def extended(self, length, values):
+        """This array with ``values`` after its first ``length`` values. An array that
+        was already extended past ``length`` by another store is copied instead."""
+        array = self if self.length == length else GrowableArray(self.data.dtype, self.data[:length])
+        array.append(values)
+        return array
+
+    def view(self):
+        """The values appended so far, read-only."""
+        return _view(self.data, self.length)
+
+
+class _FileColumn:
+    """Column in a raw binary file, appended to on disk and read memory-mapped."""
+
+    def __init__(self, path, dtype, length=0):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.length = length
+        self._map = np.empty(0, dtype=self.dtype)
+
+    @property
+    def data(self):
+        if len(self._map) != self.length:
+            self._map = np.memmap(self.path, dtype=self.dtype, mode="r", shape=(self.length,))
+        return self._map
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        with open(self.path, "r+b" if os.path.exists(self.path) else "wb") as f:
+            # Anything past the end, left by an interrupted conversion, is overwritten
+            f.seek(self.length * self.dtype.itemsize)
+            f.write(values)
+            f.truncate()
+        self.length += len(values)
+
+    def extended(self, length, values):
+        if length != self.length:
+            raise ValueError("A store on disk can only be extended at its end")
+        self.append(values)
+        return self
+
+
+class SweepStore:
+    """``channels`` are the per-point columns (``dtype``), ``cycle_columns`` the per-cycle
+    ones, kept as float64 without their NaN.
+
+    ``store[name]`` is the whole column as a read-only array, ``len(store)`` the
+    number of points, ``store.halfcycle(name, i)`` the points of one half-cycle.
+    """
+
+    def __init__(self, channels, cycle_columns=(), dtype=np.float64, directory=None):
+        self.dtype = np.dtype(dtype)
+        self.directory = directory
+        self._cycle_columns = tuple(name for name in cycle_columns if name not in channels)
+        dtypes = {name: self.dtype for name in channels}
+        dtypes.update({name: np.dtype(np.float64) for name in self._cycle_columns})
+        lengths = {name: 0 for name in dtypes}
+        self._attach(dtypes, lengths, 0, 0)
+
+    def _attach(self, dtypes, lengths, sheets, halfcycles):
+        if self.directory is None:
+            column = lambda name, dtype, length: GrowableArray(dtype)
+        else:
+            column = lambda name, dtype, length: _FileColumn(os.path.join(self.directory, name + ".bin"), dtype, length)
+        self._columns = {name: column(name, dtype, lengths[name]) for name, dtype in dtypes.items()}
+        self._sheet_starts = column("_sheet_starts", np.int64, sheets)
+        self._halfcycle_starts = column("_halfcycle_starts", np.int64, halfcycles)
+        self._lengths = dict(lengths)
+        self._sheets = sheets
+        self._halfcycles = halfcycles
+        self._rows = lengths[next(iter(dtypes))] if dtypes else 0
+
+    def describe(self):
+        """What ``open`` needs to map the files of a store on disk again, as JSON-able dict."""
+        return {"channels": list(self.channels), "cycle_columns": list(self._cycle_columns), "dtype": self.dtype.name,
+                "lengths": self._lengths, "sheets": self._sheets, "halfcycles": self._halfcycles}
+
+    @classmethod
+    def open(cls, directory, description):
+        """The store written to ``directory`` as ``description`` (from ``describe``), memory-mapped."""
+        store = cls.__new__(cls)
+        store.dtype = np.dtype(description["dtype"])
+        store.directory = directory
+        store._cycle_columns = tuple(description["cycle_columns"])
+        dtypes = {name: store.dtype for name in description["channels"]}
+        dtypes.update({name: np.dtype(np.float64) for name in store._cycle_columns})
+        store._attach(dtypes, description["lengths"], description["sheets"], description["halfcycles"])
+        for column in list(store._columns.values()) + [store._sheet_starts, store._halfcycle_starts]:
+            if os.path.getsize(column.path) < column.length * column.dtype.itemsize:
+                raise ValueError(f"{column.path} is shorter than the dataset says")
+        return store
+
+    @property
+    def channels(self):
+        return tuple(name for name in self._columns if name not in self._cycle_columns)
+
+    @property
+    def cycle_columns(self):
+        return self._cycle_columns
+
+    def __len__(self):
+        return self._rows
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        return _view(self._columns[name].data, self._lengths[name])
+
+    @property
+    def sheet_starts(self):
+        return _view(self._sheet_starts.data, self._sheets)
+
+    @property
+    def halfcycle_starts(self):
+        return _view(self._halfcycle_starts.data, self._halfcycles)
+
+    def halfcycle(self, name, index):
+        """Points of half-cycle ``index`` in channel ``name``, a view."""
+        starts = self.halfcycle_starts
+        stop = starts[index + 1] if index + 1 < len(starts) else self._rows
+        return self[name][starts[index]:stop]
+
+    @property
+    def nbytes(self):
+        return sum(self[name].nbytes for name in self._columns) + self.sheet_starts.nbytes + self.halfcycle_starts.nbytes
+
+    @timed("store.extend")
+    def extend(self, frame, sheet_lengths, halfcycle_starts):
+        """A new store with the sheets concatenated in the DataFrame ``frame`` after these
+        rows, ``sheet_lengths`` rows each, and the half-cycles starting at the rows
+        ``halfcycle_starts`` of ``frame``. Raises KeyError if a column is missing."""
+        store = SweepStore.__new__(SweepStore)
+        store.dtype = self.dtype
+        store.directory = self.directory
+        store._cycle_columns = self._cycle_columns
+        store._columns, store._lengths = {}, {}
+        for name, column in self._columns.items():
+            values = frame[name].to_numpy()
+            if name in self._cycle_columns:
+                values = values[~np.isnan(values)]
+            store._columns[name] = column.extended(self._lengths[name], values.astype(column.dtype, copy=False))
+            store._lengths[name] = self._lengths[name] + len(values)
+        sheet_lengths = np.asarray(sheet_lengths, dtype=np.int64)
+        store._sheet_starts = self._sheet_starts.extended(self._sheets, self._rows + np.cumsum(sheet_lengths) - sheet_lengths)
+        store._halfcycle_starts = self._halfcycle_starts.extended(self._halfcycles, self._rows + np.asarray(halfcycle_starts, dtype=np.int64))
+        store._sheets = self._sheets + len(sheet_lengths)
+        store._halfcycles = self._halfcycles + len(halfcycle_starts)
+        store._rows = self._rows + len(frame)
+        return store
@@ -0,0 +1,148 @@
+"""Single-open access to Clarius workbooks.
+
+A workbook is opened once and every sheet is parsed from that handle, instead
+of counting sheets with openpyxl/xlrd and then calling ``pd.read_excel`` for each
+sheet, which re-opens and re-parses the file every time. Workbooks that were
+parsed before are served from the on-disk cache (see ``memristor_core.cache``)
+without opening the Excel file at all.
+
+Viewers pass the columns they use, so only those are parsed and they come back
+as float64 columns, with anything non-numeric turned into NaN.
+"""
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+from memristor_core.cache import default_cache, file_key
+from memristor_core.profiling import timed
+from memristor_core.xlsx import XlsxColumnReader
+
+# Sheets Clarius adds to every workbook that hold no measurement data
+IGNORED_SHEETS = ("Calc", "Settings")
+
+
+class Workbook:
+    """``columns`` limits parsing to the named columns (missing ones are skipped),
+    None reads whole sheets as pandas would. ``cache`` is True for the shared cache,
+    False to always parse the file, or a ``SheetCache`` instance."""
+
+    @timed("workbook.open")
+    def __init__(self, file_path, columns=None, cache=True):
+        self.file_path = file_path
+        self.columns = None if columns is None else tuple(dict.fromkeys(columns))
+        self._cache = default_cache() if cache is True else (cache or None)
+        self._excel_file = None
+        self._xlsx = None
+        self._sheets = None
+
+        if self._cache is not None:
+            self._key = file_key(file_path, ",".join(self.columns) if self.columns is not None else "")
+            self._sheets = self._cache.get(self._key)
+        if self._sheets is not None:
+            self.sheet_names = list(self._sheets)
+            return
+
+        self._parsed = {}
+        if self.columns is not None and file_path.lower().endswith(".xlsx"):
+            try:
+                self._xlsx = XlsxColumnReader(file_path)
+                sheet_names = self._xlsx.sheet_names
+            except (KeyError, StopIteration, ET.ParseError, zipfile.BadZipFile):
+                self._xlsx = None  # Let pandas deal with (or complain about) the file
+        if self._xlsx is None:
+            sheet_names = self._pandas().sheet_names
+        self.sheet_names = [sheet for sheet in sheet_names if sheet not in IGNORED_SHEETS]
+
+    @property
+    def from_cache(self):
+        return self._sheets is not None
+
+    def _pandas(self):
+        if self._excel_file is None:
+            self._excel_file = pd.ExcelFile(self.file_path)
+        return self._excel_file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        """Yield ``(sheet_name, DataFrame)`` for every data sheet, in workbook order."""
+        for sheet in self.sheet_names:
+            yield sheet, self.read(sheet)
+
+    def __len__(self):
+        return len(self.sheet_names)
+
+    def row_count(self, sheet):
+        """Number of data rows (header excluded) as stored in the sheet, without parsing it."""
+        if self.from_cache:
+            return len(self._sheets[sheet])
+        if self._xlsx is not None:
+            rows = self._xlsx.row_count(sheet)
+            if rows is not None:
+                return rows
+        book = self._pandas().book
+        if hasattr(book, "sheet_by_name"):  # xlrd, .xls
+            rows = book.sheet_by_name(sheet).nrows
+        else:  # openpyxl, .xlsx
+            rows = book[sheet].max_row
+            if rows is None:  # Dimensions missing from the file, parse to find out
+                return len(self.read(sheet))
+        return max(rows - 1, 0)
+
+    def read(self, sheet):
+        if self.from_cache:
+            return self._sheets[sheet]
+        if sheet in self._parsed:
+            return self._parsed[sheet]
+        df = self._parse(sheet)
+        if self._cache is not None:
+            # Keep a copy for the cache, callers are free to modify the returned frame
+            self._parsed[sheet] = df.copy()
+            if len(self._parsed) == len(self.sheet_names):
+                self._cache.put(self._key, [(name, self._parsed[name]) for name in self.sheet_names], self.file_path)
+                self._cache = None
+                self._parsed = {}
+        return df
+
+    @timed("workbook.parse")
+    def _parse(self, sheet):
+        if self.columns is None:
+            return self._pandas().parse(sheet)
+
+        arrays = None
+        if self._xlsx is not None:
+            arrays = self._xlsx.read_columns(sheet, self.columns)
+        if arrays is None:
+            book = self._pandas().book
+            if hasattr(book, "sheet_by_name"):  # xlrd has the whole sheet in memory already
+                arrays = _xls_columns(book.sheet_by_name(sheet), self.columns)
+            else:
+                df = self._pandas().parse(sheet, usecols=lambda column: column in self.columns)
+                arrays = {column: _to_float(df[column]) for column in df.columns}
+        return pd.DataFrame(arrays)
+
+    def close(self):
+        if self._excel_file is not None:
+            self._excel_file.close()
+        if self._xlsx is not None:
+            self._xlsx.close()
+
+
+def _to_float(values):
+    return np.asarray(pd.to_numeric(pd.Series(values), errors="coerce"), dtype=np.float64)
+
+
+def _xls_columns(sheet, columns):
+    arrays = {}
+    if sheet.nrows == 0:
+        return arrays
+    for index, name in enumerate(sheet.row_values(0)):
+        if name in columns and name not in arrays:
+            arrays[name] = _to_float(sheet.col_values(index, start_rowx=1))
+    return arrays
@@ -0,0 +1,144 @@
+"""Fast reader for selected numeric columns of ``.xlsx`` sheets.
+
+openpyxl turns every cell of a sheet into a Python object, although the
+viewers only use a handful of the 20+ columns Clarius exports. This reader
+reads the worksheet XML directly and only decodes the cells of the wanted
+columns. Sheets whose XML does not have the plain layout written by Excel
+and Clarius are reported as unsupported, so the caller can fall back to pandas.
+"""
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape
+
+import numpy as np
+import pandas as pd
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_FIRST_ROW = re.compile(rb'<row r="1"[^>]*>(.*?)</row>', re.S)
+_CELL = re.compile(rb'<c r="([A-Z]+)(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_LAST_CELL_ROW = re.compile(rb'<c r="[A-Z]+(\d+)"')
+_TYPE = re.compile(rb'\bt="(\w+)"')
+_VALUE = re.compile(rb"<v>([^<]*)</v>")
+_TEXT = re.compile(rb"<t[^>]*>([^<]*)</t>")
+
+
+class XlsxColumnReader:
+    def __init__(self, file_path):
+        self._zip = zipfile.ZipFile(file_path)
+        self._shared_strings = None
+        self._sheet_xml = {}
+        self._parts = self._sheet_parts()
+        self.sheet_names = list(self._parts)
+
+    def _sheet_parts(self):
+        # Package relationships -> workbook part -> sheet relationships -> sheet parts
+        rels = ET.fromstring(self._zip.read("_rels/.rels"))
+        workbook_part = next(rel.get("Target") for rel in rels.iter(_PKG_REL_NS + "Relationship")
+                             if rel.get("Type", "").endswith("/officeDocument")).lstrip("/")
+        base = posixpath.dirname(workbook_part)
+        workbook_rels = posixpath.join(base, "_rels", posixpath.basename(workbook_part) + ".rels")
+        targets = {}
+        for rel in ET.fromstring(self._zip.read(workbook_rels)).iter(_PKG_REL_NS + "Relationship"):
+            target = rel.get("Target")
+            targets[rel.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+        workbook = ET.fromstring(self._zip.read(workbook_part))
+        return {sheet.get("name"): targets[sheet.get(_REL_NS + "id")] for sheet in workbook.iter(_MAIN_NS + "sheet")}
+
+    def _xml(self, sheet):
+        if sheet not in self._sheet_xml:
+            data = self._zip.read(self._parts[sheet])
+            # Only the plain layout is understood: unprefixed elements and every cell with its reference first
+            if data.count(b"<c ") != data.count(b'<c r="') or b"<c>" in data or (b"<row" not in data and b":row" in data):
+                data = None
+            self._sheet_xml[sheet] = data
+        return self._sheet_xml[sheet]
+
+    def _shared(self):
+        if self._shared_strings is None:
+            self._shared_strings = []
+            try:
+                root = ET.fromstring(self._zip.read("xl/sharedStrings.xml"))
+            except KeyError:
+                return self._shared_strings
+            for item in root.iter(_MAIN_NS + "si"):
+                self._shared_strings.append("".join(t.text or "" for t in item.iter(_MAIN_NS + "t")))
+        return self._shared_strings
+
+    def _cell_text(self, attrs, inner):
+        cell_type = _TYPE.search(attrs)
+        cell_type = cell_type.group(1) if cell_type else b"n"
+        if cell_type == b"inlineStr":
+            return unescape(b"".join(_TEXT.findall(inner or b"")).decode())
+        value = _VALUE.search(inner or b"")
+        if value is None:
+            return None
+        value = unescape(value.group(1).decode())
+        if cell_type == b"s":
+            return self._shared()[int(value)]
+        return value
+
+    def row_count(self, sheet):
+        """Data rows below the header, or None if the sheet layout is unsupported."""
+        data = self._xml(sheet)
+        if data is None:
+            return None
+        last = data.rfind(b'<c r="')
+        if last < 0:
+            return 0
+        return int(_LAST_CELL_ROW.match(data, last).group(1)) - 1
+
+    def read_columns(self, sheet, columns):
+        """Return ``{column: float64 array}`` for the wanted columns found in the header row,
+        or None if the sheet layout is unsupported. Non-numeric cells become NaN."""
+        data = self._xml(sheet)
+        if data is None:
+            return None
+        n_rows = self.row_count(sheet)
+        header = _FIRST_ROW.search(data)
+        if header is None:
+            return None
+
+        # Columns are returned in the order they have in the sheet, like pandas does
+        letters = {}
+        for letter, _, attrs, inner in _CELL.findall(header.group(1)):
+            name = self._cell_text(attrs, inner)
+            if name in columns and name not in letters.values():
+                letters[letter] = name
+
+        # One pass over the sheet collects the cells of all wanted columns
+        rows = {letter: [] for letter in letters}
+        values = {letter: [] for letter in letters}
+        others = {letter: [] for letter in letters}
+        if letters:
+            pattern = re.compile(rb'<c r="(' + b"|".join(letters) + rb')(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+            for letter, row, attrs, inner in pattern.findall(data):
+                if not inner or row == b"1":  # Empty cell or the header
+                    continue
+                if b't="' not in attrs or b't="n"' in attrs:
+                    value = _VALUE.search(inner)
+                    if value is not None and value.group(1):
+                        rows[letter].append(row)
+                        values[letter].append(value.group(1))
+                else:  # Text, boolean or error cell, coerce like pd.to_numeric(errors="coerce")
+                    others[letter].append((int(row), self._cell_text(attrs, inner)))
+
+        arrays = {}
+        for letter, name in letters.items():
+            column = np.full(n_rows, np.nan)
+            if rows[letter]:
+                column[np.array(rows[letter]).astype(np.int64) - 2] = np.array(values[letter]).astype(np.float64)
+            if others[letter]:
+                index = np.array([row for row, _ in others[letter]]) - 2
+                column[index] = pd.to_numeric(pd.Series([text for _, text in others[letter]], dtype=object),
+                                              errors="coerce").to_numpy(np.float64)
+            arrays[name] = column
+        del self._sheet_xml[sheet]  # Sheets are read once, do not keep the XML around
+        return arrays
+
+    def close(self):
+        self._zip.close()
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def iv_sheet(points=200, vset=0.8, vreset=-0.6, v_max=1.5):
+    """One Clarius IV cycle: a set sweep from 0 V to ``v_max`` and back, switching to
+    LRS at ``vset``, then a reset sweep to -``v_max`` and back, switching to HRS at
+    ``vreset``. The per-cycle columns hold one value in the first row."""
+    half = points // 2
+    set_voltage = v_max * np.sin(np.pi * np.arange(half) / half)
+    reset_voltage = -v_max * np.sin(np.pi * np.arange(points - half) / (points - half))
+    out = np.arange(half) <= half // 2
+    set_r = np.where(out & (set_voltage < vset), 1e6, 1e3)
+    out = np.arange(points - half) <= (points - half) // 2
+    reset_r = np.where(out & (reset_voltage > vreset), 1e3, 1e6)
+    voltage = np.concatenate([set_voltage, reset_voltage])
+    resistance = np.concatenate([set_r, reset_r])
+    per_cycle = lambda value: np.concatenate([[value], np.full(points - 1, np.nan)])
+    return pd.DataFrame({"Voltage": voltage, "Current": voltage / resistance, "TimeOutput": np.arange(points) * 0.01,
+                         "SetVoltage": per_cycle(vset), "ResetVoltage": per_cycle(vreset),
+                         "SetResistance": per_cycle(1e3), "ResetResistance": per_cycle(1e6)})
+
+
+@pytest.fixture
+def make_iv_sheet():
+    return iv_sheet
+
+
+@pytest.fixture
+def iv_workbook(tmp_path):
+    """An .xlsx file with three IV sheets and a "Calc" sheet the readers skip."""
+    path = tmp_path / "sweeps.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        for n, (vset, vreset) in enumerate([(0.8, -0.6), (0.7, -0.5), (0.9, -0.7)]):
+            iv_sheet(200, vset, vreset).to_excel(writer, sheet_name=f"Cycle{n + 1}", index=False)
+        pd.DataFrame({"Note": ["not data"]}).to_excel(writer, sheet_name="Calc", index=False)
+    return str(path)
@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from memristor_core import batch
+from memristor_core.batch import main
+
+
+def run(*args):
+    return main(["--jobs", "1", "--no-cache", *args])
+
+
+def test_iv_batch(iv_workbook, tmp_path):
+    out = tmp_path / "cycles.csv"
+    assert run("--mode", "iv", "--input", iv_workbook, "--out", str(out)) == 0
+    table = pd.read_csv(out)
+    assert len(table) == 3
+    assert (table.File == iv_workbook).all()
+    assert table.SetOK.all() and table.ResetOK.all()
+
+
+def test_a_failed_file_still_writes_the_others(iv_workbook, tmp_path):
+    broken = tmp_path / "broken.xlsx"
+    broken.write_bytes(b"not a workbook")
+    out = tmp_path / "cycles.csv"
+    assert run("--mode", "iv", "--input", str(broken), iv_workbook, "--out", str(out)) == 1
+    assert len(pd.read_csv(out)) == 3
+
+
+def test_no_workbooks(tmp_path):
+    assert run("--mode", "iv", "--input", str(tmp_path), "--out", str(tmp_path / "cycles.csv")) == 1
+
+
+def test_bad_arguments(iv_workbook, tmp_path):
+    assert run("--mode", "iv", "--input", iv_workbook, "--out", str(tmp_path / "cycles.txt")) == 2
+    assert run("--mode", "unknown", "--input", iv_workbook, "--out", str(tmp_path / "cycles.csv")) == 2
+    assert run("--input", iv_workbook) == 2
+
+
+def test_unwritable_output(iv_workbook, tmp_path):
+    assert run("--mode", "iv", "--input", iv_workbook, "--out", str(tmp_path / "missing" / "cycles.csv")) == 2
+
+
+
+def test_parquet_output(iv_workbook, tmp_path):
+    if batch.parquet_engine() is None:
+        pytest.skip("neither pyarrow nor fastparquet is installed")
+    out = tmp_path / "cycles.parquet"
+    assert run("--mode", "iv", "--input", iv_workbook, "--out", str(out)) == 0
+    assert run("--mode", "iv", "--input", iv_workbook, "--out", str(tmp_path / "cycles.csv")) == 0
+    pd.testing.assert_frame_equal(pd.read_parquet(out), pd.read_csv(tmp_path / "cycles.csv"))
+
+
+def test_parquet_without_an_engine_fails_before_analysing(iv_workbook, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "parquet_engine", lambda: None)
+    monkeypatch.setattr(batch, "run_ordered", lambda *args, **kwargs: pytest.fail("files were analysed"))
+    out = tmp_path / "cycles.parquet"
+    assert run("--mode", "iv", "--input", iv_workbook, "--out", str(out)) == 2
+    assert not out.exists()
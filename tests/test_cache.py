@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from memristor_core.cache import SheetCache, file_key
+
+
+def sheets(n=100):
+    return [("A", pd.DataFrame({"Voltage": np.linspace(0, 1, n), "Count": np.arange(n)})),
+            ("B", pd.DataFrame({"Flag": np.arange(n) % 2 == 0}))]
+
+
+def age(cache, key, seconds_ago):
+    # Entries are evicted by the modification time of their meta file
+    meta = os.path.join(cache.directory, key, "meta.json")
+    os.utime(meta, (os.path.getatime(meta), os.path.getmtime(meta) - seconds_ago))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SheetCache(str(tmp_path / "cache"), max_bytes=1 << 30)
+
+
+def test_put_get_round_trip(cache):
+    assert cache.get("missing") is None
+    assert cache.put("key", sheets(), "sweeps.xlsx")
+    loaded = cache.get("key")
+    assert list(loaded) == ["A", "B"]
+    for name, df in sheets():
+        pd.testing.assert_frame_equal(loaded[name], df)
+
+
+def test_text_columns_are_not_cached(cache):
+    assert not cache.put("key", [("A", pd.DataFrame({"Note": ["a", "b"]}))])
+    assert cache.get("key") is None
+
+
+def test_invalidate(cache, tmp_path):
+    cache.put("key", sheets())
+    cache.invalidate("key")
+    assert cache.get("key") is None
+
+    workbook = tmp_path / "sweeps.xlsx"
+    workbook.write_bytes(b"content")
+    cache.put(file_key(str(workbook), "Voltage"), sheets())
+    cache.invalidate_file(str(workbook), "Voltage")
+    assert cache.get(file_key(str(workbook), "Voltage")) is None
+    # The key follows the content
+    assert file_key(str(workbook)) != file_key(str(workbook), "Voltage")
+
+
+def test_unreadable_entry_is_dropped(cache):
+    cache.put("key", sheets())
+    with open(os.path.join(cache.directory, "key", "sheets.npz"), "wb") as f:
+        f.write(b"not an npz file")
+    assert cache.get("key") is None
+    assert not os.path.exists(os.path.join(cache.directory, "key"))
+
+
+def test_evict_least_recently_used(cache):
+    cache.put("first", sheets())
+    entry = cache.size()
+    cache.put("second", sheets())
+    age(cache, "first", 200)
+    age(cache, "second", 100)
+    # Reading an entry makes it the most recently used one
+    assert cache.get("first") is not None
+
+    cache.max_bytes = int(2.5 * entry)
+    cache.put("third", sheets())
+    assert cache.get("second") is None
+    assert cache.get("first") is not None and cache.get("third") is not None
+    assert cache.size() <= cache.max_bytes
+
+    cache.clear()
+    assert cache.size() == 0
@@ -0,0 +1,27 @@
+import os
+
+import pandas as pd
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox
+
+from class_IVSweeps import IVSweepsAnalyser
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def test_export_before_a_load_writes_an_empty_sheet(app, tmp_path, monkeypatch):
+    path = tmp_path / "data"
+    monkeypatch.setattr(QFileDialog, "getSaveFileName", lambda *args, **kwargs: (str(path), ""))
+    messages = []
+    monkeypatch.setattr(QMessageBox, "information", lambda parent, title, text: messages.append(text))
+
+    IVSweepsAnalyser().export()
+    table = pd.read_excel(f"{path}.xlsx")
+    assert list(table.columns) == ["Vreset", "Vset", "Rset", "Rreset"]
+    assert len(table) == 0
+    assert messages == ["Exported: 0 cycles!"]
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.signal import find_peaks
+
+from memristor_core.iv import (V_MIN, PEAK_FRACTION, analyse_iv, analyse_volatile, cycle_table, halfcycle_cycles, segment_halfcycles,
+                               sweep_cycles, switching_voltages, valid_values)
+
+
+def reference_switching_voltage(voltage, current, time, polarity):
+    # One half-cycle at a time, as the viewer used to do it
+    if len(voltage) < 2:
+        return np.nan
+    grad = np.gradient(voltage)
+    keep = (grad > 0) & (voltage > V_MIN) if polarity > 0 else (grad < 0) & (voltage < -V_MIN)
+    voltage, current, time = voltage[keep], current[keep], time[keep]
+    if len(voltage) == 0:
+        return np.nan
+    if len(voltage) < 3:
+        return np.min(voltage)
+    d_r = np.gradient(np.log(np.abs(voltage) / np.abs(current)))
+    if polarity > 0:
+        d_r = -d_r
+    peaks, _ = find_peaks(d_r)
+    if len(peaks) == 0:
+        return np.min(voltage)
+    candidates = peaks[d_r[peaks] >= PEAK_FRACTION * d_r[peaks].max()]
+    result = voltage[np.flatnonzero(time == time[candidates[-1]])[0]]
+    return voltage[-1] if abs(result) < V_MIN else result
+
+
+def halfcycle(rng, points, polarity, kind):
+    v_max = rng.uniform(0.5, 2)
+    voltage = polarity * v_max * np.sin(np.pi * np.arange(points) / points)
+    if kind == "switching":
+        resistance = np.where(np.abs(voltage) < rng.uniform(0.2, 0.9) * v_max, 1e6, 1e3)
+        resistance = resistance if polarity > 0 else resistance[::-1]
+        resistance = resistance * rng.uniform(0.8, 1.2, points)
+    elif kind == "no peaks":
+        # |V| / |I| is exactly 1024 everywhere, so d(log R) is 0 and has no peak
+        resistance = np.full(points, 1024.0)
+    else:  # "near zero": nothing beyond V_MIN
+        voltage = voltage * V_MIN / v_max / 2
+        resistance = np.full(points, 1e4)
+    time = np.arange(points) * 0.01
+    # Clarius repeats the time of some points
+    time[rng.integers(1, points, 3)] -= 0.01
+    return voltage, voltage / resistance, np.sort(time)
+
+
+@pytest.mark.parametrize("polarity", [1, -1])
+def test_switching_voltages_matches_reference(polarity):
+    rng = np.random.default_rng(polarity + 2)
+    kinds = ["switching"] * 30 + ["no peaks"] * 5 + ["near zero"] * 3
+    rng.shuffle(kinds)
+    parts = [halfcycle(rng, int(rng.integers(20, 300)), polarity, kind) for kind in kinds]
+    voltage, current, time = (np.concatenate(channel) for channel in zip(*parts))
+    lengths = np.array([len(part[0]) for part in parts])
+    starts = np.cumsum(lengths) - lengths
+
+    # Small batches, so every batch pads half-cycles of different lengths with NaN
+    result = switching_voltages(voltage, current, time, starts, lengths, polarity, batch_size=7)
+    expected = [reference_switching_voltage(*part, polarity) for part in parts]
+    np.testing.assert_array_equal(result, expected)
+    assert np.isnan(result[[kind == "near zero" for kind in kinds]]).all()
+    # Without a peak the lowest voltage of the sweep out is taken
+    for (voltage, _, _), kind, value in zip(parts, kinds, result):
+        if kind == "no peaks":
+            out = np.gradient(voltage) * polarity > 0
+            assert value == np.min(voltage[out & (voltage * polarity > V_MIN)])
+
+
+def test_segment_halfcycles_mixed_sheets_and_zero_runs():
+    sheets, expected_starts = [], []
+    offset = 0
+    for points in (200, 300, 500, 300):
+        half = points // 2
+        voltage = np.concatenate([np.sin(np.pi * np.arange(half) / half),
+                                  -np.sin(np.pi * np.arange(points - half) / (points - half))])
+        # A run of zeros between the set and the reset sweep only starts one half-cycle
+        voltage[half:half + 4] = 0
+        sheets.append(voltage)
+        expected_starts += [offset, offset + half]
+        offset += points
+    # The last sheet doesn't start at exactly 0 V, only the sheet boundary splits it from the one before
+    sheets[-1][0] = 0.01
+    voltage = np.concatenate(sheets)
+    sheet_starts = np.cumsum([len(sheet) for sheet in sheets])[:-1]
+
+    starts, stops, polarity = segment_halfcycles(voltage, sheet_starts)
+    np.testing.assert_array_equal(starts, expected_starts)
+    np.testing.assert_array_equal(stops, expected_starts[1:] + [len(voltage)])
+    np.testing.assert_array_equal(polarity, [1, -1] * len(sheets))
+
+    merged, _, _ = segment_halfcycles(voltage)
+    assert sheet_starts[-1] not in merged
+
+
+def test_segment_halfcycles_empty():
+    starts, stops, polarity = segment_halfcycles(np.empty(0))
+    assert len(starts) == len(stops) == len(polarity) == 0
+
+
+def test_cycle_table_aligns_failed_and_missing_halfcycles():
+    # Cycle 1 has no set and cycle 2 no reset; the set of cycle 3 was not measured
+    cycles = cycle_table(vset=[0.8, 0.7], vreset=[-0.6, -0.5, -0.4], rset=[1e3, 2e3, 3e3], rreset=[1e6, 2e6, 3e6],
+                         no_set=[1], no_reset=[2])
+    assert list(cycles.index) == [0, 1, 2, 3]
+    np.testing.assert_array_equal(cycles.Vset, [0.8, np.nan, 0.7, np.nan])
+    np.testing.assert_array_equal(cycles.Vreset, [-0.6, -0.5, np.nan, -0.4])
+    np.testing.assert_array_equal(cycles.Rset, [1e3, np.nan, 2e3, 3e3])
+    np.testing.assert_array_equal(cycles.SetOK, [True, False, True, True])
+    np.testing.assert_array_equal(cycles.ResetOK, [True, True, False, True])
+    # Only cycles with both a set and a reset count, NaN left out
+    np.testing.assert_array_equal(valid_values(cycles, "Vset"), [0.8])
+    np.testing.assert_array_equal(valid_values(cycles, "Rreset"), [1e6, 3e6])
+
+    # set, reset / reset / set / reset: the n-th set goes to the n-th cycle with a set
+    polarity = [1, -1, -1, 1, -1]
+    np.testing.assert_array_equal(halfcycle_cycles(polarity, cycles), [0, 0, 1, 2, 3])
+
+
+def test_sweep_cycles_sheet_by_sheet_matches_all_at_once():
+    rng = np.random.default_rng(0)
+    n = 40
+    set_voltage = np.where(rng.random(n) < 0.2, 0.0, 1.0)
+    reset_voltage = np.where(rng.random(n) < 0.2, 0.0, -1.0)
+    polarity = np.concatenate([[sign] * int(value != 0) for pair in zip(set_voltage, -reset_voltage) for sign, value in zip((1, -1), pair)])
+    columns = {"SetVoltage": set_voltage, "ResetVoltage": reset_voltage,
+               "SetResistance": rng.uniform(size=(set_voltage != 0).sum()),
+               "ResetResistance": rng.uniform(size=(reset_voltage != 0).sum())}
+    halfcycles = pd.DataFrame({"Polarity": polarity, "Vswitch": rng.normal(size=len(polarity))})
+    expected = cycle_table(halfcycles.Vswitch[polarity > 0], halfcycles.Vswitch[polarity < 0],
+                           columns["SetResistance"], columns["ResetResistance"],
+                           np.flatnonzero(set_voltage == 0), np.flatnonzero(reset_voltage == 0))
+    expected_cycle = halfcycle_cycles(polarity, expected)
+
+    cycles, cycle, settled = None, None, (0, 0, 0, 0, 0)
+    for end in range(1, n + 1):
+        # The sweeps of the first ``end`` cycles
+        part = {"SetVoltage": set_voltage[:end], "ResetVoltage": reset_voltage[:end],
+                "SetResistance": columns["SetResistance"][:(set_voltage[:end] != 0).sum()],
+                "ResetResistance": columns["ResetResistance"][:(reset_voltage[:end] != 0).sum()]}
+        rows = halfcycles.iloc[:(set_voltage[:end] != 0).sum() + (reset_voltage[:end] != 0).sum()].copy()
+        if cycle is not None:
+            rows["Cycle"] = np.concatenate([cycle, np.full(len(rows) - len(cycle), np.nan)])
+        cycles, cycle, settled = sweep_cycles(part, rows, cycles, settled)
+    pd.testing.assert_frame_equal(cycles, expected)
+    np.testing.assert_array_equal(cycle, expected_cycle)
+
+
+def test_analyse_iv_previous_matches_all_at_once(make_iv_sheet):
+    sheets = [make_iv_sheet(points, vset, -vset) for points, vset in [(200, 0.8), (300, 0.6), (500, 0.9), (200, 0.7)]]
+    whole = analyse_iv(sheets)
+    result = None
+    for sheet in sheets:
+        result = analyse_iv([sheet], previous=result)
+    pd.testing.assert_frame_equal(result.halfcycles, whole.halfcycles)
+    pd.testing.assert_frame_equal(result.cycles, whole.cycles)
+    np.testing.assert_array_equal(result.sweeps["Voltage"], whole.sweeps["Voltage"])
+    assert result.total_cycles == 4
+
+
+def test_analyse_volatile_previous_matches_all_at_once():
+    rng = np.random.default_rng(1)
+    sheets = []
+    for points in (50, 80, 60, 70):
+        voltage = np.concatenate([np.linspace(0, 1.5, points // 2), np.linspace(1.5, 0, points - points // 2)])
+        resistance = np.where(voltage > rng.uniform(0.5, 1), 1e3, 1e6)
+        sheets.append(pd.DataFrame({"Time": np.arange(points) * 0.01, "DrainV": voltage, "DrainI": voltage / resistance + 1e-12}))
+    whole = analyse_volatile(sheets, "DrainV", "DrainI")
+    results = [None]
+    for sheet in sheets:
+        results.append(analyse_volatile([sheet], "DrainV", "DrainI", previous=results[-1]))
+    pd.testing.assert_frame_equal(results[-1].cycles, whole.cycles)
+    np.testing.assert_array_equal(results[-1].points, whole.points)
+    # Earlier results keep their own points while the later ones grow the same buffer
+    for result in results[1:]:
+        np.testing.assert_array_equal(result.points, whole.points[:result.cycles.Stop.iloc[-1]])
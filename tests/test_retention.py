@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from memristor_core.retention import analyse_retention
+
+
+def retention_sheets(count):
+    rng = np.random.default_rng(0)
+    return [(f"file{n // 3}.xlsx", f"Sheet{n % 3}", pd.DataFrame({"Time": np.arange(1, 11) * 0.5, "R": rng.uniform(1e3, 1e4, 10)}))
+            for n in range(count)]
+
+
+def test_sheet_by_sheet_matches_all_at_once():
+    sheets = retention_sheets(7)
+    whole = analyse_retention(sheets, reset_time_per_file=True)
+    results = [None]
+    for sheet in sheets:
+        results.append(analyse_retention([sheet], reset_time_per_file=True, previous=results[-1]))
+    np.testing.assert_array_equal(results[-1].time, whole.time)
+    np.testing.assert_array_equal(results[-1].r, whole.r)
+    assert results[-1].mean == whole.mean
+    # The time restarts with every file
+    np.testing.assert_array_equal(whole.time[[0, 10, 30]], [0.5, 5.5, 0.5])
+    # Earlier results keep their own points while the later ones grow the same buffers
+    for count, result in enumerate(results[1:], 1):
+        np.testing.assert_array_equal(result.r, whole.r[:10 * count])
+    assert not whole.r.flags.writeable
+
+
+def test_no_sheets():
+    result = analyse_retention([])
+    assert len(result.time) == len(result.r) == 0
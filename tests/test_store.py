@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from memristor_core.iv import CYCLE_COLUMNS
+from memristor_core.store import SweepStore
+
+
+def frame(points, seed):
+    rng = np.random.default_rng(seed)
+    per_cycle = {name: np.where(np.arange(points) % 50 == 0, rng.uniform(size=points), np.nan) for name in CYCLE_COLUMNS}
+    return pd.DataFrame({"Voltage": rng.normal(size=points), "Current": rng.normal(size=points), **per_cycle})
+
+
+def test_extend_then_open(tmp_path):
+    directory = str(tmp_path)
+    frames = [frame(100, 0), frame(150, 1)]
+    store = SweepStore(("Voltage", "Current"), CYCLE_COLUMNS, np.float32, directory)
+    store = store.extend(frames[0], [100], [0, 50])
+    store = store.extend(frames[1], [50, 100], [0, 50, 100])
+
+    opened = SweepStore.open(directory, store.describe())
+    whole = pd.concat(frames, ignore_index=True)
+    assert len(opened) == 250
+    assert opened.channels == ("Voltage", "Current")
+    assert opened.cycle_columns == CYCLE_COLUMNS
+    np.testing.assert_array_equal(opened.sheet_starts, [0, 100, 150])
+    np.testing.assert_array_equal(opened.halfcycle_starts, [0, 50, 100, 150, 200])
+    assert opened["Voltage"].dtype == np.float32
+    np.testing.assert_array_equal(opened["Voltage"], whole.Voltage.to_numpy(np.float32))
+    np.testing.assert_array_equal(opened.halfcycle("Current", 4), whole.Current.to_numpy(np.float32)[200:])
+    # Per-cycle columns are kept without their NaN
+    np.testing.assert_array_equal(opened["SetVoltage"], whole.SetVoltage.dropna().to_numpy())
+    assert not opened["Voltage"].flags.writeable
+
+
+def test_open_truncated_file(tmp_path):
+    directory = str(tmp_path)
+    store = SweepStore(("Voltage", "Current"), CYCLE_COLUMNS, np.float64, directory).extend(frame(100, 0), [100], [0])
+    with open(os.path.join(directory, "Current.bin"), "r+b") as f:
+        f.truncate(10)
+    with pytest.raises(ValueError):
+        SweepStore.open(directory, store.describe())
+
+
+def test_extend_leaves_the_previous_store_unchanged():
+    empty = SweepStore(("Voltage", "Current"), CYCLE_COLUMNS)
+    first = empty.extend(frame(100, 0), [100], [0])
+    second = first.extend(frame(100, 1), [100], [0])
+    # Extending an older store again branches off instead of overwriting the newer one
+    other = first.extend(frame(100, 2), [100], [0])
+    assert len(empty) == 0 and len(first) == 100 and len(second) == len(other) == 200
+    np.testing.assert_array_equal(second["Voltage"][100:], frame(100, 1).Voltage)
+    np.testing.assert_array_equal(other["Voltage"][100:], frame(100, 2).Voltage)
+    with pytest.raises(KeyError):
+        first.extend(pd.DataFrame({"Voltage": [1.0]}), [1], [0])
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from memristor_core.workbook import Workbook
+from memristor_core.xlsx import XlsxColumnReader
+
+
+@pytest.fixture
+def mixed_workbook(tmp_path):
+    """Sheets with gaps, text in numeric columns and a text column."""
+    path = tmp_path / "mixed.xlsx"
+    first = pd.DataFrame({"Note": ["a", "b", None, "d", "e"],
+                          "Voltage": [0.0, 0.5, np.nan, 1.5, 2.0],
+                          "Current": [1e-6, "n/a", 3e-6, np.nan, 5e-6],
+                          "Count": [1, 2, 3, 4, 5]})
+    # The last rows only have a value in another column
+    second = pd.DataFrame({"Current": [1.0, 2.0, np.nan, np.nan], "Voltage": [3.0, np.nan, np.nan, np.nan],
+                           "Note": ["x", "y", "z", "w"]})
+    with pd.ExcelWriter(path) as writer:
+        first.to_excel(writer, sheet_name="First", index=False)
+        second.to_excel(writer, sheet_name="Second", index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("sheet", ["First", "Second"])
+def test_xlsx_reader_matches_pandas(mixed_workbook, sheet):
+    wanted = ("Voltage", "Current", "Count", "Missing")
+    expected = pd.read_excel(mixed_workbook, sheet_name=sheet)
+    expected = expected[[column for column in expected.columns if column in wanted]]
+
+    reader = XlsxColumnReader(mixed_workbook)
+    assert reader.sheet_names == ["First", "Second"]
+    assert reader.row_count(sheet) == len(expected)
+    arrays = reader.read_columns(sheet, wanted)
+    reader.close()
+
+    # Same columns in the same order, non-numeric cells coerced to NaN
+    assert list(arrays) == list(expected.columns)
+    for column, values in arrays.items():
+        np.testing.assert_array_equal(values, pd.to_numeric(expected[column], errors="coerce").to_numpy(np.float64))
+
+
+def test_workbook_skips_ignored_sheets(iv_workbook):
+    with Workbook(iv_workbook, ("Voltage", "Current"), cache=False) as workbook:
+        assert workbook.sheet_names == ["Cycle1", "Cycle2", "Cycle3"]
+        sheets = list(workbook)
+        assert workbook.row_count("Cycle1") == 200
+    expected = pd.read_excel(iv_workbook, sheet_name="Cycle1")
+    np.testing.assert_array_equal(sheets[0][1].Voltage, expected.Voltage)
+    assert list(sheets[0][1].columns) == ["Voltage", "Current"]